@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+import asyncio, codecs, os, signal, subprocess, sys, time
+from output_capture import OutputCapture, process_spill_dir
+
+#Non-blocking executor for the cli tool, shared by poe-agent.py and every sechard agent
+#commands run in their own process group with a wall clock timeout; on timeout or
+#cancellation the whole group is killed so stray children (find /, pagers, tty waits) die too.
+#output is echoed to the console as it arrives instead of after the command exits (or to
+#echo(text) when echo is a callable, e.g. a daemon session streaming to its client).
+#only a bounded head/tail of the output is kept for the LLM, see output_capture.py; the
+#cli_output/NNNN.log handles a session's spill_dir hands out are swapped for its files' paths.
+#NO EXPRESSED WARRANTY. Licensed under MIT
+
+CLI_TIMEOUT = float(os.environ.get("CLI_TIMEOUT", "120"))
+KILL_GRACE = float(os.environ.get("CLI_KILL_GRACE", "2"))
+READ_SIZE = 65536
+
+class CommandResult:
+    def __init__(self, command, returncode, output, timed_out, elapsed, capture=None):
+        self.command = command
+        self.returncode = returncode
+        self.output = output
+        self.timed_out = timed_out
+        self.elapsed = elapsed
+        self.capture = capture
+
+    #text handed back to the LLM
+    def text(self):
+        if self.timed_out:
+            return self.output + f"\n[command timed out after {self.elapsed:.1f}s and was killed]"
+        return self.output
+
+    def __repr__(self):
+        return (f"CommandResult(args={self.command!r}, returncode={self.returncode}, "
+                f"timed_out={self.timed_out}, elapsed={self.elapsed:.3f}, output={self.output!r})")
+
+def _spawn_kwargs():
+    if os.name == "nt":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+def _signal_group(proc, sig):
+    try:
+        if os.name == "nt":
+            proc.kill()
+        else:
+            os.killpg(proc.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+async def _kill_group(proc):
+    if proc.returncode is not None:
+        return
+    _signal_group(proc, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(proc.wait(), KILL_GRACE)
+    except asyncio.TimeoutError:
+        _signal_group(proc, signal.SIGKILL if os.name != "nt" else signal.SIGTERM)
+        await proc.wait()
+
+async def run_command(command, timeout=CLI_TIMEOUT, echo=True, capture=None, spill_dir=None):
+    spill_dir = spill_dir or (capture.spill_dir if capture is not None else process_spill_dir)
+    start = time.perf_counter()
+    proc = await asyncio.create_subprocess_shell(spill_dir.resolve(command),
+                                                 stdin=asyncio.subprocess.DEVNULL,
+                                                 stdout=asyncio.subprocess.PIPE,
+                                                 stderr=asyncio.subprocess.STDOUT,
+                                                 **_spawn_kwargs())
+    if capture is None:
+        capture = OutputCapture(command, spill_dir=spill_dir)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    async def pump():
+        while True:
+            data = await proc.stdout.read(READ_SIZE)
+            if not data:
+                break
+            capture.write(data)
+            if not echo:
+                continue
+            text = decoder.decode(data)
+            if callable(echo):
+                echo(text)
+            else:
+                sys.stdout.write(text)
+                sys.stdout.flush()
+        await proc.wait()
+
+    timed_out = False
+    try:
+        await asyncio.wait_for(pump(), timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+        await _kill_group(proc)
+    except BaseException:
+        #cancelled (or interrupted), don't leave the command group running
+        await asyncio.shield(_kill_group(proc))
+        raise
+    finally:
+        capture.close()
+    return CommandResult(command, proc.returncode, capture.text(), timed_out,
+                         time.perf_counter() - start, capture)
+
+#for the synchronous sechard agents
+def run_command_sync(command, timeout=CLI_TIMEOUT, echo=True, capture=None, spill_dir=None):
+    return asyncio.run(run_command(command, timeout=timeout, echo=echo, capture=capture, spill_dir=spill_dir))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+import argparse, asyncio, contextlib, importlib.util, io, json, os, platform, statistics, sys, time
+
+#End to end benchmark of the poe-agent.py loop against the local fake bot
+#runs N sessions at a given concurrency and reports per iteration latency, LLM wait vs
+#tool wait vs limiter idle time, prompt bytes per request and sessions/sec.
+#results are written as JSON so runs can be compared across changes.
+#usage: python3 benchmarks/bench_agent_loop.py --sessions 8 --concurrency 4 --ttft-ms 300 \
+#           --tokens-per-sec 80 --json benchmarks/results/agent_loop.json
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = (len(values) - 1) * pct / 100
+    low = int(index)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (index - low)
+
+def summarize(values):
+    return {"mean": round(statistics.fmean(values), 4) if values else 0.0,
+            "p50": round(percentile(values, 50), 4), "p95": round(percentile(values, 95), 4),
+            "max": round(max(values), 4) if values else 0.0}
+
+def load_agent():
+    #poe-agent.py reads its keys at import time and prompt.md from the cwd
+    os.environ.setdefault("POE_API", "bench")
+    os.environ.setdefault("SERP_API", "bench")
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    spec = importlib.util.spec_from_file_location("poe_agent", os.path.join(ROOT, "poe-agent.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+async def run(agent, args, base_url):
+    from poe_session import PoeSession
+    from rate_limit import AdaptiveRateLimiter
+    limiter = AdaptiveRateLimiter(rate=args.poe_rate, burst=args.poe_rate)
+    poe = PoeSession("bench", base_url=base_url, max_connections=max(args.concurrency, 1), limiter=limiter)
+    limit = asyncio.Semaphore(args.concurrency)
+
+    async def one(index):
+        async with limit:
+            start = time.perf_counter()
+            result = await agent.run_session(poe, f"benchmark objective {index}")
+            result["elapsed"] = time.perf_counter() - start
+            return result
+
+    start = time.perf_counter()
+    #agent chatter (responses, live tool output) is noise here
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = await asyncio.gather(*[one(i) for i in range(args.sessions)])
+    wall = time.perf_counter() - start
+    await poe.close()
+    return results, wall, poe, limiter
+
+def report(results, wall, poe, limiter, args):
+    timings = [t for r in results for t in r["timings"]]
+    iteration_latency = [t["llm_s"] + t["tool_wait_s"] for t in timings]
+    llm = sum(t["llm_s"] for t in timings)
+    tool = sum(t["tool_wait_s"] for t in timings)
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": {"sessions": args.sessions, "concurrency": args.concurrency, "ttft_ms": args.ttft_ms,
+                   "tokens_per_sec": args.tokens_per_sec, "poe_rate": args.poe_rate},
+        "sessions_per_sec": round(len(results) / wall, 3),
+        "wall_s": round(wall, 3),
+        "session_s": summarize([r["elapsed"] for r in results]),
+        "iteration_latency_s": summarize(iteration_latency),
+        "llm_wait_s": summarize([t["llm_s"] for t in timings]),
+        "tool_wait_s": summarize([t["tool_wait_s"] for t in timings]),
+        "time_split": {"llm_wait_s": round(llm, 3), "tool_wait_s": round(tool, 3),
+                       "limiter_idle_s": round(limiter.stats["wait_time"], 3)},
+        "prompt_bytes": summarize([t["prompt_bytes"] for t in timings]),
+        "prompt_bytes_by_iteration": {str(i): round(statistics.fmean(t["prompt_bytes"] for t in timings if t["iteration"] == i))
+                                      for i in sorted({t["iteration"] for t in timings})},
+        "llm_calls": poe.stats["calls"],
+        "connections": poe.stats["connections"],
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-sec", type=float, default=80)
+    parser.add_argument("--poe-rate", type=float, default=1000, help="limiter requests/sec for the run")
+    parser.add_argument("--script", help="JSON file with a list of tool call replies for the fake bot")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    #tool results are not cached between runs, that would hide the tool cost
+    os.environ.setdefault("TOOL_CACHE_PATH", "")
+    from fake_poe_bot import start_fake_bot
+    script = json.load(open(args.script)) if args.script else None
+    server, bot, base_url = start_fake_bot(args.ttft_ms / 1000, args.tokens_per_sec, script)
+    agent = load_agent()
+    results, wall, poe, limiter = asyncio.run(run(agent, args, base_url))
+    server.should_exit = True
+    summary = report(results, wall, poe, limiter, args)
+    print(json.dumps(summary, indent=2))
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+import argparse, json, os, shutil, sys, tempfile, time, tracemalloc
+
+#Benchmark for output_capture.py
+#runs commands that print 1..N MB through async_exec.run_command with the bounded capture and
+#with a stand-in for the old capture (every chunk kept and joined), and reports peak Python
+#memory (tracemalloc), wall time and the size of the text handed to the LLM.
+#usage: python3 benchmarks/bench_output_capture.py --sizes-mb 1 10 50 --json out.json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from async_exec import run_command_sync
+from output_capture import OutputCapture, SpillDir
+
+#what run_command did before: keep every chunk, join them at the end
+class FullCapture(OutputCapture):
+    def __init__(self, command):
+        super().__init__(command, spill=False)
+        self.chunks = []
+
+    def write(self, data):
+        self.bytes += len(data)
+        self.lines += data.count(b"\n")
+        self.chunks.append(data)
+
+    def text(self):
+        return b"".join(self.chunks).decode("utf-8", errors="replace")
+
+def measure(command, capture):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = run_command_sync(command, echo=False, capture=capture)
+    text = result.text()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"peak_kb": round(peak / 1024), "seconds": round(elapsed, 3), "prompt_bytes": len(text.encode()),
+            "output_bytes": capture.bytes, "lines": capture.lines, "spilled": capture.path is not None}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    spill_root = tempfile.mkdtemp(prefix="bench_capture_")
+    spill_dir = SpillDir(spill_root)
+    results = []
+    try:
+        for size in args.sizes_mb:
+            command = f"yes 'drwxr-xr-x 2 root root 4096 Jan 01 00:00 /usr/lib/some/setuid/file' | head -c {int(size * 1024 * 1024)}"
+            bounded = measure(command, OutputCapture(command, spill_dir=spill_dir))
+            full = measure(command, FullCapture(command))
+            results.append({"size_mb": size, "bounded": bounded, "full": full})
+            print(f"{size:6.1f} MB: bounded peak {bounded['peak_kb']:>8} KB, {bounded['seconds']:.3f}s, "
+                  f"{bounded['prompt_bytes']} prompt bytes | full peak {full['peak_kb']:>8} KB, "
+                  f"{full['seconds']:.3f}s, {full['prompt_bytes']} prompt bytes")
+    finally:
+        shutil.rmtree(spill_root, ignore_errors=True)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+import argparse, json, os, random, string, sys, time
+
+#Micro benchmark for command_policy.py
+#builds a policy with N generated allow/deny rules (per program rules plus a share of `*`
+#rules), then times check() on a mix of agent style commands and compares it with the old
+#substring scan. also prints the verdicts on commands the substring scan gets wrong.
+#usage: python3 benchmarks/bench_policy.py --rules 10000 --json out.json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from command_policy import DYNAMIC, CommandPolicy, Rule
+
+PROHIBITED = ['sudo', 'runas', 'del', 'rm', 'chmod', 'icacls']
+
+COMMANDS = [
+    "uname -a",
+    "cat /etc/os-release",
+    "sysctl -a 2>/dev/null | grep -E 'kernel.(randomize|kptr)'",
+    "ls -la /etc/ssh && stat -c '%a %U' /etc/ssh/sshd_config",
+    "systemctl list-units --type=service --state=running | head -40",
+    "find /etc -maxdepth 2 -perm -o+w -type f 2>/dev/null",
+    "sh -c \"getent passwd | awk -F: '$3 == 0 {print $1}'\"",
+    "echo $(id -u) $(hostname)",
+    "/usr/bin/env LANG=C ss -tulpn",
+    "powershell -Command Get-BitLockerVolume",
+]
+
+#commands the substring scan gets wrong, with the verdict a shell aware check should give
+TRICKY = [
+    ("format-table -auto", True), ("python3 model.py", True), ("echo 'permission denied'", True),
+    ("/bin/rm -rf /tmp/x", False), ("echo $(rm -rf ~)", False), ("ls | xargs rm", False),
+    ("sh -c 'chmod 777 /etc/shadow'", False), (r"find / -name x -exec rm {} \;", False),
+    ("cmd /c \"del C:\\Windows\\x\"", False), ("alias ll=rm; ll -rf /", False),
+    ("bash -lc 'rm x'", False), ("bash -c -- 'rm x'", False), (r"r\m x", False),
+    ("$(echo rm) -rf /", False), ("x=rm; $x -rf /", False), ("r$(echo)m x", False),
+    ("rm${IFS}-rf /", False), ("r${x}m x", False), ("/bin/r? x", False), ("/bin/r* x", False),
+    ("rm\\\n -rf /", False), ("sudo\\\n ls", False), ("ch\\\nmod 777 x", False), ("cat x | sh", False),
+]
+
+def generate_rules(count, seed=7):
+    rng = random.Random(seed)
+    programs = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+                for _ in range(max(count // 5, 1))]
+    rules = [Rule("deny", p, "*", f"prohibited_commands[{i}]") for i, p in enumerate(PROHIBITED)]
+    rules.append(Rule("deny", DYNAMIC, "*", "default"))
+    for i in range(count - len(rules)):
+        action = rng.choice(("allow", "deny"))
+        if rng.random() < 0.02:
+            program, args = "*", f"*/{rng.choice(programs)}/*"
+        else:
+            program = rng.choice(programs)
+            args = rng.choice(["*", f"-{rng.choice(string.ascii_letters)} *", f"* /{rng.choice(programs)}*",
+                               f"--{rng.choice(programs)}=*"])
+        rules.append(Rule(action, program, args, f"generated:{i}"))
+    return rules
+
+def per_call(fn, items, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            fn(item)
+    return (time.perf_counter() - start) / (repeat * len(items))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    rules = generate_rules(args.rules)
+    start = time.perf_counter()
+    policy = CommandPolicy(rules)
+    compile_s = time.perf_counter() - start
+    substring = lambda command: any(cmd in command for cmd in PROHIBITED)
+    programs = [r.program for r in rules]
+    substring_10k = lambda command: any(cmd in command for cmd in programs)
+
+    results = {
+        "rules": len(rules),
+        "compile_ms": round(compile_s * 1000, 2),
+        "check_us": round(per_call(policy.check, COMMANDS, args.repeat) * 1e6, 2),
+        "substring_6_us": round(per_call(substring, COMMANDS, args.repeat) * 1e6, 2),
+        "substring_10k_us": round(per_call(substring_10k, COMMANDS, max(args.repeat // 20, 1)) * 1e6, 2),
+        "tricky": [],
+    }
+    for command, expected in TRICKY:
+        decision = policy.check(command)
+        results["tricky"].append({"command": command, "allowed": decision.allowed,
+                                  "substring_allowed": not substring(command), "expected": expected,
+                                  "rule": str(decision.rule) if decision.rule else None})
+
+    print(f"{results['rules']} rules compiled in {results['compile_ms']}ms")
+    print(f"check(): {results['check_us']}us per command "
+          f"(substring scan: {results['substring_6_us']}us over 6 entries, "
+          f"{results['substring_10k_us']}us over {len(programs)})")
+    for t in results["tricky"]:
+        mark = "ok" if t["allowed"] == t["expected"] else "WRONG"
+        command = t["command"].replace("\n", "\\n")
+        print(f"  {mark:5} {'allow' if t['allowed'] else 'deny':5} (substring: "
+              f"{'allow' if t['substring_allowed'] else 'deny':5}) {command}  {t['rule'] or ''}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
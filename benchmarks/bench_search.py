@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import argparse, asyncio, json, os, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+#Benchmark for search_tool.py against a local SerpAPI stand-in
+#reports latency for cold, warm (keep-alive) and deduplicated concurrent searches, and
+#the prompt bytes each search adds compared with the old str(results) paste.
+#usage: python3 benchmarks/bench_search.py --latency-ms 80 --searches 20 --json out.json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from search_tool import SearchTool
+
+#shaped like a real google engine response, most of the bulk is metadata the LLM never needs
+def fake_results(query, organic=10):
+    return {
+        "search_metadata": {"id": "x" * 24, "status": "Success", "json_endpoint": "https://serpapi.com/searches/x.json",
+                            "created_at": "2025-01-21 00:00:00 UTC", "total_time_taken": 1.23},
+        "search_parameters": {"engine": "google", "q": query, "location_used": "Weston,Florida,United States",
+                              "google_domain": "google.com", "hl": "en", "gl": "us", "device": "desktop"},
+        "search_information": {"total_results": 123000000, "time_taken_displayed": 0.42, "query_displayed": query},
+        "related_questions": [{"question": f"Related question {i} about {query}?", "snippet": "lorem ipsum " * 20,
+                               "link": f"https://example.com/q{i}"} for i in range(4)],
+        "organic_results": [{"position": i + 1, "title": f"Result {i + 1} for {query}",
+                             "link": f"https://example.com/{i}", "displayed_link": f"example.com > {i}",
+                             "snippet": "Hardening guidance " * 12, "sitelinks": {"inline": [{"title": "a", "link": "b"}] * 4},
+                             "rich_snippet": {"top": {"extensions": ["x", "y", "z"]}}, "source": "Example"}
+                            for i in range(organic)],
+        "related_searches": [{"query": f"{query} {i}", "link": f"https://google.com/search?q={i}"} for i in range(8)],
+        "pagination": {"current": 1, "next": "https://google.com/next", "other_pages": {str(i): "u" for i in range(2, 11)}},
+    }
+
+def start_server(latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+        def do_GET(self):
+            from urllib.parse import urlparse, parse_qs
+            query = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+            Handler.requests += 1
+            time.sleep(latency)
+            body = json.dumps(fake_results(query)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        def log_message(self, *args):
+            pass
+    Handler.requests = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, Handler
+
+async def run(args):
+    server, handler = start_server(args.latency_ms / 1000)
+    url = f"http://127.0.0.1:{server.server_port}/search.json"
+    tool = SearchTool("bench", base_url=url)
+    results = {}
+
+    start = time.perf_counter()
+    first = await tool.search("linux ssh hardening baseline")
+    results["cold_ms"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    for i in range(args.searches):
+        await tool.search(f"warm query {i}")
+    results["warm_avg_ms"] = (time.perf_counter() - start) * 1000 / args.searches
+
+    before = handler.requests
+    start = time.perf_counter()
+    await asyncio.gather(*[tool.search("same concurrent query") for _ in range(args.searches)])
+    results["dedup_concurrent_ms"] = (time.perf_counter() - start) * 1000
+    results["dedup_requests"] = handler.requests - before
+    results["dedup_callers"] = args.searches
+
+    raw = str(fake_results("linux ssh hardening baseline"))
+    results["prompt_bytes_raw"] = len(raw.encode())
+    results["prompt_bytes_compact"] = len(first.encode())
+    results["prompt_bytes_saved_pct"] = round(100 - results["prompt_bytes_compact"] / results["prompt_bytes_raw"] * 100, 1)
+    results["latency_ms_server"] = args.latency_ms
+    await tool.close()
+    server.shutdown()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=float, default=50, help="stand-in server latency per request")
+    parser.add_argument("--searches", type=int, default=20)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    results = asyncio.run(run(args))
+    for key, value in results.items():
+        print(f"{key:24} {value:.1f}" if isinstance(value, float) else f"{key:24} {value}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
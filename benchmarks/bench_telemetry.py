@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+import argparse, json, math, os, random, shutil, string, sys, tempfile, time, datetime
+
+#Benchmark for telemetry.py
+#writes --events behavior events the way the conmon agent did (open agent_behavior.log,
+#timestamp, json.dumps, write, close per event) and through Telemetry.emit() and span(),
+#and reports the time per event on the agent's thread, the time until all of them are on
+#disk, and whether the written lines parse back to the same events. then compares the old
+#per-character str.count entropy with shannon_entropy() on responses of --sizes characters.
+#usage: python3 benchmarks/bench_telemetry.py --events 20000 --sizes 1000 10000 100000 --json out.json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from telemetry import Telemetry, shannon_entropy
+
+SESSION = "bench-host-1-1700000000"
+
+def events(count, seed=3):
+    rng = random.Random(seed)
+    for i in range(count):
+        if i % 3:
+            yield "inference", {"inference_time": rng.uniform(1, 20), "response_length": rng.randint(100, 3000),
+                                "entropy": rng.uniform(4, 5), "input_tokens": rng.randint(500, 8000),
+                                "iteration": i % 5 + 1}
+        else:
+            yield "tool_execution", {"tool_type": "cli", "exec_time": rng.uniform(0, 2), "iteration": i % 5 + 1}
+
+#what the agent did before for every event
+def old_write(path, items):
+    start = time.perf_counter()
+    for event, fields in items:
+        log_entry = {"event": event, **fields, "session": SESSION}
+        with open(path, "a") as logf:
+            timestamp = datetime.datetime.now().isoformat()
+            logf.write(f"{timestamp} {json.dumps(log_entry)}\n")
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed
+
+def emit_write(path, items):
+    telemetry = Telemetry(path, session=SESSION)
+    start = time.perf_counter()
+    for event, fields in items:
+        telemetry.emit(event, **fields)
+    agent = time.perf_counter() - start
+    telemetry.close()
+    return agent, time.perf_counter() - start
+
+def span_write(path, items):
+    telemetry = Telemetry(path, session=SESSION)
+    start = time.perf_counter()
+    for event, fields in items:
+        with telemetry.span(event, "elapsed", **fields):
+            pass
+    agent = time.perf_counter() - start
+    telemetry.close()
+    return agent, time.perf_counter() - start
+
+def read_events(path):
+    with open(path) as f:
+        return [json.loads(line.split(" ", 1)[1]) for line in f]
+
+def old_entropy(text):
+    if not text:
+        return 0.0
+    prob = [float(text.count(c)) / len(text) for c in set(text)]
+    return -sum(p * math.log2(p) for p in prob if p > 0)
+
+def response(size, rng):
+    alphabet = string.ascii_letters + string.digits + string.punctuation + " \n" * 10
+    return "".join(rng.choice(alphabet) for _ in range(size))
+
+def timed(fn, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        value = fn(text)
+    return (time.perf_counter() - start) / repeat, value
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="response sizes for entropy")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    items = list(events(args.events))
+    expected = [{"event": event, **fields, "session": SESSION} for event, fields in items]
+    results = {"events": len(items), "writers": {}, "entropy": {}}
+    tmp = tempfile.mkdtemp(prefix="bench_telemetry_")
+    try:
+        for name, writer in (("open per event", old_write), ("Telemetry.emit", emit_write), ("Telemetry.span", span_write)):
+            path = os.path.join(tmp, name.replace(" ", "_") + ".log")
+            agent, total = writer(path, items)
+            written = read_events(path)
+            same = [{k: v for k, v in e.items() if k != "elapsed"} for e in written] == expected
+            r = results["writers"][name] = {"us_per_event": round(agent / len(items) * 1e6, 2),
+                                            "on_disk_s": round(total, 3), "same_events": same}
+            print(f"{name:>15}: {r['us_per_event']:7.2f} us/event on the agent thread, "
+                  f"all on disk after {total:.3f}s, same events: {same}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    rng = random.Random(5)
+    for size in args.sizes:
+        text = response(size, rng)
+        repeat = max(1, 200000 // size)
+        old_s, old_value = timed(old_entropy, text, repeat)
+        new_s, new_value = timed(shannon_entropy, text, repeat)
+        r = results["entropy"][size] = {"old_us": round(old_s * 1e6, 1), "new_us": round(new_s * 1e6, 1),
+                                        "same": math.isclose(old_value, new_value, rel_tol=1e-12)}
+        print(f"entropy, {size:>7,} chars: str.count {r['old_us']:9.1f} us, Counter {r['new_us']:8.1f} us, "
+              f"same value: {r['same']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
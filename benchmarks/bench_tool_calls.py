@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+import argparse, ast, glob, gzip, json, os, sys, time
+
+#Corpus benchmark for tool_calls.py
+#tool_call_corpus.jsonl holds model replies seen from the agents (bare dicts, python quoting,
+#```json fences, prose around the call, nested braces in awk/docker formats, trailing commas,
+#the {"tool": ..., "command": ...} form and unusable replies), each labelled with the tool
+#and argument that should come out, or null when the reply should be rejected. the shared
+#parser is compared with the two parsers it replaced: poe-agent's bare ast.literal_eval and
+#the sechard extract_tool_dict. --replay-dir also counts how many recorded replies in an
+#LLM_REPLAY_PATH store each parser can use (no labels there, so only the parse rate).
+#usage: python3 benchmarks/bench_tool_calls.py --repeat 2000 --json out.json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from tool_calls import ToolRegistry, ToolCallError
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tool_call_corpus.jsonl")
+
+def registry():
+    tools = ToolRegistry()
+    tools.register("cli", None, argument="command")
+    tools.register("serpapi", None, argument="query")
+    tools.register("search", None, argument="query", required=False)
+    return tools
+
+def new_parser(tools):
+    def parse(text):
+        try:
+            call = tools.parse(text)
+        except ToolCallError:
+            return None
+        return call.name, call.argument
+    return parse
+
+#poe-agent.py before the shared parser
+def old_poe(text):
+    try:
+        d = ast.literal_eval(text)
+    except Exception:
+        return None
+    if not isinstance(d, dict):
+        return None
+    if "cli" in d:
+        return "cli", d["cli"]
+    if "serpapi" in d:
+        return "serpapi", d["serpapi"]
+    return None
+
+#extract_tool_dict and the if/elif in the sechard agents before the shared parser
+def old_sechard(text):
+    if text.startswith("```"):
+        text = text.strip("`\n ")
+        if text.lower().startswith("json"):
+            text = text[4:].strip()
+    try:
+        d = ast.literal_eval(text)
+    except Exception:
+        return None
+    if not isinstance(d, dict):
+        return None
+    if "cli" in d:
+        return "cli", d["cli"]
+    if d.get("tool") == "cli" and d.get("command"):
+        return "cli", d["command"]
+    if d.get("tool") == "search":
+        return "search", d.get("query")
+    return None
+
+def load_corpus(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def load_replays(path):
+    replies = []
+    for name in sorted(glob.glob(os.path.join(path, "*.json.gz"))):
+        with gzip.open(name, "rt") as f:
+            replies.append("".join(text for _, text in json.load(f)["chunks"]))
+    return replies
+
+def score(parse, corpus):
+    correct = 0
+    for row in corpus:
+        expected = (row["tool"], row["argument"]) if row["tool"] else None
+        correct += parse(row["reply"]) == expected
+    return correct
+
+def throughput(parse, replies, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for reply in replies:
+            parse(reply)
+    return repeat * len(replies) / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--replay-dir", help="also parse the replies recorded in this LLM_REPLAY_PATH")
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    replies = [row["reply"] for row in corpus]
+    usable = sum(1 for row in corpus if row["tool"])
+    recorded = load_replays(args.replay_dir) if args.replay_dir else []
+    parsers = {"tool_calls": new_parser(registry()), "old_poe": old_poe, "old_sechard": old_sechard}
+
+    results = {"corpus": len(corpus), "usable": usable, "recorded": len(recorded), "parsers": {}}
+    for name, parse in parsers.items():
+        correct = score(parse, corpus)
+        results["parsers"][name] = {
+            "correct": correct,
+            "correct_pct": round(100 * correct / len(corpus), 1),
+            "usable_parsed": sum(1 for row in corpus if row["tool"] and parse(row["reply"]) is not None),
+            "replies_per_s": round(throughput(parse, replies, args.repeat)),
+            "recorded_parsed": sum(1 for reply in recorded if parse(reply) is not None),
+        }
+
+    print(f"{len(corpus)} labelled replies ({usable} with a usable tool call)"
+          + (f", {len(recorded)} recorded replies from {args.replay_dir}" if args.replay_dir else ""))
+    for name, r in results["parsers"].items():
+        line = (f"  {name:12} {r['correct']:3}/{len(corpus)} correct ({r['correct_pct']}%), "
+                f"{r['usable_parsed']}/{usable} usable replies parsed, {r['replies_per_s']:,} replies/s")
+        if args.replay_dir:
+            line += f", {r['recorded_parsed']}/{len(recorded)} recorded parsed"
+        print(line)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+import argparse, asyncio, json, socket, threading, time
+import fastapi_poe as fp
+import uvicorn
+
+#Local fastapi_poe compatible fake bot for benchmarks
+#streams scripted replies with a configurable time to first token and token rate. the reply is
+#picked by how many bot turns the request already contains, so concurrent sessions each walk
+#the script from the start. point the agent at it with POE_BASE_URL=http://127.0.0.1:<port>/
+#usage: python3 benchmarks/fake_poe_bot.py --port 8080 --ttft-ms 400 --tokens-per-sec 60
+
+DEFAULT_SCRIPT = [
+    {"cli": "uname -a", "thought": "Identify the kernel and OS family before choosing checks. " * 6},
+    {"cli": "cat /etc/os-release", "thought": "Confirm the distribution and version for the right baseline. " * 6},
+    {"cli": "sysctl -a 2>/dev/null | head -40", "thought": "Review kernel hardening parameters. " * 6},
+    {"cli": "ls -la /etc/ssh", "thought": "Check SSH daemon configuration files and permissions. " * 6},
+    {"cli": "id", "thought": "Confirm we are running unprivileged. " * 6},
+]
+DEFAULT_FINAL = "Summary: the host enumeration is complete. Recommended next steps: apply the CIS baseline. " * 4
+
+class FakeBot(fp.PoeBot):
+    def __init__(self, ttft, tokens_per_sec, script=None, final=DEFAULT_FINAL, chars_per_token=4, **kwargs):
+        super().__init__(**kwargs)
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.script = script or DEFAULT_SCRIPT
+        self.final = final
+        self.chars_per_token = chars_per_token
+        self.requests = 0
+
+    def reply_for(self, request):
+        turn = sum(1 for m in request.query if m.role == "bot")
+        if "FINAL user input" in request.query[-1].content or turn >= len(self.script):
+            return self.final
+        return json.dumps(self.script[turn])
+
+    async def get_response(self, request):
+        self.requests += 1
+        text = self.reply_for(request)
+        await asyncio.sleep(self.ttft)
+        step = self.chars_per_token
+        delay = 1 / self.tokens_per_sec if self.tokens_per_sec else 0
+        for i in range(0, len(text), step):
+            if i and delay:
+                await asyncio.sleep(delay)
+            yield fp.PartialResponse(text=text[i:i + step])
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+#starts the bot on a background thread, returns (server, bot, base_url)
+def start_fake_bot(ttft=0.3, tokens_per_sec=80, script=None, bot_name="Claude-3.5-Sonnet", port=None):
+    port = port or free_port()
+    bot = FakeBot(ttft, tokens_per_sec, script, path=f"/{bot_name}")
+    app = fp.make_app(bot, allow_without_key=True)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, bot, f"http://127.0.0.1:{port}/"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-sec", type=float, default=80)
+    parser.add_argument("--script", help="JSON file with a list of tool call replies")
+    args = parser.parse_args()
+    script = json.load(open(args.script)) if args.script else None
+    server, bot, url = start_fake_bot(args.ttft_ms / 1000, args.tokens_per_sec, script, port=args.port)
+    print(f"Fake Poe bot listening, export POE_BASE_URL={url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.should_exit = True
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+import os, re, shlex
+from collections import namedtuple
+
+#Shell aware command policy for the agents' cli tool
+#replaces the `any(cmd in command for cmd in prohibited_commands)` substring scan, which blocked
+#`format` (contains rm) and `model` (contains del) but let `/bin/rm`, `$(rm ...)`, `sh -c "rm ..."`
+#or `xargs rm` through. the command is tokenized like a shell would, split into simple commands
+#at pipes, lists and subshells, and every program that would run is resolved: paths are reduced
+#to the basename, wrappers (sudo, env, xargs, timeout, find -exec, ...) are checked together with
+#the program they run, and sh -c / eval / cmd /c / powershell -c strings, $(...) and backticks
+#are parsed recursively.
+#
+#rules are `<allow|deny> <program> [args glob]`, one per line, first match wins:
+#    default allow            (or deny, for allowlist baselines)
+#    deny sudo
+#    deny chmod * 777 *
+#    allow git status*
+#    deny * */dev/sd*         (* as program applies to every program)
+#    deny <dynamic>           (program is a $variable, substitution or glob, or a shell
+#                              reads its script from stdin)
+#the rules for each program are compiled into one trie shaped regex, so a check costs a dict
+#lookup plus one regex match per invocation however many rules there are. only when that
+#matches are the program's rules walked in order to name the first one that applies.
+#COMMAND_POLICY=<file> loads rules from a file instead of the agent's prohibited_commands list
+#NO EXPRESSED WARRANTY. Licensed under MIT
+
+COMMAND_POLICY = os.environ.get("COMMAND_POLICY", "")
+
+DYNAMIC = "<dynamic>"
+
+#one regex match per shell token instead of shlex's character at a time lexer
+_TOKEN = re.compile(r"""
+    (?P<ws>[ \t\r]+)
+  | (?P<comment>(?<![^\s;&|()])\#[^\n]*)
+  | (?P<redir>\d*(?:>>|>&|<&|&>>?|<<<|<<-?|>\||<>|>|<)(?!\())
+  | (?P<sep>\|\||&&|;;&?|;&|\|&|[|;&()\n])
+  | (?P<sq>'[^']*')
+  | (?P<dq>"(?:[^"\\]|\\.)*")
+  | (?P<arith>\$\(\((?:[^)]|\)(?!\)))*\)\))
+  | (?P<subst>\$\(|[<>]\(|`)
+  | (?P<esc>\\.)
+  | (?P<bare>[^\s'"\\|;&()<>`$\#]+|[$\#])
+""", re.X | re.S)
+
+#wrappers run another program; the value is the options that take an argument
+WRAPPERS = {
+    "sudo": {"-u", "-g", "-C", "-h", "-p", "-r", "-t", "-U", "-D"}, "doas": {"-u", "-C"},
+    "env": {"-u", "-C", "-S"}, "nohup": set(), "time": {"-f", "-o"}, "nice": {"-n"},
+    "ionice": {"-c", "-n", "-p"}, "timeout": {"-s", "-k"}, "stdbuf": {"-i", "-o", "-e"},
+    "exec": {"-a"}, "command": set(), "builtin": set(), "xargs": {"-I", "-n", "-P", "-d", "-L", "-s", "-a", "-E"},
+    "watch": {"-n", "-d"}, "strace": {"-e", "-o", "-p", "-s"}, "chroot": set(), "runas": set(),
+    "busybox": set(), "setsid": set(), "unbuffer": set(), "flock": {"-w", "-E"}, "caffeinate": set(),
+}
+#positional arguments a wrapper takes before the program
+_WRAPPER_POSITIONAL = {"timeout": 1, "chroot": 1, "flock": 1}
+SHELLS = {"sh", "bash", "zsh", "dash", "ksh", "fish", "ash", "su"}
+_KEYWORDS = {"{", "}", "!", "if", "then", "else", "elif", "fi", "do", "done", "while", "until",
+             "for", "case", "esac", "in", "function", "select", "coproc"}
+_WINDOWS_SUFFIXES = (".exe", ".cmd", ".bat", ".com", ".ps1")
+_WINDOWS_PATH = re.compile(r"[A-Za-z]:\\|\\\\|\.\.?\\")
+#a short option cluster that includes -c (bash -lc, sh -ec)
+_SHELL_C = re.compile(r"-[A-Za-z]*c[A-Za-z]*")
+#shell options that take a value
+_SHELL_VALUE_OPTIONS = {"-o", "+o", "-O", "+O", "--rcfile", "--init-file"}
+_DYNAMIC_WORD = re.compile(r"[$`*?\[]")
+
+class Rule(namedtuple("Rule", "action program args source")):
+    def __str__(self):
+        return f"{self.action} {self.program} {self.args} ({self.source})"
+
+Decision = namedtuple("Decision", "allowed rule invocation")
+
+def _glob_tokens(pattern):
+    tokens = []
+    for c in pattern:
+        if c == "*":
+            if tokens[-1:] != [".*"]:
+                tokens.append(".*")
+        else:
+            tokens.append("." if c == "?" else re.escape(c))
+    return tokens
+
+#all patterns of a rule set merged into one trie shaped regex: shared prefixes are matched
+#once, so the whole set is tested in a single pass
+def _trie_regex(token_lists):
+    trie = {}
+    for tokens in token_lists:
+        node = trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        node[""] = None
+    def emit(node):
+        end = "" in node
+        alternatives = [token + emit(child) for token, child in node.items() if token != ""]
+        if not alternatives:
+            return ""
+        if len(alternatives) == 1 and not end:
+            return alternatives[0]
+        return "(?:" + "|".join(alternatives) + ")" + ("?" if end else "")
+    return re.compile(emit(trie), re.S)
+
+#C:\..., \\server\..., .\... or ..\..., or a backslash path to a .exe/.cmd/...
+def _windows_path(word):
+    return bool(_WINDOWS_PATH.match(word)) or ("\\" in word and word.lower().endswith(_WINDOWS_SUFFIXES))
+
+#a program word with an expansion ($x, ${IFS}, $(...), `...`) or a glob (/bin/r?) is only
+#known at run time; [ and [[ are the test builtins
+def program_name(word):
+    if word not in ("[", "[[") and _DYNAMIC_WORD.search(word):
+        return DYNAMIC
+    name = re.split(r"[\\/]", word)[-1] if _windows_path(word) else word.rsplit("/", 1)[-1]
+    if name.lower().endswith(_WINDOWS_SUFFIXES):
+        name = name.lower().rsplit(".", 1)[0]
+    return name
+
+#index of the character closing a substitution that starts at start
+def _closing(text, start, opener):
+    if opener == "`":
+        end = text.find("`", start)
+        return len(text) if end < 0 else end
+    depth, i = 1, start
+    while i < len(text):
+        c = text[i]
+        if c in "'\"":
+            close = text.find(c, i + 1)
+            i = len(text) if close < 0 else close
+        elif c == "\\":
+            i += 1
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+            if not depth:
+                return i
+        i += 1
+    return len(text)
+
+def _double_quoted(content, inner):
+    if "\\" not in content and "$(" not in content and "`" not in content:
+        return content
+    out, i = [], 0
+    while i < len(content):
+        c = content[i]
+        if c == "\\" and i + 1 < len(content):
+            if content[i + 1] in '$`"\\':
+                out.append(content[i + 1])
+            elif content[i + 1] != "\n":  #a line continuation is dropped
+                out.append(content[i:i + 2])
+            i += 2
+        elif content.startswith("$(", i) and not content.startswith("$((", i) or c == "`":
+            start = i + (1 if c == "`" else 2)
+            end = _closing(content, start, "`" if c == "`" else "$(")
+            inner.append(content[start:end])
+            out.append("$(...)")
+            i = end + 1
+        else:
+            out.append(c)
+            i += 1
+    return "".join(out)
+
+#splits a command line into simple commands (lists of words) at pipes, lists and subshells.
+#$(...), <(...), >(...) and backticks become the word $(...) and their commands are returned
+#separately. redirection operators are kept as words. backslash escapes are removed like a
+#shell does (r\m is rm), except in unquoted words that look like Windows paths, and a
+#backslash-newline line continuation joins the lines
+def tokenize(command):
+    commands, words, word, raw, inner = [], [], None, "", []
+    pos, n = 0, len(command)
+    while pos < n:
+        match = _TOKEN.match(command, pos)
+        if match is None:
+            raise ValueError(f"unbalanced quote at position {pos}")
+        kind, text, pos = match.lastgroup, match.group(), match.end()
+        if text == "\\\n":
+            continue
+        if kind in ("ws", "comment", "sep", "redir"):
+            if word is not None:
+                words.append(raw if raw is not None and _windows_path(raw) else word)
+                word = None
+            if kind == "redir":
+                words.append(text)
+            elif kind == "sep" and words:
+                commands.append(words)
+                words = []
+            continue
+        if kind == "sq":
+            piece = text[1:-1]
+        elif kind == "dq":
+            piece = _double_quoted(text[1:-1], inner)
+        elif kind == "subst":
+            end = _closing(command, pos, text[0] if text == "`" else "$(")
+            inner.append(command[pos:end])
+            piece, pos = "$(...)", end + 1
+        elif kind == "esc":
+            piece = text[1]
+        else:
+            piece = text
+        if word is None:
+            raw = ""
+        #the unescaped text of a word made of bare text and escapes only
+        raw = raw + text if raw is not None and kind in ("bare", "esc") else None
+        word = piece if word is None else word + piece
+    if word is not None:
+        words.append(raw if raw is not None and _windows_path(raw) else word)
+    if words:
+        commands.append(words)
+    return commands, inner
+
+#every (program, args) that would run for the command, in order
+def resolve(command, aliases=None, depth=0):
+    invocations = []
+    if depth > 8:
+        return [(DYNAMIC, command)]
+    aliases = dict(aliases or {})
+    commands, inner = tokenize(command)
+    for nested in inner:
+        invocations += resolve(nested, aliases, depth + 1)
+    for words in commands:
+        _resolve_words(words, aliases, invocations, depth)
+    return invocations
+
+#a shell without -c runs its first operand as a script file, without one (or with -s) it
+#reads the script from stdin; su's operands are the user and its arguments
+def _reads_stdin(program, args):
+    if program == "su":
+        return True
+    j = 0
+    while j < len(args):
+        arg = args[j]
+        if arg == "--":
+            return j + 1 >= len(args)
+        if arg == "-s" or arg == "-":
+            return True
+        if not arg.startswith(("-", "+")):
+            return False
+        j += 2 if arg in _SHELL_VALUE_OPTIONS else 1
+    return True
+
+def _resolve_words(words, aliases, invocations, depth):
+    i = 0
+    while i < len(words):
+        word = words[i]
+        if word in _KEYWORDS or re.match(r"^[A-Za-z_][A-Za-z0-9_]*=", word):
+            i += 1
+        elif set(word) <= set("<>&0123456789") and set(word) & set("<>"):
+            i += 2
+        else:
+            break
+    if i >= len(words):
+        return
+    if words[i] in aliases:
+        words = words[:i] + shlex.split(aliases[words[i]]) + words[i + 1:]
+    program, args = program_name(words[i]), words[i + 1:]
+    invocations.append((program, " ".join(args)))
+
+    if program == "alias":
+        for arg in args:
+            name, _, value = arg.partition("=")
+            aliases[name] = value
+    elif program in WRAPPERS:
+        j, skip = 0, _WRAPPER_POSITIONAL.get(program, 0)
+        while j < len(args) and (args[j].startswith("-") or (program == "env" and "=" in args[j])):
+            j += 2 if args[j] in WRAPPERS[program] else 1
+        j += skip
+        if program == "xargs" or j < len(args):
+            _resolve_words(args[j:], aliases, invocations, depth)
+    elif program in SHELLS or program == "eval":
+        script = None
+        if program == "eval":
+            script = " ".join(args)
+        else:
+            flag = next((j for j, arg in enumerate(args) if _SHELL_C.fullmatch(arg)), None)
+            rest = args[flag + 1:] if flag is not None else []
+            if rest[:1] == ["--"]:
+                rest = rest[1:]
+            script = rest[0] if rest else None
+            if flag is None and _reads_stdin(program, args):
+                #cat x | sh: the script is whatever comes in on stdin
+                invocations.append((DYNAMIC, "<stdin>"))
+        if script:
+            invocations += resolve(script, aliases, depth + 1)
+    elif program == "cmd":
+        flags = [a.lower() for a in args]
+        for flag in ("/c", "/k"):
+            if flag in flags:
+                invocations += resolve(" ".join(args[flags.index(flag) + 1:]), aliases, depth + 1)
+                break
+    elif program in ("powershell", "pwsh"):
+        flags = [a.lower() for a in args]
+        for flag in ("-command", "-c"):
+            if flag in flags:
+                invocations += resolve(" ".join(args[flags.index(flag) + 1:]), aliases, depth + 1)
+                break
+    elif program == "find":
+        for j, arg in enumerate(args):
+            if arg in ("-exec", "-execdir", "-ok", "-okdir"):
+                end = next((k for k in range(j + 1, len(args)) if args[k] in (";", "+")), len(args))
+                _resolve_words(args[j + 1:end], aliases, invocations, depth)
+
+#the rules for one program (or for `*`) in file order, behind a single trie regex gate
+class _RuleSet:
+    def __init__(self, rules, indexes):
+        self.rules = rules
+        self.indexes = indexes
+        self.gate = _trie_regex([_glob_tokens(rules[i].args) for i in indexes])
+        self.patterns = {}
+
+    #index of the first rule matching args, only rules before `before` are considered
+    def first(self, args, before=None):
+        if not self.gate.fullmatch(args):
+            return None
+        for i in self.indexes:
+            if before is not None and i >= before:
+                return None
+            pattern = self.rules[i].args
+            if pattern == "*":
+                return i
+            regex = self.patterns.get(i)
+            if regex is None:
+                regex = self.patterns[i] = re.compile("".join(_glob_tokens(pattern)), re.S)
+            if regex.fullmatch(args):
+                return i
+        return None
+
+class CommandPolicy:
+    def __init__(self, rules, default="allow"):
+        if default not in ("allow", "deny"):
+            raise ValueError(f"default must be allow or deny, not {default!r}")
+        self.rules = list(rules)
+        self.default = default
+        by_program = {}
+        for index, rule in enumerate(self.rules):
+            by_program.setdefault(rule.program, []).append(index)
+        wildcard = by_program.pop("*", None)
+        self.wildcard = _RuleSet(self.rules, wildcard) if wildcard else None
+        self.compiled = {program: _RuleSet(self.rules, indexes) for program, indexes in by_program.items()}
+
+    #first rule in file order for this program, from its own rules or the * rules
+    def match(self, program, args):
+        ruleset = self.compiled.get(program)
+        best = ruleset.first(args) if ruleset else None
+        if self.wildcard:
+            hit = self.wildcard.first(args, best)
+            best = hit if hit is not None else best
+        return None if best is None else self.rules[best]
+
+    def check(self, command):
+        try:
+            invocations = resolve(command)
+        except ValueError as e:
+            return Decision(False, None, f"unparseable command: {e}")
+        first = None
+        for program, args in invocations:
+            rule = self.match(program, args)
+            allowed = (rule.action if rule else self.default) == "allow"
+            decision = Decision(allowed, rule, f"{program} {args}".rstrip())
+            if not allowed:
+                return decision
+            first = first or decision
+        return first or Decision(self.default == "allow", None, "")
+
+    @classmethod
+    def from_text(cls, text, source="<policy>"):
+        rules, default = [], "allow"
+        for number, line in enumerate(text.splitlines(), 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split(None, 2)
+            if parts[0] == "default" and len(parts) == 2:
+                default = parts[1]
+            elif parts[0] in ("allow", "deny") and len(parts) >= 2:
+                rules.append(Rule(parts[0], parts[1], parts[2] if len(parts) > 2 else "*", f"{source}:{number}"))
+            else:
+                raise ValueError(f"{source}:{number}: expected '<allow|deny> <program> [args]', got {line!r}")
+        return cls(rules, default)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            return cls.from_text(f.read(), path)
+
+    @classmethod
+    def from_denylist(cls, programs):
+        rules = [Rule("deny", p, "*", f"prohibited_commands[{i}]") for i, p in enumerate(programs)]
+        #a program only known at run time ($x, $(echo rm)) could be any of them
+        return cls(rules + [Rule("deny", DYNAMIC, "*", "default")])
+
+#COMMAND_POLICY=<file> if set, otherwise deny the agent's prohibited_commands
+def load_policy(prohibited_commands, path=COMMAND_POLICY):
+    return CommandPolicy.from_file(path) if path else CommandPolicy.from_denylist(prohibited_commands)
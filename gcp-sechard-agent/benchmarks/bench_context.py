@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import argparse, json, os, sys
+
+# Benchmark: input tokens and latency per turn for each SECHARD_CONTEXT_MODE
+# Drives the sechard 1.1 turn sequence (initial prompt, N tool turns, final prompt) through
+# ContextChat with the local FakeBackend standing in for Gemini. The fake charges a fixed
+# overhead plus time per uncached input token, so latency follows the tokens each mode sends.
+# Usage: python3 benchmarks/bench_context.py --iterations 5 --output-kb 4
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", ".."))
+from vertex_context import ContextChat, FakeBackend
+
+def cli_output(iteration, size):
+    return "\n".join(f"-rw-r--r-- 1 root root {i * 37 % 9000:5d} Jan {iteration:2d} /etc/file-{iteration}-{i}"
+                     for i in range(size // 50))
+
+def run(mode, args, base_prompt):
+    backend = FakeBackend(base_latency=args.base_ms / 1000, input_token_s=args.us_per_token / 1e6)
+    chat = ContextChat(backend, base_prompt, mode=mode)
+    user_input = "what OS are we on and what security controls are currently active?"
+    tool_output_history = ""
+    counter = 1
+
+    def build_prompt():
+        return (base_prompt + "\n\n## User Input\n" + user_input +
+                "\n\n## Tool Result Output History\n" + tool_output_history +
+                f"\n\n## Iteration Counter\n{counter}")
+
+    chat.send_message(build_prompt(), "## User Input\n" + user_input + f"\n\n## Iteration Counter\n{counter}")
+    while counter < args.iterations:
+        new_output = "\n\nCLI OUTPUT:\n" + cli_output(counter, args.output_kb * 1024)
+        tool_output_history += new_output
+        counter += 1
+        chat.send_message(build_prompt(), "## Tool Result Output History" + new_output + f"\n\n## Iteration Counter\n{counter}")
+    final_input = "\n\n## FINAL user input\nWe have exhausted all attempts. What recommended next steps should we action?"
+    chat.send_message(build_prompt() + final_input, final_input.lstrip())
+    chat.close()
+    return chat
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--output-kb", type=int, default=4, help="CLI output added per iteration")
+    parser.add_argument("--base-ms", type=float, default=50, help="fake per-request overhead")
+    parser.add_argument("--us-per-token", type=float, default=20, help="fake cost per uncached input token")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    with open(os.path.join(HERE, "..", "prompt.md")) as f:
+        base_prompt = f.read()
+    results = {}
+    for mode in ("full", "system", "cached"):
+        chat = run(mode, args, base_prompt)
+        print(chat.report())
+        results[mode] = {"turns": chat.turns,
+                         "input_tokens": sum(t["input_tokens"] for t in chat.turns),
+                         "latency_s": round(sum(t["latency_s"] for t in chat.turns), 3)}
+    full = results["full"]["input_tokens"]
+    for mode, r in results.items():
+        print(f"{mode:>7}: {r['input_tokens']:>7} input tokens ({r['input_tokens'] / full:.0%} of full), "
+              f"{r['latency_s']:.2f}s total")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "modes": results}, f, indent=2)
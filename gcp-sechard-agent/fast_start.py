@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+import json, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Fast start helpers for the sechard agents
+# Heavy SDK imports and client construction run on background threads while the agent waits
+# for input, each step timed so --profile-startup can show where launch time goes. The
+# "template verified" state is cached on disk so the Model Armor template is not re-checked
+# on every run.
+
+TEMPLATE_CACHE_PATH = os.path.expanduser(os.environ.get("SECHARD_TEMPLATE_CACHE", "~/.cache/sechard-agent/templates.json"))
+TEMPLATE_CACHE_TTL = float(os.environ.get("SECHARD_TEMPLATE_TTL", "86400"))
+
+class StartupProfile:
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.phases = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.phases.append((name, threading.current_thread().name, start - self.t0,
+                                    time.perf_counter() - start))
+
+    def report(self):
+        lines = ["Startup profile (offset, duration, thread, phase):"]
+        for name, thread, offset, elapsed in sorted(self.phases, key=lambda p: p[2]):
+            lines.append(f"  {offset * 1000:8.1f}ms {elapsed * 1000:8.1f}ms  {thread:<12} {name}")
+        lines.append(f"  ready after {(time.perf_counter() - self.t0) * 1000:.1f}ms")
+        return "\n".join(lines)
+
+# Runs init functions concurrently; get() blocks only on the one the caller needs
+class LazyInit:
+    def __init__(self, profile, workers=4):
+        self.profile = profile
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="init")
+        self.futures = {}
+
+    def start(self, **inits):
+        for name, init in inits.items():
+            self.futures[name] = self.pool.submit(init)
+
+    def get(self, name):
+        future = self.futures[name]
+        if future.done():
+            return future.result()
+        with self.profile.phase(f"wait for {name}"):
+            return future.result()
+
+def _load_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_cache(path, cache):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp, path)
+
+def template_verified(template_path, path=TEMPLATE_CACHE_PATH, ttl=TEMPLATE_CACHE_TTL):
+    verified = _load_cache(path).get(template_path)
+    return verified is not None and time.time() - verified < ttl
+
+def mark_template_verified(template_path, path=TEMPLATE_CACHE_PATH):
+    cache = _load_cache(path)
+    cache[template_path] = time.time()
+    _save_cache(path, cache)
+
+def forget_template(template_path, path=TEMPLATE_CACHE_PATH):
+    cache = _load_cache(path)
+    if cache.pop(template_path, None) is not None:
+        _save_cache(path, cache)
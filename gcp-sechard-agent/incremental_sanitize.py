@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+import hashlib, os, threading, time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Incremental Model Armor sanitization
+# Every turn used to re-scan the whole prompt: prompt.md, the user input and the entire tool
+# output history. Here the prompt is handled as a list of segments; segments that already
+# passed are remembered by fingerprint, and only new ones (latest CLI output, new model
+# response) are sent, split on line boundaries to fit the request size limit and scanned
+# concurrently. The section headers and iteration counter are generated by the agent itself
+# and are not sent.
+#
+# `scan(text, is_user)` is the agent's existing sanitize(): it returns the sanitized text and
+# raises when Model Armor blocks, so verdicts are the same as before, just per segment.
+# Sanitizers can share one VerdictCache, e.g. the sessions of a daemon; it keeps the
+# MODEL_ARMOR_VERDICTS most recently used verdicts so a long running daemon stays bounded.
+
+MODEL_ARMOR_MAX_CHARS = int(os.environ.get("MODEL_ARMOR_MAX_CHARS", "10000"))
+MODEL_ARMOR_WORKERS = int(os.environ.get("MODEL_ARMOR_WORKERS", "4"))
+MODEL_ARMOR_VERDICTS = int(os.environ.get("MODEL_ARMOR_VERDICTS", "4096"))
+
+def fingerprint(text, is_user):
+    return ("u" if is_user else "m") + hashlib.sha256(text.encode()).hexdigest()
+
+# Split on line boundaries where possible so a request never exceeds max_chars
+def split_text(text, max_chars):
+    if len(text) <= max_chars:
+        return [text]
+    pieces, start = [], 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            newline = text.rfind("\n", start, end)
+            if newline > start:
+                end = newline + 1
+        pieces.append(text[start:end])
+        start = end
+    return pieces
+
+# Sanitized text by fingerprint, least recently used evicted first; safe to share across threads
+class VerdictCache:
+    def __init__(self, size=MODEL_ARMOR_VERDICTS):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+class IncrementalSanitizer:
+    def __init__(self, scan, max_chars=MODEL_ARMOR_MAX_CHARS, workers=MODEL_ARMOR_WORKERS, verdicts=None):
+        self.scan = scan
+        self.max_chars = max_chars
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.verdicts = VerdictCache() if verdicts is None else verdicts
+        self.stats = {"calls": 0, "segments": 0, "cached": 0, "requests": 0,
+                      "chars_scanned": 0, "scan_time": 0.0}
+
+    # Returns the sanitized text of each segment, in order
+    def sanitize_segments(self, segments, is_user=True):
+        start = time.perf_counter()
+        self.stats["calls"] += 1
+        self.stats["segments"] += len(segments)
+        # Looked up once per call, so an eviction in between cannot lose a verdict
+        known, new = {}, []
+        for segment in segments:
+            verdict = known.get(segment)
+            if verdict is None:
+                verdict = self.verdicts.get(fingerprint(segment, is_user))
+            if verdict is not None:
+                known[segment] = verdict
+                self.stats["cached"] += 1
+            elif segment not in new:
+                new.append(segment)
+
+        if new:
+            pieces = [(segment, piece) for segment in new for piece in split_text(segment, self.max_chars)]
+            self.stats["requests"] += len(pieces)
+            self.stats["chars_scanned"] += sum(len(piece) for _, piece in pieces)
+            # Any block raises here, same as scanning the whole prompt did
+            results = list(self.pool.map(lambda p: self.scan(p[1], is_user), pieces))
+            sanitized = {}
+            for (segment, _), result in zip(pieces, results):
+                sanitized[segment] = sanitized.get(segment, "") + (result or "")
+            for segment in new:
+                known[segment] = sanitized[segment]
+                self.verdicts.put(fingerprint(segment, is_user), sanitized[segment])
+
+        self.stats["scan_time"] += time.perf_counter() - start
+        return [known[segment] for segment in segments]
+
+    def sanitize(self, text, is_user=True):
+        return self.sanitize_segments([text], is_user)[0]
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+    def report(self):
+        s = self.stats
+        return (f"Model Armor: {s['calls']} sanitize calls, {s['segments']} segments "
+                f"({s['cached']} cached), {s['requests']} requests, {s['chars_scanned']} chars scanned, "
+                f"{s['scan_time']:.2f}s")
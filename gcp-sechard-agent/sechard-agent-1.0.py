@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 
 import vertexai
-from vertexai.generative_models import GenerativeModel
-import asyncio, os, subprocess, ast, time, logging, sys, random, json
+import asyncio, os, time, logging, sys, random, json
+
+# Shared agent modules live at the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from async_exec import run_command_sync
+from vertex_context import ContextChat, VertexBackend
+from command_policy import load_policy
+from tool_calls import ToolRegistry, ToolCallError, RETRY_HINT
 #from serpapi import GoogleSearch 
 from serpapi.google_search_results import GoogleSearch #new package complaints
 
@@ -12,18 +18,21 @@ from serpapi.google_search_results import GoogleSearch #new package complaints
 
 # Init Vertex AI
 vertexai.init(project="p-gs-dteng-cp", location="us-central1") #<--- dont forget to replace ###
-chat_model = GenerativeModel(model_name="gemini-2.5-pro") #<-- dont forget to replace ###
-chat = chat_model.start_chat()
 
 # Load the full prompt from file
 with open("prompt.md", "r") as f:
     prompt_file = f.read()
 
+# SECHARD_CONTEXT_MODE=system|cached registers prompt.md once and sends only per-turn deltas
+chat = ContextChat(VertexBackend("gemini-2.5-pro"), prompt_file) #<-- dont forget to replace ###
+
 # Read API secrets from environment
 serp_api_key = os.environ["SERP_API"]
 
 # Safety controls
 prohibited_commands = ['sudo', 'runas', 'del', 'rm', 'chmod', 'icacls']
+# COMMAND_POLICY=<rules file> replaces the list, see command_policy.py at the repo root
+command_policy = load_policy(prohibited_commands)
 
 # Tool functions
 def serpapi(query):
@@ -41,9 +50,12 @@ def serpapi(query):
     return str(results)
 
 def cli(command):
-    result = subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    print(result.stdout.decode())
-    return result.stdout.decode()
+    # Output is streamed live; the command's process group is killed on CLI_TIMEOUT.
+    # Gemini gets a head/tail summary, large output is kept in full under CLI_OUTPUT_DIR
+    result = run_command_sync(command)
+    if result.capture.truncated:
+        print(f"[cli output {result.capture.report()}]")
+    return result.text()
 
 # Begin execution
 if __name__ == "__main__":
@@ -66,42 +78,54 @@ if __name__ == "__main__":
     history_prompt = prompt_text
 
     # Initial LLM call
-    response = chat.send_message(history_prompt)
+    response = chat.send_message(history_prompt, "## User Input\n" + user_input + f"\n## Iteration Counter\n{counter}")
     llm_response = response.text
     print("LLM **INITIAL** response output:\n" + llm_response)
     logging.info(llm_response)
 
+    # Tool handlers return the text added to the tool output history
+    def run_cli(command):
+        decision = command_policy.check(command)
+        if not decision.allowed:
+            raise Exception(f"**SAFETY GUARDRAIL TRIGGERED**: Attempted to run privileged command. {decision.invocation} ({decision.rule or 'default ' + command_policy.default})")
+        return f"\n\nCLI OUTPUT:\n{cli(command)}"
+
+    def run_serpapi(query):
+        return f"\n\nSERPAPI OUTPUT:\n{serpapi(query)}"
+
+    tools = ToolRegistry()
+    tools.register("cli", run_cli, argument="command")
+    tools.register("serpapi", run_serpapi, argument="query")
+
     # Agent execution loop
     while counter < 5:
         try:
-            parsed_dict = ast.literal_eval(llm_response.strip())
-        except Exception as e:
+            call = tools.parse(llm_response)
+        except ToolCallError as e:
+            # Hand the problem back to Gemini instead of ending the session
             print(f"Failed to parse response: {e}")
-            break
-
-        if 'cli' in parsed_dict:
-            if any(cmd in parsed_dict['cli'] for cmd in prohibited_commands):
-                raise Exception("**SAFETY GUARDRAIL TRIGGERED**: Attempted to run privileged command.")
-            result = cli(parsed_dict['cli'])
-            tool_output_history += f"\n\nCLI OUTPUT:\n{result}"
-
-        elif 'serpapi' in parsed_dict:
-            result = serpapi(parsed_dict['serpapi'])
-            tool_output_history += f"\n\nSERPAPI OUTPUT:\n{result}"
+            new_output = f"\n\nTOOL CALL ERROR:\n{e}. {RETRY_HINT}"
+        else:
+            new_output = tools.dispatch(call)
+        tool_output_history += new_output
 
         # Rebuild prompt for next iteration
         history_prompt = prompt_text + "\n## Tool Result Output History\n" + tool_output_history + f"\n## Iteration Counter\n{counter}"
         time.sleep(random.randint(3, 6))
 
-        response = chat.send_message(history_prompt)
+        response = chat.send_message(history_prompt, "## Tool Result Output History" + new_output + f"\n## Iteration Counter\n{counter}")
         llm_response = response.text
         print(f"LLM **NEXT** response output (iteration {counter}):\n" + llm_response)
         logging.info(llm_response)
         counter += 1
 
     # Final wrap-up
-    final_prompt = history_prompt + "\n## FINAL user input\nWe have exhausted all attempts. What recommended next steps should we action?"
-    response = chat.send_message(final_prompt)
+    final_input = "\n## FINAL user input\nWe have exhausted all attempts. What recommended next steps should we action?"
+    final_prompt = history_prompt + final_input
+    response = chat.send_message(final_prompt, final_input.lstrip())
     print("LLM **FINAL** response output:\n" + response.text)
     logging.info(response.text)
     logging.info(final_prompt)
+    chat.close()
+    print(chat.report())
+    logging.info(chat.report())
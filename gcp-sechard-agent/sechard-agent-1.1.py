@@ -1,40 +1,39 @@
 #!/usr/bin/env python3
 
 import vertexai
-from vertexai.generative_models import GenerativeModel
-import os, subprocess, time, logging, sys, random, ast
+import os, time, logging, sys, random
+
+# Shared agent modules live at the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from async_exec import run_command_sync
+from vertex_context import ContextChat, VertexBackend
+from command_policy import load_policy
+from tool_calls import ToolRegistry, ToolCallError, RETRY_HINT
 
 # Detect Cloud Shell project automatically
 GCP_PROJECT_ID = os.environ.get("CLOUD_PROJECT") or os.environ["GCP_PROJECT_ID"]
 
 vertexai.init(project=GCP_PROJECT_ID, location="us-central1")
-chat_model = GenerativeModel(model_name="gemini-2.5-pro")
-chat = chat_model.start_chat()
 
 # Load the prompt template
 with open("prompt.md", "r") as f:
     base_prompt = f.read()
 
+# SECHARD_CONTEXT_MODE=system|cached registers prompt.md once and sends only per-turn deltas
+chat = ContextChat(VertexBackend("gemini-2.5-pro"), base_prompt)
+
 # Guardrails
 prohibited_commands = ['sudo', 'runas', 'del', 'rm', 'chmod', 'icacls']
+# COMMAND_POLICY=<rules file> replaces the list, see command_policy.py at the repo root
+command_policy = load_policy(prohibited_commands)
 
 def cli(command):
-    result = subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    output = result.stdout.decode()
-    print(output)
-    return output
-
-def extract_tool_dict(text):
-    # Strip markdown code fences if present
-    if text.startswith("```"):
-        text = text.strip().strip("`").strip()
-        if text.lower().startswith("json"):
-            text = text[4:].strip()
-    try:
-        return ast.literal_eval(text)
-    except Exception as e:
-        print(f"Failed to parse tool block: {e}")
-        return None
+    # Output is streamed live; the command's process group is killed on CLI_TIMEOUT.
+    # Gemini gets a head/tail summary, large output is kept in full under CLI_OUTPUT_DIR
+    result = run_command_sync(command)
+    if result.capture.truncated:
+        print(f"[cli output {result.capture.report()}]")
+    return result.text()
 
 if __name__ == "__main__":
     if os.path.exists("logfile"):
@@ -57,51 +56,54 @@ if __name__ == "__main__":
             f"\n\n## Iteration Counter\n{counter}"
         )
 
+    # Tool handlers return the text appended to the tool output history
+    def run_cli(command):
+        decision = command_policy.check(command)
+        if not decision.allowed:
+            raise Exception(f"**SAFETY GUARDRAIL TRIGGERED**: Dangerous CLI command blocked. {decision.invocation} ({decision.rule or 'default ' + command_policy.default})")
+        return f"\n\nCLI OUTPUT:\n{cli(command)}"
+
+    def run_search(query):
+        print("Gemini requested a search. Re-prompting with more context...")
+        search_response = chat.send_message(build_prompt(), f"## Iteration Counter\n{counter}")
+        return f"\n\nSEARCH OUTPUT:\n{search_response.text}"
+
+    # Either {"cli": "..."} or {"tool": "cli", "command": "..."}; {"tool": "search"} needs no query
+    tools = ToolRegistry()
+    tools.register("cli", run_cli, argument="command")
+    tools.register("search", run_search, argument="query", required=False)
+
     # Initial LLM message
     history_prompt = build_prompt()
-    response = chat.send_message(history_prompt)
+    response = chat.send_message(history_prompt, "## User Input\n" + user_input + f"\n\n## Iteration Counter\n{counter}")
     llm_response = response.text
     print("LLM **INITIAL** response output:\n" + llm_response)
     logging.info(llm_response)
 
     while counter < 5:
-        tool_block = extract_tool_dict(llm_response)
-
-        if not tool_block:
-            print("Invalid or unrecognized tool format. Exiting.")
-            break
-
-        # Handle CLI tool (either {"cli": "..."} or {"tool": "cli", "command": "..."})
-        command = None
-        if 'cli' in tool_block:
-            command = tool_block['cli']
-        elif tool_block.get("tool") == "cli" and tool_block.get("command"):
-            command = tool_block["command"]
-
-        if command:
-            if any(cmd in command for cmd in prohibited_commands):
-                raise Exception("**SAFETY GUARDRAIL TRIGGERED**: Dangerous CLI command blocked.")
-            result = cli(command)
-            tool_output_history += f"\n\nCLI OUTPUT:\n{result}"
-
-        elif tool_block.get("tool") == "search":
-            print("Gemini requested a search. Re-prompting with more context...")
-            search_response = chat.send_message(build_prompt())
-            tool_output_history += f"\n\nSEARCH OUTPUT:\n{search_response.text}"
-
+        try:
+            call = tools.parse(llm_response)
+        except ToolCallError as e:
+            # Hand the problem back to Gemini instead of ending the session
+            print(f"Invalid or unrecognized tool format ({e}). Asking Gemini again.")
+            new_output = f"\n\nTOOL CALL ERROR:\n{e}. {RETRY_HINT}"
         else:
-            print("Unrecognized tool. Exiting.")
-            break
+            new_output = tools.dispatch(call)
+        tool_output_history += new_output
 
         counter += 1
         history_prompt = build_prompt()
-        response = chat.send_message(history_prompt)
+        response = chat.send_message(history_prompt, "## Tool Result Output History" + new_output + f"\n\n## Iteration Counter\n{counter}")
         llm_response = response.text
         print(f"LLM **NEXT** response output (iteration {counter}):\n" + llm_response)
         logging.info(llm_response)
 
-    final_prompt = build_prompt() + "\n\n## FINAL user input\nWe have exhausted all attempts. What recommended next steps should we action?"
-    response = chat.send_message(final_prompt)
+    final_input = "\n\n## FINAL user input\nWe have exhausted all attempts. What recommended next steps should we action?"
+    final_prompt = build_prompt() + final_input
+    response = chat.send_message(final_prompt, final_input.lstrip())
     print("LLM **FINAL** response output:\n" + response.text)
     logging.info(response.text)
     logging.info(final_prompt)
+    chat.close()
+    print(chat.report())
+    logging.info(chat.report())
@@ -3,17 +3,36 @@
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning, module="vertexai")
 
-import vertexai
-from vertexai.generative_models import GenerativeModel
-import os, subprocess, time, logging, sys, random, ast
-from google.cloud import modelarmor_v1
+import os, subprocess, time, logging, sys, random, argparse, socket
+from fast_start import StartupProfile, LazyInit, template_verified, mark_template_verified, forget_template
+
+# Timed from here; vertexai and modelarmor_v1 are imported on init threads, not at the top
+profile = StartupProfile()
+clients = LazyInit(profile)
+
+with profile.phase("import shared modules"):
+    # Shared agent modules live at the repo root
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    from async_exec import run_command_sync
+    from output_capture import SpillDir
+    from vertex_context import ContextChat, VertexBackend
+    from command_policy import load_policy
+    from tool_calls import ToolRegistry, ToolCallError, RETRY_HINT
+    from incremental_sanitize import IncrementalSanitizer, VerdictCache
+    from sechard_daemon import serve, DAEMON_SOCKET, DAEMON_WORKERS
+    from telemetry import Telemetry
 
 # Detect GCP project ID
 GCP_PROJECT_ID = os.environ.get("CLOUD_PROJECT") or os.environ["GCP_PROJECT_ID"]
 TEMPLATE_ID = "sechard-inline-guard"
 TEMPLATE_PATH = f"projects/{GCP_PROJECT_ID}/locations/us-central1/templates/{TEMPLATE_ID}"
 
-# Use subprocess to setup the Model Armor template (1-time)
+# TELEMETRY_LOG=agent_behavior.log records a sanitize event (Model Armor latency, bytes) per
+# scan in the conmon log format, tool_type prompt or response so log_monitor keeps a baseline
+# for each; off by default
+telemetry = Telemetry(session=f"{socket.gethostname()}-{os.getpid()}-{int(time.time())}")
+
+# Use subprocess to setup the Model Armor template (fallback when the API check cannot confirm it)
 def setup_model_armor_template():
     location = "us-central1"
     try:
@@ -46,116 +65,216 @@ def setup_model_armor_template():
         print(e.output.decode())
         sys.exit(1)
 
+# Check the template through the Model Armor API; gcloud is only spawned when it is missing.
+# A verified template is cached on disk for SECHARD_TEMPLATE_TTL seconds (default 1 day)
+def ensure_model_armor_template(modelarmor_v1, client):
+    if template_verified(TEMPLATE_PATH):
+        return
+    from google.api_core import exceptions
+    with profile.phase("template check (API)"):
+        try:
+            client.get_template(request=modelarmor_v1.GetTemplateRequest(name=TEMPLATE_PATH))
+            print(f"Model Armor template '{TEMPLATE_ID}' already exists.")
+        except exceptions.NotFound:
+            setup_model_armor_template()
+        except exceptions.GoogleAPICallError as e:
+            print(f"Model Armor template lookup failed ({e.__class__.__name__}), checking with gcloud.")
+            setup_model_armor_template()
+    mark_template_verified(TEMPLATE_PATH)
+
 # Init Vertex + Gemini
-vertexai.init(project=GCP_PROJECT_ID, location="us-central1")
-chat_model = GenerativeModel(model_name="gemini-2.5-pro")
-chat = chat_model.start_chat()
+def init_chat():
+    with profile.phase("import vertexai"):
+        import vertexai
+    with profile.phase("vertexai.init + start_chat"):
+        vertexai.init(project=GCP_PROJECT_ID, location="us-central1")
+        # SECHARD_CONTEXT_MODE=system|cached registers prompt.md once and sends only per-turn deltas
+        return ContextChat(VertexBackend("gemini-2.5-pro"), base_prompt)
 
 # Init Model Armor client
-model_armor_client = modelarmor_v1.ModelArmorClient()
+def init_model_armor():
+    with profile.phase("import modelarmor_v1"):
+        from google.cloud import modelarmor_v1
+    with profile.phase("ModelArmorClient"):
+        client = modelarmor_v1.ModelArmorClient()
+    ensure_model_armor_template(modelarmor_v1, client)
+    return modelarmor_v1, client
 
 def sanitize(text, is_user=True):
-    if is_user:
-        req = modelarmor_v1.SanitizeUserPromptRequest(name=TEMPLATE_PATH, user_prompt_data={"text": text})
-        resp = model_armor_client.sanitize_user_prompt(req)
-    else:
-        req = modelarmor_v1.SanitizeModelResponseRequest(name=TEMPLATE_PATH, model_response_data={"text": text})
-        resp = model_armor_client.sanitize_model_response(req)
+    modelarmor_v1, model_armor_client = clients.get("model_armor")
+    from google.api_core import exceptions
+    try:
+        with telemetry.span("sanitize", "sanitize_time", tool_type="prompt" if is_user else "response",
+                            prompt_bytes=len(text.encode())):
+            if is_user:
+                req = modelarmor_v1.SanitizeUserPromptRequest(name=TEMPLATE_PATH, user_prompt_data={"text": text})
+                resp = model_armor_client.sanitize_user_prompt(req)
+            else:
+                req = modelarmor_v1.SanitizeModelResponseRequest(name=TEMPLATE_PATH, model_response_data={"text": text})
+                resp = model_armor_client.sanitize_model_response(req)
+    except exceptions.NotFound:
+        # Template deleted since it was cached as verified; check it again next run
+        forget_template(TEMPLATE_PATH)
+        raise
     result = resp.sanitization_result
     if result.filter_match_state != modelarmor_v1.FilterMatchState.FILTER_MATCH_STATE_UNSPECIFIED:
         raise Exception(f"Blocked by Model Armor: {result.filter_match_state}")
     return result.sanitized_text
 
+# Model Armor verdicts shared by every session in this process; each session gets its own
+# IncrementalSanitizer on top, so segments that already passed are not scanned again.
+# Least recently used ones are dropped past MODEL_ARMOR_VERDICTS, so --daemon stays bounded
+verdicts = VerdictCache()
+
 # CLI tool
 prohibited_commands = ['sudo', 'runas', 'del', 'rm', 'chmod', 'icacls']
-def cli(command):
-    result = subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    output = result.stdout.decode()
-    print(output)
-    return output
-
-# Tool parsing
-def extract_tool_dict(text):
-    if text.startswith("```"):
-        text = text.strip("`\n ")
-        if text.lower().startswith("json"):
-            text = text[4:].strip()
-    try:
-        return ast.literal_eval(text)
-    except Exception as e:
-        print(f"Parse error: {e}")
-        return None
+# COMMAND_POLICY=<rules file> replaces the list, see command_policy.py at the repo root
+command_policy = load_policy(prohibited_commands)
+def cli(command, echo=True, spill_dir=None):
+    # Output is streamed live; the command's process group is killed on CLI_TIMEOUT.
+    # Gemini gets a head/tail summary, large output is kept in full under CLI_OUTPUT_DIR,
+    # in the session's own spill_dir
+    result = run_command_sync(command, echo=echo, spill_dir=spill_dir)
+    if result.capture.truncated:
+        note = f"[cli output {result.capture.report()}]\n"
+        echo(note) if callable(echo) else print(note, end="")
+    return result.text()
 
 # Prompt load
 with open("prompt.md", "r") as f:
     base_prompt = f.read()
 
-def build_prompt(user_input, history, counter):
+def build_prompt(user_input, history, counter, base=base_prompt):
     return (
-        base_prompt +
+        base +
         "\n\n## User Input\n" + user_input +
         "\n\n## Tool Result Output History\n" + history +
         f"\n\n## Iteration Counter\n{counter}"
     )
 
-if __name__ == "__main__":
-    setup_model_armor_template()
+# Same prompt as build_prompt, built from the sanitized text of each segment
+def sanitized_prompt(armor, user_input, history_entries, counter):
+    base, user, *history = armor.sanitize_segments([base_prompt, user_input] + history_entries, is_user=True)
+    return build_prompt(user, "".join(history), counter, base)
 
-    if os.path.exists("logfile"):
-        os.remove("logfile")
-    logging.basicConfig(level=logging.DEBUG, filename="logfile", filemode="a+",
-                        format="%(asctime)-15s %(levelname)-8s %(message)s")
+def console(text):
+    sys.stdout.write(text)
+    sys.stdout.flush()
 
-    print("Enter your security automation objective:")
-    user_input = sys.stdin.readline().strip()
-    tool_output_history = ""
+# One objective end to end; all console text goes through write() so a daemon session can
+# stream it to its client
+def run_session(user_input, chat, armor, write=console):
+    say = lambda text: write(text + "\n")
+    history_entries = []
     counter = 1
+    # Spilled CLI output and its cli_output/ handles belong to this session alone
+    spill_dir = SpillDir()
 
-    history_prompt = sanitize(build_prompt(user_input, tool_output_history, counter), is_user=True)
-    response = chat.send_message(history_prompt)
-    llm_response = sanitize(response.text, is_user=False)
+    history_prompt = sanitized_prompt(armor, user_input, history_entries, counter)
+    response = chat.send_message(history_prompt, "## User Input\n" + armor.sanitize(user_input) + f"\n\n## Iteration Counter\n{counter}")
+    llm_response = armor.sanitize(response.text, is_user=False)
 
-    print("LLM **INITIAL** response output:\n" + llm_response)
+    say("LLM **INITIAL** response output:\n" + llm_response)
     logging.info(llm_response)
 
-    while counter < 5:
-        tool_block = extract_tool_dict(llm_response)
-        if not tool_block:
-            print("Unrecognized tool format. Exiting.")
-            break
-
-        # Accept flexible formats
-        command = None
-        if 'cli' in tool_block:
-            command = tool_block['cli']
-        elif tool_block.get("tool") == "cli" and tool_block.get("command"):
-            command = tool_block['command']
-
-        if command:
-            if any(cmd in command for cmd in prohibited_commands):
-                raise Exception("**SAFETY GUARDRAIL TRIGGERED**")
-            result = cli(command)
-            tool_output_history += f"\n\nCLI OUTPUT:\n{result}"
-
-        elif tool_block.get("tool") == "search":
-            response = chat.send_message(sanitize(build_prompt(user_input, tool_output_history, counter), is_user=True))
-            llm_response = sanitize(response.text, is_user=False)
-            tool_output_history += f"\n\nSEARCH OUTPUT:\n{llm_response}"
+    # Tool handlers return the history entry for the tool output
+    def run_cli(command):
+        decision = command_policy.check(command)
+        if not decision.allowed:
+            raise Exception(f"**SAFETY GUARDRAIL TRIGGERED**: {decision.invocation} ({decision.rule or 'default ' + command_policy.default})")
+        return f"\n\nCLI OUTPUT:\n{cli(command, echo=write, spill_dir=spill_dir)}"
+
+    def run_search(query):
+        response = chat.send_message(sanitized_prompt(armor, user_input, history_entries, counter), f"## Iteration Counter\n{counter}")
+        return f"\n\nSEARCH OUTPUT:\n{armor.sanitize(response.text, is_user=False)}"
+
+    # Accept flexible formats: {"cli": "..."}, {"tool": "cli", "command": "..."}, {"tool": "search"}
+    tools = ToolRegistry()
+    tools.register("cli", run_cli, argument="command")
+    tools.register("search", run_search, argument="query", required=False)
 
+    while counter < 5:
+        try:
+            call = tools.parse(llm_response)
+        except ToolCallError as e:
+            # Hand the problem back to Gemini instead of ending the session
+            say(f"Unrecognized tool format ({e}). Asking Gemini again.")
+            history_entries.append(f"\n\nTOOL CALL ERROR:\n{e}. {RETRY_HINT}")
         else:
-            print("Unknown tool. Exiting.")
-            break
+            history_entries.append(tools.dispatch(call))
 
         counter += 1
-        history_prompt = sanitize(build_prompt(user_input, tool_output_history, counter), is_user=True)
-        response = chat.send_message(history_prompt)
-        llm_response = sanitize(response.text, is_user=False)
-        print(f"LLM **NEXT** response output (iteration {counter}):\n" + llm_response)
+        history_prompt = sanitized_prompt(armor, user_input, history_entries, counter)
+        response = chat.send_message(history_prompt, "## Tool Result Output History" + armor.sanitize(history_entries[-1]) + f"\n\n## Iteration Counter\n{counter}")
+        llm_response = armor.sanitize(response.text, is_user=False)
+        say(f"LLM **NEXT** response output (iteration {counter}):\n" + llm_response)
         logging.info(llm_response)
 
-    final_prompt = build_prompt(user_input, tool_output_history, counter) + "\n\n## FINAL user input\nWe have exhausted all attempts. What recommended next steps should we action?"
-    final_response = chat.send_message(sanitize(final_prompt, is_user=True))
-    final_output = sanitize(final_response.text, is_user=False)
-    print("LLM **FINAL** response output:\n" + final_output)
+    final_input = "\n\n## FINAL user input\nWe have exhausted all attempts. What recommended next steps should we action?"
+    final_prompt = build_prompt(user_input, "".join(history_entries), counter) + final_input
+    final_response = chat.send_message(sanitized_prompt(armor, user_input, history_entries, counter) + final_input, final_input.lstrip())
+    final_output = armor.sanitize(final_response.text, is_user=False)
+    say("LLM **FINAL** response output:\n" + final_output)
     logging.info(final_output)
     logging.info(final_prompt)
+    say(armor.report())
+    logging.info(armor.report())
+    chat.close()
+    say(chat.report())
+    logging.info(chat.report())
+
+# Daemon sessions start from the warm clients: a new chat on the already built model and a
+# sanitizer sharing the process-wide verdicts
+def serve_objective(objective, write):
+    start = time.perf_counter()
+    chat = clients.get("chat").fork()
+    armor = IncrementalSanitizer(sanitize, verdicts=verdicts)
+    setup_ms = round((time.perf_counter() - start) * 1000, 2)
+    logging.info(f"objective: {objective} (session ready in {setup_ms}ms)")
+    try:
+        run_session(objective, chat, armor, write)
+    finally:
+        armor.close()
+    return {"setup_ms": setup_ms}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print import and client init times once the agent is ready")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep the clients warm and serve objectives on a Unix socket (see sechard-client.py)")
+    parser.add_argument("--socket", default=DAEMON_SOCKET, help="daemon socket path (SECHARD_DAEMON_SOCKET)")
+    parser.add_argument("--workers", type=int, default=DAEMON_WORKERS,
+                        help="concurrent daemon sessions (SECHARD_DAEMON_WORKERS)")
+    args = parser.parse_args()
+
+    # Clients come up in the background while the objective is read
+    clients.start(chat=init_chat, model_armor=init_model_armor)
+
+    if os.path.exists("logfile"):
+        os.remove("logfile")
+    logging.basicConfig(level=logging.DEBUG, filename="logfile", filemode="a+",
+                        format="%(asctime)-15s %(levelname)-8s %(threadName)s %(message)s" if args.daemon
+                        else "%(asctime)-15s %(levelname)-8s %(message)s")
+
+    if args.daemon:
+        # Warm everything up before the first objective arrives
+        warm_chat = clients.get("chat")
+        clients.get("model_armor")
+        if args.profile_startup:
+            print(profile.report())
+        try:
+            serve(serve_objective, args.socket, args.workers)
+        finally:
+            warm_chat.close()
+        sys.exit(0)
+
+    print("Enter your security automation objective:")
+    user_input = sys.stdin.readline().strip()
+
+    chat = clients.get("chat")
+    clients.get("model_armor")
+    if args.profile_startup:
+        print(profile.report())
+
+    run_session(user_input, chat, IncrementalSanitizer(sanitize, verdicts=verdicts))
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+import json, os, queue, sys, threading, time
+import urllib.request
+from collections import OrderedDict
+
+# Alert pipeline for log_monitor.py
+# Alerts are JSON objects (metric, value, z, the window's quartiles and IQR bound, the group and
+# the source line's timestamp and byte offset). The detector thread only filters and enqueues:
+#   - an alert already seen for the same log line and metric is dropped (a log copied back or
+#     truncated and rewritten is read again), keyed on a bounded LRU of (metric, line) hashes
+#   - each metric has a token bucket of ALERT_RATE alerts/s with bursts of ALERT_BURST; alerts
+#     over it are counted, and the next alert let through for the metric carries the count
+#   - the queue holds at most ALERT_QUEUE alerts; when full, new alerts are counted as dropped
+#     instead of blocking detection
+# A background thread wakes on the first queued alert, takes whatever else is queued by then
+# (up to ALERT_BATCH) and hands the batch to every sink, so a quiet monitor writes each alert
+# at once and an alert storm is written in a few large batches. Sinks are chosen
+# with ALERT_SINKS (comma separated names from SINKS: file, stdout, webhook) and only need
+# write(alerts) and close().
+
+ALERT_SINKS = os.environ.get("ALERT_SINKS", "file,stdout")
+ALERT_FILE = os.environ.get("ALERT_FILE", "alerts.log")
+# e.g. http://127.0.0.1:9000/alerts, receives each batch as a JSON array
+ALERT_WEBHOOK = os.environ.get("ALERT_WEBHOOK", "")
+ALERT_RATE = float(os.environ.get("ALERT_RATE", "5"))
+ALERT_BURST = int(os.environ.get("ALERT_BURST", "20"))
+ALERT_QUEUE = int(os.environ.get("ALERT_QUEUE", "10000"))
+ALERT_BATCH = 500
+ALERT_DEDUP_SIZE = 100000
+
+# group holds the record's values of the group_by fields, as returned by fast_ingest.detect
+def make_alert(metric, value, z, q1, q3, iqr_threshold, group=(), group_by=(), line="", offset=None, source=None):
+    iqr = q3 - q1
+    return {
+        "type": "outlier",
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "log_time": line.partition(" ")[0] or None,
+        "source": source,
+        "offset": offset,
+        "metric": metric,
+        "value": value,
+        "z": round(z, 4),
+        "q1": q1,
+        "q3": q3,
+        "iqr_upper": q3 + iqr_threshold * iqr,
+        "iqr_lower": q1 - iqr_threshold * iqr,
+        "group": {field: v for field, v in zip(group_by, group) if v is not None},
+    }
+
+# One line for the console
+def alert_text(alert):
+    if alert["type"] == "suppressed":
+        return f"ALERT: {alert['suppressed']} more {alert['metric']} alerts suppressed by the rate limit"
+    where = ", ".join(f"{field}={v}" for field, v in alert["group"].items())
+    where = f" [{where}]" if where else ""
+    suppressed = f" ({alert['suppressed']} similar alerts suppressed)" if alert.get("suppressed") else ""
+    return (f"ALERT: Outlier in {alert['metric']}{where} (z={alert['z']:.2f}, value={alert['value']}). "
+            f"Potential security drift!{suppressed}")
+
+class FileSink:
+    def __init__(self, path=ALERT_FILE):
+        self.path = path
+        self.file = open(path, "a")
+
+    def write(self, alerts):
+        self.file.writelines(json.dumps(alert) + "\n" for alert in alerts)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class StdoutSink:
+    def write(self, alerts):
+        sys.stdout.write("".join(alert_text(alert) + "\n" for alert in alerts))
+        sys.stdout.flush()
+
+    def close(self):
+        pass
+
+class WebhookSink:
+    def __init__(self, url=ALERT_WEBHOOK, timeout=2.0):
+        if not url:
+            raise ValueError("the webhook sink needs ALERT_WEBHOOK")
+        self.url = url
+        self.timeout = timeout
+        self.failures = 0
+
+    def write(self, alerts):
+        request = urllib.request.Request(self.url, data=json.dumps(alerts).encode(),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except OSError as e:
+            self.failures += 1
+            if self.failures == 1 or self.failures % 100 == 0:
+                print(f"Alert webhook {self.url} failed ({self.failures} batches so far): {e}")
+
+    def close(self):
+        pass
+
+SINKS = {"file": FileSink, "stdout": StdoutSink, "webhook": WebhookSink}
+
+def build_sinks(names=ALERT_SINKS):
+    names = [name.strip() for name in names.split(",") if name.strip()]
+    if ALERT_WEBHOOK and "webhook" not in names:
+        names.append("webhook")
+    unknown = [name for name in names if name not in SINKS]
+    if unknown:
+        raise ValueError(f"unknown alert sink(s) {', '.join(unknown)}, expected {', '.join(SINKS)}")
+    return [SINKS[name]() for name in names]
+
+class _Bucket:
+    __slots__ = ("tokens", "stamp", "suppressed")
+
+    def __init__(self, burst, now):
+        self.tokens = burst
+        self.stamp = now
+        self.suppressed = 0
+
+class AlertPipeline:
+    def __init__(self, sinks=None, rate=ALERT_RATE, burst=ALERT_BURST, max_queue=ALERT_QUEUE,
+                 batch=ALERT_BATCH, dedup_size=ALERT_DEDUP_SIZE):
+        self.sinks = build_sinks() if sinks is None else sinks
+        self.rate = rate
+        self.burst = burst
+        self.batch = batch
+        self.dedup_size = dedup_size
+        self.seen = OrderedDict()
+        self.buckets = {}
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.stats = {"submitted": 0, "written": 0, "duplicates": 0, "suppressed": 0, "dropped": 0,
+                      "batches": 0, "sink_errors": 0}
+        self.thread = threading.Thread(target=self._run, name="alert-writer", daemon=True)
+        self.thread.start()
+
+    # Filters one alert and queues it; identity is whatever makes two alerts the same event,
+    # log_monitor uses (metric, log line)
+    def submit(self, alert, identity=None):
+        self.stats["submitted"] += 1
+        if identity is not None:
+            key = hash(identity)
+            if key in self.seen:
+                self.seen.move_to_end(key)
+                self.stats["duplicates"] += 1
+                return False
+            self.seen[key] = None
+            if len(self.seen) > self.dedup_size:
+                self.seen.popitem(last=False)
+        if self.rate > 0:
+            now = time.monotonic()
+            bucket = self.buckets.get(alert["metric"])
+            if bucket is None:
+                bucket = self.buckets[alert["metric"]] = _Bucket(self.burst, now)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.stamp) * self.rate)
+            bucket.stamp = now
+            if bucket.tokens < 1:
+                bucket.suppressed += 1
+                self.stats["suppressed"] += 1
+                return False
+            bucket.tokens -= 1
+            if bucket.suppressed:
+                alert["suppressed"] = bucket.suppressed
+                bucket.suppressed = 0
+        try:
+            self.queue.put_nowait(alert)
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            alerts = [item]
+            while len(alerts) < self.batch:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._write(alerts)
+                    return
+                alerts.append(item)
+            self._write(alerts)
+
+    def _write(self, alerts):
+        self.stats["batches"] += 1
+        self.stats["written"] += len(alerts)
+        for sink in self.sinks:
+            try:
+                sink.write(alerts)
+            except Exception as e:
+                self.stats["sink_errors"] += 1
+                print(f"Alert sink {type(sink).__name__} failed: {e}")
+
+    # Flushes what is queued, records suppressions nobody has reported yet and closes the sinks
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        pending = [{"type": "suppressed", "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "metric": metric,
+                    "suppressed": bucket.suppressed} for metric, bucket in self.buckets.items() if bucket.suppressed]
+        if pending:
+            self._write(pending)
+            self.stats["written"] -= len(pending)
+        for sink in self.sinks:
+            sink.close()
+
+    def report(self):
+        s = self.stats
+        return (f"Alerts: {s['written']} written in {s['batches']} batches, {s['duplicates']} duplicates, "
+                f"{s['suppressed']} rate limited, {s['dropped']} dropped (queue full)")
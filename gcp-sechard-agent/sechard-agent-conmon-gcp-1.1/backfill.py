@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+import argparse, json, mmap, os, sys, time
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from multiprocessing import Pool
+import numpy as np
+from stream_stats import WARM_START, StreamDetector, save_baseline
+from fast_ingest import BatchDecoder, detect, group_keys, split_groups
+from log_monitor import BUFFER_MAX, GROUP_BY, QUARTILE_THRESHOLD, Z_THRESHOLD
+from alert_sink import make_alert
+
+# Offline backfill over archived agent_behavior.log files
+# Runs the live monitor's detection over past logs and writes the retroactive alerts plus a
+# baseline snapshot that log_monitor.py loads at startup (MONITOR_BASELINE), so it alerts from
+# the first event instead of waiting for its windows to fill.
+#
+# The archives are memory-mapped and cut into chunks of about --chunk-mb at line boundaries.
+# Detection is sequential by nature (each value is scored against the values before it), so
+# the chunks go through a process pool twice:
+#   1. every chunk is parsed and reduced, per window key (metric, *group prefix), to its value
+#      count and last BUFFER_MAX values, plus for a key's first value the parent's values
+#      before it (what the key warm-starts from)
+#   2. in file order, those summaries advance the merged window state, and each chunk is
+#      scored by a worker starting from the state before it; alerts are appended in file order
+# A window's state is (warm-start values still in it, own values), the same ring the live
+# StreamDetector keeps, so the alerts and the final snapshot match one sequential pass.
+# Usage: python3 backfill.py archive/agent_behavior.log.1 archive/agent_behavior.log --workers 8
+
+CHUNK_MB = 64
+# Lines decoded per step inside a chunk
+BATCH_LINES = 8192
+
+def chunk_bounds(path, chunk_size):
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    bounds, start = [], 0
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        while start < size:
+            cut = mm.find(b"\n", min(start + chunk_size, size) - 1)
+            end = size if cut < 0 else cut + 1
+            bounds.append((path, start, end))
+            start = end
+    return bounds
+
+# (lines, byte offset of each line) in steps of BATCH_LINES
+def _batches(path, start, end):
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        raw = mm[start:end].split(b"\n")
+    if raw and not raw[-1]:
+        raw.pop()
+    for i in range(0, len(raw), BATCH_LINES):
+        lines, offsets = [], []
+        for line in raw[i:i + BATCH_LINES]:
+            lines.append(line.decode("utf-8", errors="replace"))
+            offsets.append(start)
+            start += len(line) + 1
+        yield lines, offsets
+
+# Pass 1: {window key: (values, last BUFFER_MAX values, parent's (values, last BUFFER_MAX) before
+# the key's first value)} for one chunk; the parent part is None for a metric's root window
+def chunk_tails(bounds, group_by):
+    windows = {}
+    decoder = BatchDecoder()
+    for lines, _ in _batches(*bounds):
+        batch = decoder.decode(lines)
+        for metric, (indexes, values) in batch.columns.items():
+            groups = group_keys(batch.records, indexes, group_by)
+            levels = [split_groups([key[:depth] for key in groups], indexes, values) for depth in range(len(group_by) + 1)]
+            # children first, so a new key still sees its parent as it was before this batch
+            for depth in range(len(group_by), -1, -1):
+                for group, (index, column) in levels[depth].items():
+                    key = (metric,) + group
+                    entry = windows.get(key)
+                    if entry is None:
+                        before = None
+                        if depth:
+                            parent_index, parent_column = levels[depth - 1][group[:-1]]
+                            count, tail, _ = windows.get(key[:-1], (0, [], None))
+                            k = bisect_left(parent_index, index[0])
+                            before = (count + k, (tail + parent_column[:k])[-BUFFER_MAX:])
+                        entry = windows[key] = [0, [], before]
+                    entry[0] += len(column)
+                    entry[1] = (entry[1] + column)[-BUFFER_MAX:]
+    return {key: (count, np.array(tail), before and (before[0], np.array(before[1])))
+            for key, (count, tail, before) in windows.items()}
+
+EMPTY = np.zeros(0)
+
+# Window state (seeds, own) after `count` more values, `tail` being the last of them
+def _advance(state, count, tail):
+    seeds, own = state
+    seeds = seeds[count:]
+    keep = BUFFER_MAX - len(seeds)
+    own = np.concatenate((own, tail))
+    return seeds, own[len(own) - keep:] if len(own) > keep else own
+
+# Pass 2: scores one chunk from the merged state before it; returns (JSON alert lines, lines,
+# bad lines). Every alert is kept: no dedup or rate limit for a retroactive run
+def score_chunk(bounds, state, group_by):
+    detector = StreamDetector(window=BUFFER_MAX, z_threshold=Z_THRESHOLD, iqr_threshold=QUARTILE_THRESHOLD)
+    detector.restore(state)
+    decoder = BatchDecoder()
+    alerts = []
+    for lines, offsets in _batches(*bounds):
+        batch = decoder.decode(lines)
+        for row, metric, value, z, group, q1, q3 in detect(detector, batch, group_by):
+            alert = make_alert(metric, value, z, q1, q3, QUARTILE_THRESHOLD, group, group_by, lines[row],
+                               offsets[row], bounds[0])
+            alerts.append(json.dumps(alert) + "\n")
+    return alerts, decoder.lines, decoder.bad
+
+def _tails(args):
+    return chunk_tails(*args)
+
+def _score(args):
+    return score_chunk(*args)
+
+def backfill(paths, alerts_path, snapshot_path, workers=None, chunk_mb=CHUNK_MB, group_by=GROUP_BY):
+    chunks = [bounds for path in paths for bounds in chunk_bounds(path, int(chunk_mb * 1024 * 1024))]
+    warm = min(WARM_START, BUFFER_MAX)
+    # key -> (warm-start values, own values), least recently seen first
+    state = OrderedDict()
+    totals = {"chunks": len(chunks), "bytes": sum(end - start for _, start, end in chunks),
+              "lines": 0, "bad": 0, "alerts": 0}
+
+    def write(result):
+        alerts, lines, bad = result.get()
+        out.writelines(alerts)
+        totals["lines"] += lines
+        totals["bad"] += bad
+        totals["alerts"] += len(alerts)
+
+    with Pool(workers) as pool, open(alerts_path, "a") as out:
+        pending = deque()
+        for bounds, tails in zip(chunks, pool.imap(_tails, [(bounds, group_by) for bounds in chunks])):
+            start = [(key, np.concatenate(state[key]), len(state[key][0])) for key in tails if key in state]
+            pending.append(pool.apply_async(_score, ((bounds, start, group_by),)))
+            # parents before children: a new key starts with its parent's last values at the time
+            initial = {}
+            for key in sorted(tails, key=len):
+                _, _, before = tails[key]
+                if key in state:
+                    initial[key] = state.pop(key)
+                elif before is None:
+                    initial[key] = (EMPTY, EMPTY)
+                else:
+                    initial[key] = (np.concatenate(_advance(initial[key[:-1]], *before))[-warm:], EMPTY)
+            for key, (count, tail, _) in tails.items():
+                state[key] = _advance(initial[key], count, tail)
+            while pending and pending[0].ready():
+                write(pending.popleft())
+        while pending:
+            write(pending.popleft())
+    windows = [(key, np.concatenate(seeds_own), len(seeds_own[0])) for key, seeds_own in state.items()]
+    save_baseline(snapshot_path, windows, BUFFER_MAX, group_by, source="backfill",
+                  archives=list(paths), lines=totals["lines"])
+    totals["windows"] = len(state)
+    return totals
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score archived agent_behavior.log files and write a baseline snapshot")
+    parser.add_argument("archives", nargs="+", help="log files, oldest first")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-mb", type=float, default=CHUNK_MB)
+    parser.add_argument("--alerts", default="backfill_alerts.log", help="retroactive alerts are appended here as JSON lines")
+    parser.add_argument("--snapshot", default=os.environ.get("MONITOR_BASELINE", "baseline.npz"))
+    args = parser.parse_args()
+
+    missing = [path for path in args.archives if not os.path.isfile(path)]
+    if missing:
+        sys.exit(f"No such file: {', '.join(missing)}")
+    start = time.perf_counter()
+    totals = backfill(args.archives, args.alerts, args.snapshot, args.workers, args.chunk_mb)
+    elapsed = time.perf_counter() - start
+    print(f"Backfilled {totals['lines']} lines ({totals['bytes'] / 2**20:.1f} MB, {totals['chunks']} chunks, "
+          f"{totals['bad']} invalid) in {elapsed:.1f}s with {args.workers} workers")
+    print(f"{totals['alerts']} alerts appended to {args.alerts}")
+    print(f"Baseline of {totals['windows']} windows written to {args.snapshot}")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+import argparse, json, os, random, shutil, sys, tempfile, time
+
+# Benchmark: alert_sink.AlertPipeline against opening alerts.log for every alert
+# Simulates an alert storm: --alerts outliers over the four metrics, each reported --repeat
+# times the way the old monitor re-checked a metric's last value on every line. Compares the
+# old write path (open, append one line, close, per alert) with the pipeline without a rate
+# limit and with the default one. Reports the time the detector thread spends handing alerts
+# off, the time until everything is on disk, and how many alerts were written, deduplicated,
+# rate limited or dropped (a storm this dense outruns the writer thread, so the bounded queue
+# drops part of it without a rate limit; raise --queue to compare).
+# Usage: python3 benchmarks/bench_alert_sink.py --alerts 50000 --repeat 3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from alert_sink import ALERT_BURST, ALERT_QUEUE, ALERT_RATE, AlertPipeline, FileSink, alert_text, make_alert
+
+METRICS = ("exec_time", "inference_time", "response_length", "entropy")
+GROUP_BY = ("event", "iteration", "session")
+
+def storm(count, repeat, seed=7):
+    rng = random.Random(seed)
+    events = []
+    for i in range(count):
+        metric = rng.choice(METRICS)
+        line = f"2026-01-01T00:00:{i % 60:02d}.{i:06d} {{\"event\": \"inference\", \"{metric}\": {rng.random() * 50}}}"
+        alert = make_alert(metric, rng.random() * 50, rng.uniform(2.5, 9), 1.0, 2.0, 1.5,
+                           ("inference", i % 5 + 1, f"host-{i % 40}"), GROUP_BY, line, i * 120, "agent_behavior.log")
+        events += [(alert, line)] * repeat
+    return events
+
+def per_alert_open(events, path):
+    start = time.perf_counter()
+    for alert, _ in events:
+        with open(path, "a") as f:
+            f.write(alert_text(alert) + "\n")
+    elapsed = time.perf_counter() - start
+    return {"handoff_s": round(elapsed, 3), "total_s": round(elapsed, 3), "written": len(events)}
+
+def pipeline(events, path, rate, burst, max_queue):
+    alerts = AlertPipeline(sinks=[FileSink(path)], rate=rate, burst=burst, max_queue=max_queue)
+    start = time.perf_counter()
+    for alert, line in events:
+        alerts.submit(dict(alert), identity=(alert["metric"], line))
+    handoff = time.perf_counter() - start
+    alerts.close()
+    total = time.perf_counter() - start
+    s = alerts.stats
+    return {"handoff_s": round(handoff, 3), "total_s": round(total, 3), "written": s["written"],
+            "duplicates": s["duplicates"], "suppressed": s["suppressed"], "dropped": s["dropped"],
+            "batches": s["batches"]}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--alerts", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3, help="times each outlier is reported")
+    parser.add_argument("--queue", type=int, default=ALERT_QUEUE, help="pipeline queue bound")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    events = storm(args.alerts, args.repeat)
+    tmp = tempfile.mkdtemp(prefix="bench_alerts_")
+    try:
+        results = {
+            "open per alert": per_alert_open(events, os.path.join(tmp, "old.log")),
+            "pipeline, no rate limit": pipeline(events, os.path.join(tmp, "unlimited.log"), 0, 0, args.queue),
+            f"pipeline, {ALERT_RATE:g}/s burst {ALERT_BURST}": pipeline(events, os.path.join(tmp, "limited.log"),
+                                                                        ALERT_RATE, ALERT_BURST, args.queue),
+        }
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    print(f"{len(events):,} alerts ({args.alerts:,} distinct)")
+    for name, r in results.items():
+        extra = "".join(f", {r[k]} {k}" for k in ("duplicates", "suppressed", "dropped", "batches") if k in r)
+        print(f"  {name:>26}: detector thread {r['handoff_s']:7.3f}s, on disk after {r['total_s']:7.3f}s, "
+              f"{r['written']} written{extra}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+import argparse, json, os, shutil, sys, tempfile, time
+
+# Benchmark: backfill.py against a sequential run, and a monitor started from its snapshot
+# Writes a synthetic archive (bench_baselines' multi-session log) followed by a "live"
+# segment. The archive is scored once sequentially in tailer-sized batches, the way
+# log_monitor.py would, and then by backfill.py with each --workers count; reports MB/s and
+# whether the alerts and the snapshot match the sequential run. The live segment is then
+# scored by a monitor that starts cold and by one that loads the snapshot, counting false and
+# missed alerts against the injected spikes.
+# Usage: python3 benchmarks/bench_backfill.py --events 400000 --live 20000 --workers 1 4 8
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from bench_baselines import synthetic_log
+from stream_stats import StreamDetector, load_baseline
+from fast_ingest import BatchDecoder, detect
+from alert_sink import make_alert
+from log_monitor import BUFFER_MAX, GROUP_BY, QUARTILE_THRESHOLD, Z_THRESHOLD
+import backfill
+
+# (log time, metric, value, z, group) per alert, the fields that must match between the runs
+def identity(alert):
+    return alert["log_time"], alert["metric"], alert["value"], alert["z"], alert["group"]
+
+def sequential(lines, detector, batch_size=256):
+    decoder = BatchDecoder()
+    alerts, flagged = [], set()
+    for offset in range(0, len(lines), batch_size):
+        batch_lines = lines[offset:offset + batch_size]
+        batch = decoder.decode(batch_lines)
+        for row, metric, value, z, group, q1, q3 in detect(detector, batch, GROUP_BY):
+            alert = make_alert(metric, value, z, q1, q3, QUARTILE_THRESHOLD, group, GROUP_BY, batch_lines[row])
+            alerts.append(identity(alert))
+            flagged.add(offset + row)
+    return alerts, flagged
+
+def new_detector():
+    return StreamDetector(window=BUFFER_MAX, z_threshold=Z_THRESHOLD, iqr_threshold=QUARTILE_THRESHOLD)
+
+def score(flagged, spikes):
+    return {"false_alerts": len(flagged - spikes), "missed": len(spikes - flagged)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--events", type=int, default=400000, help="archive size in events")
+    parser.add_argument("--live", type=int, default=20000, help="events after the archive")
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, os.cpu_count()}))
+    parser.add_argument("--chunk-mb", type=float, default=8)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    lines, spikes = synthetic_log(args.sessions, args.events + args.live)
+    archive, live = lines[:args.events], lines[args.events:]
+    live_spikes = {i - args.events for i in spikes if i >= args.events}
+    tmp = tempfile.mkdtemp(prefix="bench_backfill_")
+    results = {"cpus": os.cpu_count(), "runs": []}
+    try:
+        path = os.path.join(tmp, "agent_behavior.log")
+        with open(path, "w") as f:
+            f.write("\n".join(archive) + "\n")
+        size_mb = os.path.getsize(path) / 2**20
+        print(f"archive: {len(archive):,} events, {size_mb:.1f} MB, {os.cpu_count()} CPUs")
+
+        reference = new_detector()
+        start = time.perf_counter()
+        expected, _ = sequential(archive, reference)
+        elapsed = time.perf_counter() - start
+        results["sequential"] = {"seconds": round(elapsed, 2), "mb_per_s": round(size_mb / elapsed, 2), "alerts": len(expected)}
+        print(f"  sequential monitor: {elapsed:6.2f}s, {size_mb / elapsed:5.2f} MB/s, {len(expected)} alerts")
+        expected_state = {key: (list(values), seeded) for key, values, seeded in reference.snapshot()}
+
+        for workers in args.workers:
+            alerts_path = os.path.join(tmp, f"alerts-{workers}.log")
+            snapshot = os.path.join(tmp, f"baseline-{workers}.npz")
+            start = time.perf_counter()
+            totals = backfill.backfill([path], alerts_path, snapshot, workers, args.chunk_mb)
+            elapsed = time.perf_counter() - start
+            with open(alerts_path) as f:
+                same_alerts = [identity(json.loads(line)) for line in f] == expected
+            _, windows = load_baseline(snapshot)
+            same_state = {key: (list(values), seeded) for key, values, seeded in windows} == expected_state
+            results["runs"].append({"workers": workers, "chunks": totals["chunks"], "seconds": round(elapsed, 2),
+                                    "mb_per_s": round(size_mb / elapsed, 2), "alerts": totals["alerts"],
+                                    "same_alerts": same_alerts, "same_snapshot": same_state,
+                                    "snapshot_kb": os.path.getsize(snapshot) // 1024})
+            print(f"  backfill, {workers:2} workers: {elapsed:6.2f}s, {size_mb / elapsed:5.2f} MB/s, {totals['chunks']} chunks, "
+                  f"{totals['alerts']} alerts | same alerts: {same_alerts}, same snapshot: {same_state}, "
+                  f"snapshot {os.path.getsize(snapshot) // 1024} KB")
+
+        _, windows = load_baseline(snapshot)
+        warm = new_detector()
+        warm.restore(windows)
+        _, warm_flagged = sequential(live, warm)
+        _, cold_flagged = sequential(live, new_detector())
+        _, continued = sequential(live, reference)
+        results["live"] = {"events": len(live), "spikes": len(live_spikes), "cold": score(cold_flagged, live_spikes),
+                           "snapshot": score(warm_flagged, live_spikes), "same_as_continuous": warm_flagged == continued}
+        print(f"live segment, {len(live):,} events, {len(live_spikes)} spikes:")
+        print(f"  cold start:     {results['live']['cold']}")
+        print(f"  from snapshot:  {results['live']['snapshot']} (same as a monitor that never stopped: "
+              f"{results['live']['same_as_continuous']})")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
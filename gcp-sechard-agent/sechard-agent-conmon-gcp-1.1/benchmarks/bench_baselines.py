@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+import argparse, json, os, random, sys, time
+
+# Benchmark: grouped baselines in stream_stats.StreamDetector
+# Synthetic agent_behavior.log from many concurrent sessions, where inference time, response
+# length and tool exec time depend on the event, tool_type and iteration (search re-prompts are
+# fast, final summaries slow) and on the session's host. About 1% of events are spikes at a
+# multiple of their own group's normal level. Each run decodes the log in batches and feeds it
+# through fast_ingest.detect with one global baseline, with per-group baselines and with
+# per-group baselines under a memory cap, and reports throughput, the detector's measured size
+# (sys.getsizeof of the LRU dict, keys, windows and their arrays) next to its own estimate, window
+# count, evictions, and false / missed alerts against the injected spikes.
+# Usage: python3 benchmarks/bench_baselines.py --sessions 1000 --events 400000 --cap-mb 16
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from stream_stats import StreamDetector
+from fast_ingest import BatchDecoder, detect
+
+BUFFER_MAX = 100
+Z_THRESHOLD = 2.5
+QUARTILE_THRESHOLD = 1.5
+GROUP_BY = ("event", "tool_type", "iteration", "session")
+ITERATIONS = 5
+
+def synthetic_log(sessions, events, seed=42):
+    rng = random.Random(seed)
+    hosts = [rng.uniform(0.7, 1.5) for _ in range(sessions)]
+    lines, spikes = [], set()
+    for i in range(events):
+        s = rng.randrange(sessions)
+        iteration = rng.randint(1, ITERATIONS)
+        spike = rng.random() < 0.01
+        if spike:
+            spikes.add(i)
+        kind = rng.random()
+        if kind < 0.5:
+            # the last iteration is the final summary, the slowest and longest call
+            level = 6.0 if iteration == ITERATIONS else 1.0 + 0.4 * iteration
+            entry = {"event": "inference", "iteration": iteration,
+                     "inference_time": rng.gauss(level, level * 0.08) * hosts[s] * (4 if spike else 1),
+                     "response_length": int(rng.gauss(150 * level, 15 * level) * (3 if spike else 1)),
+                     "entropy": rng.gauss(4.5, 0.05)}
+        else:
+            tool = "search" if kind < 0.65 else "cli"
+            level = 0.8 if tool == "search" else 0.05 * iteration
+            entry = {"event": "tool_execution", "tool_type": tool, "iteration": iteration,
+                     "exec_time": rng.gauss(level, level * 0.1) * hosts[s] * (5 if spike else 1)}
+        entry["session"] = f"host-{s}"
+        lines.append(f"2026-01-01T00:00:00 {json.dumps(entry)}")
+    return lines, spikes
+
+def measured_bytes(detector):
+    total = sys.getsizeof(detector.windows)
+    for key, w in detector.windows.items():
+        total += sys.getsizeof(key) + sys.getsizeof(w) + sys.getsizeof(w.values) + sys.getsizeof(w.sorted)
+    return total
+
+def run(lines, spikes, group_by, max_bytes, batch_size):
+    detector = StreamDetector(window=BUFFER_MAX, z_threshold=Z_THRESHOLD, iqr_threshold=QUARTILE_THRESHOLD,
+                              max_bytes=max_bytes)
+    decoder = BatchDecoder()
+    flagged = set()
+    start = time.perf_counter()
+    for offset in range(0, len(lines), batch_size):
+        batch = decoder.decode(lines[offset:offset + batch_size])
+        flagged.update(offset + alert[0] for alert in detect(detector, batch, group_by))
+    elapsed = time.perf_counter() - start
+    groups = {key[1:] for key in detector.windows if len(key) == len(group_by) + 1} if group_by else set()
+    return {"events_per_s": round(len(lines) / elapsed), "memory_mb": round(measured_bytes(detector) / 2**20, 1),
+            "estimate_mb": round(detector.memory() / 2**20, 1),
+            "windows": len(detector.windows), "leaf_groups": len(groups), "evicted": detector.evicted,
+            "alerts": len(flagged), "false_alerts": len(flagged - spikes), "missed": len(spikes - flagged)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=400000)
+    parser.add_argument("--batch", type=int, default=256, help="lines per tailer wakeup")
+    parser.add_argument("--cap-mb", type=float, default=16, help="memory cap for the bounded run")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    lines, spikes = synthetic_log(args.sessions, args.events)
+    print(f"{len(lines):,} events from {args.sessions} sessions, {len(spikes)} injected spikes")
+    results = {}
+    for name, group_by, max_bytes in (("global", (), None),
+                                      ("grouped", GROUP_BY, None),
+                                      (f"grouped, {args.cap_mb:g} MB cap", GROUP_BY, int(args.cap_mb * 2**20))):
+        r = results[name] = run(lines, spikes, group_by, max_bytes, args.batch)
+        print(f"{name:>22}: {r['events_per_s']:>7,} events/s, {r['memory_mb']:6.1f} MB measured "
+              f"(estimate {r['estimate_mb']} MB), {r['windows']:>6} windows, {r['leaf_groups']:>6} groups, "
+              f"{r['evicted']:>6} evicted | {r['false_alerts']:>5} false alerts, {r['missed']:>4} missed")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"sessions": args.sessions, "events": len(lines), "spikes": len(spikes), "runs": results}, f, indent=2)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+import argparse, json, os, random, sys, time
+from pydantic import BaseModel, ValidationError
+
+# Benchmark: batched ingestion (fast_ingest.py) vs the per-line pydantic path
+# Builds agent_behavior.log lines (about 0.5% of them broken) and feeds them to both paths in
+# wakeup-sized batches. The per-line path is log_monitor's former process_log_line: split,
+# json.loads, pydantic BehaviorLog, then StreamDetector.update per metric. Reports lines/sec
+# and checks that both raise the same alerts and reject the same number of lines.
+# Usage: python3 benchmarks/bench_ingest.py --lines 500000 --batch 1000
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fast_ingest import BatchDecoder, detect
+from stream_stats import StreamDetector
+
+METRICS = ("exec_time", "inference_time", "response_length", "entropy")
+
+class BehaviorLog(BaseModel):
+    event: str
+    tool_type: str = None
+    exec_time: float = None
+    inference_time: float = None
+    response_length: int = None
+    entropy: float = None
+    iteration: int = None
+
+def synthetic_lines(count, seed=7):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(count):
+        spike = rng.random() < 0.01
+        timestamp = f"2025-10-01T00:{i // 60 % 60:02d}:{i % 60:02d}.{i % 1000000:06d}"
+        roll = rng.random()
+        if roll < 0.002:
+            lines.append(timestamp + ' {"event": "inference", "inference_time": ')
+        elif roll < 0.005:
+            lines.append(timestamp + ' {"event": "inference", "response_length": "many"}')
+        elif roll < 0.5:
+            lines.append(f"{timestamp} " + json.dumps({
+                "event": "inference", "inference_time": rng.lognormvariate(1.1, 0.3) * (6 if spike else 1),
+                "response_length": int(rng.gauss(350, 40) * (8 if spike else 1)),
+                "entropy": rng.gauss(4.5, 0.05) + (0.6 if spike else 0), "iteration": i % 5 + 1}))
+        else:
+            lines.append(f"{timestamp} " + json.dumps({
+                "event": "tool_execution", "tool_type": rng.choice(("cli", "search")),
+                "exec_time": rng.expovariate(50) * (40 if spike else 1), "iteration": i % 5 + 1}))
+    return lines
+
+def per_line(batches):
+    detector = StreamDetector()
+    alerts, bad, index = [], 0, -1
+    for lines in batches:
+        for line in lines:
+            index += 1
+            try:
+                parts = line.split(' ', 1)
+                if len(parts) < 2:
+                    raise ValueError("no payload")
+                validated = BehaviorLog(**json.loads(parts[1]))
+            except (json.JSONDecodeError, ValidationError, ValueError):
+                bad += 1
+                continue
+            for metric in METRICS:
+                value = getattr(validated, metric)
+                if value is not None:
+                    is_out, z = detector.update(metric, value)
+                    if is_out:
+                        alerts.append((index, metric, value))
+    return alerts, bad
+
+def batched(batches):
+    detector = StreamDetector()
+    decoder = BatchDecoder()
+    alerts, offset = [], 0
+    for lines in batches:
+        batch = decoder.decode(lines)
+        alerts += [(offset + alert[0], alert[1], alert[2]) for alert in detect(detector, batch)]
+        offset += len(lines)
+    return alerts, decoder.bad
+
+def timed(path, batches, count):
+    start = time.perf_counter()
+    alerts, bad = path(batches)
+    return alerts, bad, count / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=500000)
+    parser.add_argument("--batch", type=int, default=1000, help="lines per tailer wakeup")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    lines = synthetic_lines(args.lines)
+    batches = [lines[i:i + args.batch] for i in range(0, len(lines), args.batch)]
+    old_alerts, old_bad, old_rate = timed(per_line, batches, len(lines))
+    new_alerts, new_bad, new_rate = timed(batched, batches, len(lines))
+    same = [(i, m) for i, m, _ in old_alerts] == [(i, m) for i, m, _ in new_alerts]
+    results = {"lines": len(lines), "batch": args.batch,
+               "per_line_lines_per_s": round(old_rate), "batched_lines_per_s": round(new_rate),
+               "alerts": len(new_alerts), "same_alerts": same, "bad_lines": [old_bad, new_bad]}
+    print(f"per-line pydantic: {results['per_line_lines_per_s']:,} lines/s, {len(old_alerts)} alerts, {old_bad} invalid")
+    print(f"batched:           {results['batched_lines_per_s']:,} lines/s, {len(new_alerts)} alerts, {new_bad} invalid")
+    print(f"same alerts: {same}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
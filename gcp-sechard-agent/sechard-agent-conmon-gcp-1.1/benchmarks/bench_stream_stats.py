@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+import argparse, json, os, random, sys, time
+import numpy as np
+
+# Benchmark: stream_stats.StreamDetector vs the per-line NumPy recompute log_monitor.py used
+# Synthetic agent_behavior.log events (inference and tool_execution, with occasional spikes)
+# are fed to both engines as already parsed dicts. Reports events/sec for each and checks that
+# the streaming engine raises exactly the old alerts once the duplicates are removed (the old
+# loop re-checked every metric's last value on every line).
+# Usage: python3 benchmarks/bench_stream_stats.py --events 2000000 --old-events 20000
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from stream_stats import StreamDetector
+
+BUFFER_MAX = 100
+Z_THRESHOLD = 2.5
+QUARTILE_THRESHOLD = 1.5
+METRICS = ("exec_time", "inference_time", "response_length", "entropy")
+
+def synthetic_events(count, seed=42):
+    rng = random.Random(seed)
+    for i in range(count):
+        spike = rng.random() < 0.01
+        if rng.random() < 0.5:
+            yield {"inference_time": rng.lognormvariate(1.1, 0.3) * (6 if spike else 1),
+                   "response_length": int(rng.gauss(350, 40) * (8 if spike else 1)),
+                   "entropy": rng.gauss(4.5, 0.05) + (0.6 if spike else 0)}
+        else:
+            yield {"exec_time": rng.expovariate(50) * (40 if spike else 1)}
+
+# The original compute_stats / detect_outlier / buffer loop from log_monitor.py
+def old_engine(events):
+    buffers = {m: [] for m in METRICS}
+    alerts = []
+    for i, event in enumerate(events):
+        for metric in METRICS:
+            if metric in event:
+                buffers[metric].append(event[metric])
+                buffers[metric] = buffers[metric][-BUFFER_MAX:]
+        for metric, buffer in buffers.items():
+            if buffer:
+                if len(buffer) < 3:
+                    continue
+                arr = np.array(buffer)
+                mean, std = np.mean(arr), np.std(arr)
+                q1, q3 = np.percentile(arr, 25), np.percentile(arr, 75)
+                if std == 0:
+                    continue
+                z = (buffer[-1] - mean) / std
+                if (buffer[-1] > q3 + QUARTILE_THRESHOLD * (q3 - q1)) or abs(z) > Z_THRESHOLD:
+                    alerts.append((i, metric, float(z), metric in event))
+    return alerts
+
+def new_engine(events):
+    detector = StreamDetector(window=BUFFER_MAX, z_threshold=Z_THRESHOLD, iqr_threshold=QUARTILE_THRESHOLD)
+    alerts = []
+    for i, event in enumerate(events):
+        for metric in METRICS:
+            value = event.get(metric)
+            if value is None:
+                continue
+            is_out, z = detector.update(metric, value)
+            if is_out:
+                alerts.append((i, metric, z))
+    return alerts
+
+def timed(engine, events):
+    start = time.perf_counter()
+    alerts = engine(events)
+    return alerts, len(events) / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=2000000)
+    parser.add_argument("--old-events", type=int, default=20000, help="the old engine is slow, run it on a prefix")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    events = list(synthetic_events(args.events))
+    prefix = events[:args.old_events]
+    old_alerts, old_rate = timed(old_engine, prefix)
+    new_alerts, new_rate = timed(new_engine, events)
+
+    deduped = [(i, m) for i, m, _, fresh in old_alerts if fresh]
+    new_prefix = [a for a in new_alerts if a[0] < len(prefix)]
+    same = deduped == [(i, m) for i, m, _ in new_prefix]
+    z_error = max((abs(a[2] - b[2]) for a, b in zip([a for a in old_alerts if a[3]], new_prefix)), default=0.0)
+    results = {
+        "events": len(events), "old_events": len(prefix),
+        "old_events_per_s": round(old_rate), "new_events_per_s": round(new_rate),
+        "old_alerts": len(old_alerts), "old_alerts_deduped": len(deduped),
+        "new_alerts_on_prefix": len(new_prefix), "new_alerts": len(new_alerts),
+        "same_alerts": same, "max_z_difference": z_error,
+    }
+    print(f"old engine: {results['old_events_per_s']:,} events/s on {len(prefix):,} events, "
+          f"{len(old_alerts)} alerts ({len(old_alerts) - len(deduped)} duplicates of a stale value)")
+    print(f"stream engine: {results['new_events_per_s']:,} events/s on {len(events):,} events, "
+          f"{len(new_alerts)} alerts")
+    print(f"alerts on the first {len(prefix):,} events match the deduplicated old alerts: {same} "
+          f"(max z difference {z_error:.2e})")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import argparse, json, os, sys, tempfile, threading, time
+
+# Benchmark: log_tailer.py vs the old reopen-and-poll loop in log_monitor.py
+# A writer appends agent_behavior.log style lines at random intervals; for each approach the
+# time from the append to the line reaching the monitor is measured, then the monitor is left
+# idle and the process CPU time over that window is reported.
+# Usage: python3 benchmarks/bench_tailer.py --events 50 --idle 3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from log_tailer import LogTailer
+
+LINE = '2025-10-01T00:40:29.910254 {"event": "inference", "inference_time": 3.77, "response_length": 351, "entropy": 4.51, "iteration": %d}\n'
+
+# The loop log_monitor.py used before LogTailer
+def old_follow(path, stop, interval=0.5):
+    last_position = 0
+    while not stop.is_set():
+        with open(path, 'r') as f:
+            f.seek(last_position)
+            lines = f.readlines()
+            last_position = f.tell()
+        if lines:
+            yield [line.rstrip("\n") for line in lines]
+        time.sleep(interval)
+
+def run(name, follow, path, events, idle, stop):
+    seen = {}
+    def monitor():
+        for batch in follow():
+            now = time.perf_counter()
+            for line in batch:
+                seen[json.loads(line.split(" ", 1)[1])["iteration"]] = now
+            if stop.is_set():
+                break
+    thread = threading.Thread(target=monitor, daemon=True)
+    thread.start()
+    time.sleep(0.2)
+    sent = {}
+    for i in range(events):
+        time.sleep(0.02 + (i % 7) * 0.01)
+        with open(path, "a") as f:
+            sent[i] = time.perf_counter()
+            f.write(LINE % i)
+    deadline = time.time() + 2
+    while len(seen) < events and time.time() < deadline:
+        time.sleep(0.01)
+    latencies = sorted((seen[i] - sent[i]) * 1000 for i in sent if i in seen)
+    # Idle CPU of the whole process while only the monitor thread is running
+    cpu_start = time.process_time()
+    time.sleep(idle)
+    idle_cpu = time.process_time() - cpu_start
+    stop.set()
+    with open(path, "a") as f:
+        f.write(LINE % -1)
+    thread.join(timeout=2)
+    return {"name": name, "delivered": len(latencies), "p50_ms": round(latencies[len(latencies) // 2], 2),
+            "max_ms": round(latencies[-1], 2), "idle_cpu_ms_per_s": round(idle_cpu * 1000 / idle, 3)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--idle", type=float, default=3.0, help="seconds of idle time to measure CPU over")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        approaches = [
+            ("inotify", lambda path, stop: LogTailer(path).follow),
+            ("polling 0.5s", lambda path, stop: LogTailer(path, use_inotify=False).follow),
+            ("old reopen+poll 0.5s", lambda path, stop: lambda: old_follow(path, stop)),
+        ]
+        for name, make in approaches:
+            path = os.path.join(tmp, name.split()[0] + ".log")
+            open(path, "w").close()
+            stop = threading.Event()
+            results.append(run(name, make(path, stop), path, args.events, args.idle, stop))
+            r = results[-1]
+            print(f"{name:22} {r['delivered']}/{args.events} lines, p50 {r['p50_ms']}ms, max {r['max_ms']}ms, "
+                  f"idle CPU {r['idle_cpu_ms_per_s']}ms/s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
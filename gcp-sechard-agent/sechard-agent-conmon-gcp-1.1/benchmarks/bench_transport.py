@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+import argparse, datetime, json, os, random, shutil, sys, tempfile, threading, time
+
+# Benchmark: event-to-alert latency of the agent -> log_monitor routes
+# An agent thread emits inference events for one session, then --spikes outliers spaced out
+# with normal events in between. Each route feeds a monitor running the same detection as
+# log_monitor.py, and the time from the agent emitting a spike to the monitor raising its
+# alert is measured:
+#   - old:    open/write/close per event, the monitor reopening the log every 0.5s
+#   - file:   telemetry.py's background writer, the monitor on log_tailer.py (inotify)
+#   - socket: telemetry.py streaming over telemetry_transport.py; also reports the time until
+#             the agent holds the monitor's verdict (what check_monitor() sees before a tool)
+# Usage: python3 benchmarks/bench_transport.py --spikes 50 --gap-ms 20
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".."))
+from bench_tailer import old_follow
+from log_tailer import LogTailer
+from stream_stats import StreamDetector
+from fast_ingest import BatchDecoder, detect
+from alert_sink import make_alert
+from log_monitor import BUFFER_MAX, GROUP_BY, QUARTILE_THRESHOLD, Z_THRESHOLD, verdict
+from telemetry import Telemetry
+import telemetry_transport
+
+SESSION = "bench-host-1-1700000000"
+SPIKE_BASE = 1000.0
+
+class Monitor:
+    def __init__(self):
+        self.detector = StreamDetector(window=BUFFER_MAX, z_threshold=Z_THRESHOLD, iqr_threshold=QUARTILE_THRESHOLD)
+        self.decoder = BatchDecoder()
+        self.lock = threading.Lock()
+        self.alerted = {}
+
+    # Returns the alerts, spikes are recorded by their index
+    def process(self, lines):
+        with self.lock:
+            batch = self.decoder.decode(lines)
+            now = time.perf_counter()
+            alerts = []
+            for row, metric, value, z, group, q1, q3 in detect(self.detector, batch, GROUP_BY):
+                alerts.append(make_alert(metric, value, z, q1, q3, QUARTILE_THRESHOLD, group, GROUP_BY, lines[row]))
+                if metric == "inference_time" and value >= SPIKE_BASE:
+                    self.alerted.setdefault(int(value - SPIKE_BASE), now)
+            return alerts
+
+def workload(spikes, between, warmup, seed=11):
+    rng = random.Random(seed)
+    plan = [("normal", rng.gauss(5, 0.3)) for _ in range(warmup)]
+    for k in range(spikes):
+        plan.append(("spike", SPIKE_BASE + k))
+        plan += [("normal", rng.gauss(5, 0.3)) for _ in range(between)]
+    return plan
+
+def fields(value):
+    return {"inference_time": value, "response_length": 400, "entropy": 4.5, "iteration": 1}
+
+# The agent side: emit() per event, sleeping gap after each spike; returns spike emit times
+def agent(plan, emit, gap, after_spike=None):
+    sent = {}
+    for kind, value in plan:
+        if kind == "spike":
+            k = int(value - SPIKE_BASE)
+            sent[k] = time.perf_counter()
+            emit(fields(value))
+            if after_spike:
+                after_spike(k)
+            time.sleep(gap)
+        else:
+            emit(fields(value))
+    return sent
+
+def old_emit(path):
+    def emit(entry):
+        log_entry = {"event": "inference", **entry, "session": SESSION}
+        with open(path, "a") as logf:
+            timestamp = datetime.datetime.now().isoformat()
+            logf.write(f"{timestamp} {json.dumps(log_entry)}\n")
+    return emit
+
+def wait_for(monitor, count, timeout=3):
+    deadline = time.time() + timeout
+    while len(monitor.alerted) < count and time.time() < deadline:
+        time.sleep(0.005)
+
+def latencies(sent, seen):
+    values = sorted((seen[k] - sent[k]) * 1000 for k in sent if k in seen)
+    if not values:
+        return {"delivered": 0}
+    return {"delivered": len(values), "p50_ms": round(values[len(values) // 2], 3),
+            "p99_ms": round(values[min(len(values) - 1, int(len(values) * 0.99))], 3), "max_ms": round(values[-1], 3)}
+
+def run_old(plan, tmp, gap):
+    path = os.path.join(tmp, "old.log")
+    open(path, "a").close()
+    monitor, stop = Monitor(), threading.Event()
+    def follow():
+        for lines in old_follow(path, stop):
+            monitor.process(lines)
+    thread = threading.Thread(target=follow, daemon=True)
+    thread.start()
+    sent = agent(plan, old_emit(path), gap)
+    wait_for(monitor, len(sent))
+    stop.set()
+    return latencies(sent, monitor.alerted)
+
+def run_file(plan, tmp, gap):
+    path = os.path.join(tmp, "file.log")
+    open(path, "a").close()
+    monitor = Monitor()
+    tailer = LogTailer(path)
+    def follow():
+        for lines in tailer.follow():
+            monitor.process(lines)
+    threading.Thread(target=follow, daemon=True).start()
+    telemetry = Telemetry(path, socket_path="", session=SESSION)
+    sent = agent(plan, lambda entry: telemetry.emit("inference", **entry), gap)
+    wait_for(monitor, len(sent))
+    telemetry.close()
+    result = latencies(sent, monitor.alerted)
+    result["mode"] = tailer.mode
+    return result
+
+def run_socket(plan, tmp, gap):
+    path = os.path.join(tmp, "monitor.sock")
+    monitor = Monitor()
+    server = telemetry_transport.serve(lambda lines: verdict(monitor.process(lines)), path)
+    telemetry = Telemetry(os.path.join(tmp, "fallback.log"), socket_path=path, session=SESSION)
+    verdicts = {}
+    def after_spike(k):
+        # what check_monitor() does before the next tool, with a generous wait
+        v = telemetry.verdict(wait=1.0)
+        if v is not None:
+            verdicts[k] = time.perf_counter()
+    sent = agent(plan, lambda entry: telemetry.emit("inference", **entry), gap, after_spike)
+    wait_for(monitor, len(sent))
+    telemetry.close()
+    telemetry_transport.stop(server)
+    result = latencies(sent, monitor.alerted)
+    result["verdict"] = latencies(sent, verdicts)
+    result["fallback_lines"] = telemetry.stats["written"]
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spikes", type=int, default=50)
+    parser.add_argument("--between", type=int, default=20, help="normal events after each spike")
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--gap-ms", type=float, default=20, help="agent pause after each spike")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    plan = workload(args.spikes, args.between, args.warmup)
+    gap = args.gap_ms / 1000
+    tmp = tempfile.mkdtemp(prefix="bench_transport_")
+    try:
+        results = {"old (open per event, 0.5s poll)": run_old(plan, tmp, gap),
+                   "file (telemetry + log_tailer)": run_file(plan, tmp, gap),
+                   "socket (telemetry_transport)": run_socket(plan, tmp, gap)}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    print(f"{len(plan)} events, {args.spikes} spikes, event to alert:")
+    for name, r in results.items():
+        if not r["delivered"]:
+            print(f"  {name:>34}: no alerts")
+            continue
+        print(f"  {name:>34}: p50 {r['p50_ms']:8.3f} ms, p99 {r['p99_ms']:8.3f} ms, max {r['max_ms']:8.3f} ms "
+              f"({r['delivered']}/{args.spikes} alerted)")
+        if "verdict" in r and r["verdict"]["delivered"]:
+            v = r["verdict"]
+            print(f"  {'verdict back at the agent':>34}: p50 {v['p50_ms']:8.3f} ms, p99 {v['p99_ms']:8.3f} ms, "
+                  f"max {v['max_ms']:8.3f} ms ({v['delivered']}/{args.spikes}), {r['fallback_lines']} lines to the fallback file")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+import json
+from collections import deque
+import numpy as np
+from stream_stats import VECTOR_MIN
+
+# Batched ingestion for log_monitor.py
+# Every line read in one wakeup is decoded together: the JSON payloads are joined into one
+# array and parsed with a single json.loads call (lines are only parsed one by one when the
+# batch contains a broken one), then checked against the BehaviorLog field table below with
+# plain type checks. Metric values are collected into per-metric columns that go to
+# StreamDetector.update_many() in one step (short columns go through update()). Invalid
+# lines are counted and the most recent few kept as samples instead of being printed one by
+# one.
+# With group_by set, each column is split further by the records' values of those fields so
+# every group is checked against its own baseline (see StreamDetector).
+
+# Field types, same schema as log_monitor's former pydantic BehaviorLog; only event is required
+SCHEMA = {
+    "event": str,
+    "tool_type": str,
+    "exec_time": float,
+    "inference_time": float,
+    "response_length": int,
+    "entropy": float,
+    "iteration": int,
+    "session": str,
+    "first_token_time": float,
+    "sanitize_time": float,
+    "prompt_bytes": int,
+    "output_bytes": int,
+}
+METRICS = ("exec_time", "inference_time", "response_length", "entropy",
+           "first_token_time", "sanitize_time", "prompt_bytes", "output_bytes")
+BAD_LINE_SAMPLES = 5
+
+class InvalidLine(ValueError):
+    pass
+
+# Slow path for values that are not already the exact type, with pydantic's lax coercions
+# (numeric strings, bools, integral floats for int fields)
+def _coerce(field, kind, value):
+    try:
+        if kind is str:
+            if isinstance(value, str):
+                return value
+        elif kind is float:
+            if isinstance(value, (int, float, str)):
+                return float(value)
+        elif isinstance(value, bool):
+            return int(value)
+        elif isinstance(value, float) and value.is_integer():
+            return int(value)
+        elif isinstance(value, str):
+            return int(value.strip())
+    except ValueError:
+        pass
+    raise InvalidLine(f"{field}: expected {kind.__name__}, got {value!r}")
+
+def validate(record):
+    if type(record) is not dict:
+        raise InvalidLine(f"expected an object, got {type(record).__name__}")
+    if "event" not in record or record["event"] is None:
+        raise InvalidLine("event: field required")
+    for field, value in record.items():
+        kind = SCHEMA.get(field)
+        if kind is None or value is None or type(value) is kind or (kind is float and type(value) is int):
+            continue
+        record[field] = _coerce(field, kind, value)
+    return record
+
+class Batch:
+    def __init__(self, count):
+        self.count = count
+        self.records = []
+        self.rows = []      # position of each record's line in the decoded lines
+        # metric -> (record indexes, values)
+        self.columns = {}
+
+class BatchDecoder:
+    def __init__(self, samples=BAD_LINE_SAMPLES):
+        self.lines = 0
+        self.bad = 0
+        self.samples = deque(maxlen=samples)
+
+    def _reject(self, line, reason):
+        self.bad += 1
+        self.samples.append(f"{reason}: {line[:120]}")
+
+    def _payloads(self, lines):
+        payloads = []
+        for row, line in enumerate(lines):
+            # "<timestamp> {json}"
+            payload = line.partition(" ")[2].strip()
+            if payload[:1] == "{" and payload[-1:] == "}":
+                payloads.append((row, payload))
+            elif line.strip():
+                self._reject(line, "no JSON object")
+        return payloads
+
+    def _parse(self, lines, payloads):
+        try:
+            return json.loads("[" + ",".join(p for _, p in payloads) + "]")
+        except ValueError:
+            pass
+        records = []
+        for row, payload in payloads:
+            try:
+                records.append(json.loads(payload))
+            except ValueError as e:
+                records.append(None)
+                self._reject(lines[row], f"bad JSON ({e})")
+        return records
+
+    def decode(self, lines):
+        self.lines += len(lines)
+        payloads = self._payloads(lines)
+        records = self._parse(lines, payloads) if payloads else []
+        # a payload holding several comma separated values breaks the 1:1 mapping, redo per line
+        if len(records) != len(payloads):
+            records = [None] * len(payloads)
+            for i, (row, payload) in enumerate(payloads):
+                try:
+                    records[i] = json.loads(payload)
+                except ValueError as e:
+                    self._reject(lines[row], f"bad JSON ({e})")
+        batch = Batch(len(lines))
+        for (row, _), record in zip(payloads, records):
+            if record is None:
+                continue
+            try:
+                batch.records.append(validate(record))
+                batch.rows.append(row)
+            except InvalidLine as e:
+                self._reject(lines[row], str(e))
+        records = batch.records
+        for metric in METRICS:
+            indexes = [i for i, record in enumerate(records) if record.get(metric) is not None]
+            if indexes:
+                batch.columns[metric] = (indexes, [records[i][metric] for i in indexes])
+        return batch
+
+    def report(self):
+        lines = [f"Ingested {self.lines} lines, {self.bad} invalid"]
+        lines += [f"  {sample}" for sample in self.samples]
+        return "\n".join(lines)
+
+def group_keys(records, indexes, group_by):
+    return [tuple(records[index].get(field) for field in group_by) for index in indexes]
+
+# Splits a column into {group: (record indexes, values)}, groups in order of first appearance
+def split_groups(keys, indexes, values):
+    groups = {}
+    for key, index, value in zip(keys, indexes, values):
+        column = groups.get(key)
+        if column is None:
+            column = groups[key] = ([], [])
+        column[0].append(index)
+        column[1].append(value)
+    return groups
+
+# Runs a batch through the detector; returns (line position, metric, value, z, group, q1, q3)
+# per alert in log order, group being the record's values of the group_by fields and q1, q3
+# the quartiles of the window the value was checked against. Parent windows are fed in log
+# order first, so the result does not depend on how lines are batched
+def detect(detector, batch, group_by=()):
+    alerts = []
+    rows = batch.rows
+    for metric, (indexes, values) in batch.columns.items():
+        if group_by:
+            keys = group_keys(batch.records, indexes, group_by)
+            detector.record_parents(metric, keys, values)
+            groups = split_groups(keys, indexes, values)
+        else:
+            groups = {(): (indexes, values)}
+        for group, (indexes, values) in groups.items():
+            if len(values) < VECTOR_MIN:
+                # a wakeup with a few lines, not worth the array round trip
+                for index, value in zip(indexes, values):
+                    is_out, z = detector.update(metric, value, group, parents=False)
+                    if is_out:
+                        stats = detector.stats(metric, group)
+                        alerts.append((rows[index], metric, value, z, group, stats["q1"], stats["q3"]))
+                continue
+            flags, z_scores, q1, q3 = detector.update_many(metric, values, group, parents=False, quartiles=True)
+            for i in np.flatnonzero(flags):
+                alerts.append((rows[indexes[i]], metric, values[i], float(z_scores[i]), group, float(q1[i]), float(q3[i])))
+    alerts.sort(key=lambda alert: alert[0])
+    return alerts
@@ -1,110 +1,147 @@
 #!/usr/bin/env python3
 
 # log_monitor.py runs indefinitely until certl+c exit tailing the agent_behavior.log and writes to alerts.log
+# (JSON lines, plus the console; see alert_sink.py for the sinks, dedup and rate limit)
+# With TELEMETRY_SOCKET set it also takes events streamed by the agents over that Unix socket
+# and answers each read with a verdict (see telemetry_transport.py at the repo root)
 
-import time
-import json
-import numpy as np
-from pydantic import BaseModel, ValidationError
 import sys
 import os
+import threading
+# Shared agent modules live at the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from telemetry_transport import TELEMETRY_SOCKET, serve, stop
+from log_tailer import LogTailer
+from stream_stats import StreamDetector, load_baseline, save_baseline
+from fast_ingest import BatchDecoder, detect
+from alert_sink import AlertPipeline, make_alert
 
-# Pydantic model for log validation
-class BehaviorLog(BaseModel):
-    event: str
-    tool_type: str = None
-    exec_time: float = None
-    inference_time: float = None
-    response_length: int = None
-    entropy: float = None
-    iteration: int = None
-
-# Buffers for running stats (per metric), limit to last 100 for efficiency
-buffers = {
-    "exec_time": [],
-    "inference_time": [],
-    "response_length": [],
-    "entropy": []
-}
+# Rolling window per metric (last 100 values), updated in O(1) per value
 BUFFER_MAX = 100
 
 Z_THRESHOLD = 2.5
 QUARTILE_THRESHOLD = 1.5
 
-def compute_stats(buffer):
-    if len(buffer) < 3:
-        return {"mean": 0, "std": 0, "q1": 0, "q3": 0}
-    arr = np.array(buffer)
-    return {
-        "mean": np.mean(arr),
-        "std": np.std(arr),
-        "q1": np.percentile(arr, 25),
-        "q3": np.percentile(arr, 75)
-    }
-
-def detect_outlier(value, stats):
-    if stats["std"] == 0:
-        return False, 0.0
-    z_score = (value - stats["mean"]) / stats["std"]
-    iqr = stats["q3"] - stats["q1"]
-    is_outlier = (value > stats["q3"] + QUARTILE_THRESHOLD * iqr) or abs(z_score) > Z_THRESHOLD
-    return is_outlier, z_score
-
-def process_log_line(line):
+# One baseline per combination of these fields (a search re-prompt, a normal turn and the final
+# summary, and each agent session, no longer share a window); empty for one global baseline
+GROUP_BY = tuple(f.strip() for f in os.environ.get("MONITOR_GROUP_BY", "event,tool_type,iteration,session").split(",") if f.strip())
+# Idle groups are evicted, least recently updated first, to stay under this many MB
+MONITOR_MEMORY_MB = float(os.environ.get("MONITOR_MEMORY_MB", "64"))
+
+detector = StreamDetector(window=BUFFER_MAX, z_threshold=Z_THRESHOLD, iqr_threshold=QUARTILE_THRESHOLD,
+                          max_bytes=int(MONITOR_MEMORY_MB * 1024 * 1024))
+
+# Window contents from backfill.py (or from the last run of the monitor), so alerts start with
+# the first event instead of after a fresh window fills
+MONITOR_BASELINE = os.environ.get("MONITOR_BASELINE", "baseline.npz")
+
+# Lines that fail to decode are counted and sampled by the decoder, see fast_ingest.py
+decoder = BatchDecoder()
+
+# Streamed events are appended here in the agent_behavior.log format, so backfill.py can still
+# score them later
+MONITOR_STREAM_LOG = os.environ.get("MONITOR_STREAM_LOG", "agent_stream.log")
+# Verdict for an agent whose events raised alerts: block the next tool at this |z| or above,
+# otherwise slow it down by MONITOR_SLOW_S seconds
+MONITOR_BLOCK_Z = float(os.environ.get("MONITOR_BLOCK_Z", "8"))
+MONITOR_SLOW_S = float(os.environ.get("MONITOR_SLOW_S", "2"))
+
+# The tailer loop and the socket connections share the detector and decoder
+lock = threading.Lock()
+
+def load_snapshot(path=MONITOR_BASELINE):
+    if not os.path.exists(path):
+        return
     try:
-        # Split timestamp from JSON (e.g., "2023-10-01 12:00:00 {\"event\": ...}")
-        parts = line.split(' ', 1)
-        if len(parts) < 2:
-            return
-        data = json.loads(parts[1])
-        validated = BehaviorLog(**data)
-        # Append to buffers (limit size)
-        if validated.exec_time is not None:
-            buffers["exec_time"].append(validated.exec_time)
-            buffers["exec_time"] = buffers["exec_time"][-BUFFER_MAX:]
-        if validated.inference_time is not None:
-            buffers["inference_time"].append(validated.inference_time)
-            buffers["inference_time"] = buffers["inference_time"][-BUFFER_MAX:]
-        if validated.response_length is not None:
-            buffers["response_length"].append(validated.response_length)
-            buffers["response_length"] = buffers["response_length"][-BUFFER_MAX:]
-        if validated.entropy is not None:
-            buffers["entropy"].append(validated.entropy)
-            buffers["entropy"] = buffers["entropy"][-BUFFER_MAX:]
-        
-        # Check for outliers
-        for metric, buffer in buffers.items():
-            if buffer:
-                stats = compute_stats(buffer)
-                is_out, z = detect_outlier(buffer[-1], stats)
-                if is_out:
-                    alert = f"ALERT: Outlier in {metric} (z={z:.2f}, value={buffer[-1]}). Potential security drift!"
-                    print(alert)
-                    with open("alerts.log", "a") as f:
-                        f.write(alert + "\n")
-    except (json.JSONDecodeError, ValidationError, ValueError) as e:
-        print(f"Invalid log line: {e}")
+        meta, windows = load_baseline(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ignoring baseline {path}: {e}")
+        return
+    if meta.get("window") != BUFFER_MAX or tuple(meta.get("group_by", ())) != GROUP_BY:
+        print(f"Ignoring baseline {path}: built for window={meta.get('window')}, group_by={meta.get('group_by')}")
+        return
+    detector.restore(windows)
+    print(f"Loaded {len(detector.windows)} baselines from {path}")
+
+def save_snapshot(path=MONITOR_BASELINE):
+    save_baseline(path, detector.snapshot(), BUFFER_MAX, GROUP_BY, source="log_monitor")
+
+# Every line read in one wakeup is decoded in one go and each metric column checked in one step;
+# alerts go to the pipeline's background writer, offsets are the lines' byte offsets in source.
+# Returns every alert raised, including the ones the pipeline filters out
+def process_batch(pipeline, lines, offsets=None, source=None):
+    bad = decoder.bad
+    batch = decoder.decode(lines)
+    alerts = []
+    for row, metric, value, z, group, q1, q3 in detect(detector, batch, GROUP_BY):
+        line = lines[row]
+        alert = make_alert(metric, value, z, q1, q3, QUARTILE_THRESHOLD, group, GROUP_BY, line,
+                           offsets[row] if offsets else None, source)
+        alerts.append(alert)
+        pipeline.submit(dict(alert), identity=(metric, line))
+    if decoder.bad > bad:
+        print(f"Skipped {decoder.bad - bad} invalid log lines (latest: {decoder.samples[-1]})")
+    return alerts
+
+def verdict(alerts):
+    if not alerts:
+        return None
+    worst = max(alerts, key=lambda alert: abs(alert["z"]))
+    reason = f"{len(alerts)} outlier(s), worst {worst['metric']}={worst['value']} (z={worst['z']:.2f})"
+    if abs(worst["z"]) >= MONITOR_BLOCK_Z:
+        return {"action": "block", "metric": worst["metric"], "z": worst["z"], "reason": reason}
+    return {"action": "slow", "delay": MONITOR_SLOW_S, "metric": worst["metric"], "z": worst["z"], "reason": reason}
+
+# Events from one read of an agent's socket
+def process_stream(pipeline, stream, lines):
+    with lock:
+        if stream.closed:
+            return None
+        alerts = process_batch(pipeline, lines, source="socket")
+        stream.writelines(line + "\n" for line in lines)
+        stream.flush()
+    return verdict(alerts)
 
 if __name__ == "__main__":
     log_file = "agent_behavior.log"
     if not os.path.exists(log_file):
         open(log_file, 'a').close()  # Create if missing
 
-    print(f"Monitoring {log_file} for behavioral outliers (using polling)...")
-    last_position = 0
+    load_snapshot()
+
+    # Blocks on inotify (or polls as a fallback), follows rotation/truncation and resumes
+    # from agent_behavior.log.offset after a restart
+    tailer = LogTailer(log_file)
+    pipeline = AlertPipeline()
+    print(f"Monitoring {log_file} for behavioral outliers ({tailer.mode})...")
+    server = stream = None
+    if TELEMETRY_SOCKET:
+        stream = open(MONITOR_STREAM_LOG, "a")
+        server = serve(lambda lines: process_stream(pipeline, stream, lines), TELEMETRY_SOCKET)
+        print(f"Listening for agent telemetry on {TELEMETRY_SOCKET} (saved to {MONITOR_STREAM_LOG})")
 
     try:
-        while True:
-            try:
-                with open(log_file, 'r') as f:
-                    f.seek(last_position)
-                    lines = f.readlines()
-                    last_position = f.tell()
-                    for line in lines:
-                        process_log_line(line.strip())
-            except IOError as e:
-                print(f"Error reading log file: {e}")
-            
-            time.sleep(0.5)  # Poll every 0.5 seconds (adjust if needed for CPU vs. latency)
+        for lines in tailer.follow():
+            with lock:
+                process_batch(pipeline, lines, tailer.offsets, log_file)
+            tailer.commit()
     except KeyboardInterrupt:
-        print("Monitoring stopped.")
\ No newline at end of file
+        print("Monitoring stopped.")
+        if server is not None:
+            stop(server)
+            server = None
+        with lock:
+            print(tailer.report())
+            print(decoder.report())
+            print(f"Baselines: {len(detector.windows)} windows (~{detector.memory() // 1024} KB), {detector.evicted} evicted")
+            save_snapshot()
+        print(f"Saved baselines to {MONITOR_BASELINE}")
+    finally:
+        if server is not None:
+            stop(server)
+        if stream is not None:
+            with lock:
+                stream.close()
+        tailer.close()
+        pipeline.close()
+        print(pipeline.report())
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+
+import ctypes, ctypes.util, json, os, select, struct, time
+
+# Event-driven tail of agent_behavior.log for log_monitor.py
+# The log stays open and the tailer sleeps on inotify (Linux, through ctypes) until the
+# directory reports a write, create or rename of the log; elsewhere it falls back to polling
+# every LOG_TAIL_POLL seconds. Each wakeup compares the path's inode with the open file
+# (rotation: finish the old file, then switch) and its size with the read offset (truncation:
+# start over). An unterminated last line is held back until its newline arrives. The offset
+# of the last complete line is saved to <log>.offset after each batch, so a restarted monitor
+# resumes where it stopped instead of re-reading or skipping lines. The byte offset of each
+# line of the last batch is kept in .offsets, for alerts that point back into the log.
+
+LOG_TAIL_POLL = float(os.environ.get("LOG_TAIL_POLL", "0.5"))
+# Even with inotify the path is re-checked this often, in case an event was missed
+LOG_TAIL_RECHECK = float(os.environ.get("LOG_TAIL_RECHECK", "5"))
+READ_SIZE = 65536
+
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+
+class _Inotify:
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f"inotify_add_watch failed on {directory}")
+
+    # True when an event for `name` arrived within timeout
+    def wait(self, name, timeout):
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return False
+        hit = False
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return hit
+            pos = 0
+            while pos < len(data):
+                _, _, _, length = _EVENT.unpack_from(data, pos)
+                pos += _EVENT.size
+                hit = hit or data[pos:pos + length].rstrip(b"\0") == name
+                pos += length
+
+    def close(self):
+        os.close(self.fd)
+
+class LogTailer:
+    def __init__(self, path, state_path=None, poll_interval=LOG_TAIL_POLL, use_inotify=True):
+        self.path = path
+        self.name = os.fsencode(os.path.basename(path))
+        self.state_path = state_path or path + ".offset"
+        self.poll_interval = poll_interval
+        self.file = None
+        self.identity = None
+        self.offset = 0         # end of the last complete line handed out
+        self.partial = b""
+        self.offsets = []       # start of each line returned by the last read_available()
+        self.stats = {"lines": 0, "rotations": 0, "truncations": 0, "wakeups": 0}
+        self.inotify = None
+        if use_inotify:
+            try:
+                self.inotify = _Inotify(os.path.dirname(os.path.abspath(path)))
+            except (OSError, AttributeError) as e:
+                print(f"inotify unavailable ({e}), polling every {poll_interval}s")
+        self.mode = "inotify" if self.inotify else f"polling every {poll_interval}s"
+        self._open(resume=True)
+
+    def _load_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _open(self, resume=False):
+        try:
+            self.file = open(self.path, "rb")
+        except FileNotFoundError:
+            self.file, self.identity = None, None
+            return
+        st = os.fstat(self.file.fileno())
+        self.identity = (st.st_dev, st.st_ino)
+        self.offset, self.partial = 0, b""
+        state = self._load_state() if resume else {}
+        if [state.get("dev"), state.get("inode")] == list(self.identity) and state.get("offset", 0) <= st.st_size:
+            self.offset = state["offset"]
+            print(f"Resuming {self.path} at byte {self.offset}")
+        self.file.seek(self.offset)
+
+    def commit(self):
+        if self.identity is None:
+            return
+        state = {"dev": self.identity[0], "inode": self.identity[1], "offset": self.offset}
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path)
+
+    def _read(self, lines):
+        while True:
+            data = self.file.read(READ_SIZE)
+            if not data:
+                return
+            data = self.partial + data
+            end = data.rfind(b"\n") + 1
+            pos = self.offset
+            for raw in data[:end].split(b"\n")[:-1]:
+                lines.append(raw.decode("utf-8", errors="replace"))
+                self.offsets.append(pos)
+                pos += len(raw) + 1
+            self.offset += end
+            self.partial = data[end:]
+
+    # Complete lines available now, following rotation and truncation
+    def read_available(self):
+        lines = []
+        self.offsets = []
+        if self.file is None:
+            self._open()
+            if self.file is None:
+                return lines
+        self._read(lines)
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return lines    # rotated away and not recreated yet, keep the old file
+        if (st.st_dev, st.st_ino) != self.identity:
+            # Rotated: whatever is left in the old file belongs before the new one
+            self._read(lines)
+            if self.partial:
+                lines.append(self.partial.decode("utf-8", errors="replace"))
+                self.offsets.append(self.offset)
+            self.file.close()
+            self.stats["rotations"] += 1
+            self._open()
+            if self.file is not None:
+                self._read(lines)
+        elif st.st_size < self.offset + len(self.partial):
+            print(f"{self.path} was truncated, reading from the start")
+            self.stats["truncations"] += 1
+            self.file.seek(0)
+            self.offset, self.partial = 0, b""
+            self._read(lines)
+        self.stats["lines"] += len(lines)
+        return lines
+
+    # Yields batches of new lines, blocking in between
+    def follow(self):
+        while True:
+            lines = self.read_available()
+            if lines:
+                yield lines
+                continue
+            if self.inotify:
+                self.inotify.wait(self.name, LOG_TAIL_RECHECK)
+            else:
+                time.sleep(self.poll_interval)
+            self.stats["wakeups"] += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+        if self.inotify:
+            self.inotify.close()
+
+    def report(self):
+        s = self.stats
+        return (f"Tailer ({self.mode}): {s['lines']} lines, {s['wakeups']} wakeups, "
+                f"{s['rotations']} rotations, {s['truncations']} truncations")
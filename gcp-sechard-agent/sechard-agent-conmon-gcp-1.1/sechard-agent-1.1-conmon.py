@@ -1,49 +1,58 @@
 #!/usr/bin/env python3
 
 import vertexai
-from vertexai.generative_models import GenerativeModel
-import os, subprocess, time, logging, sys, random, ast
-import json
-import datetime
-import math
+import os, time, logging, sys, random
+
+# Shared agent modules live at the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from async_exec import run_command_sync
+from vertex_context import ContextChat, VertexBackend
+from command_policy import load_policy
+from tool_calls import ToolRegistry, ToolCallError, RETRY_HINT
+from telemetry import Telemetry, shannon_entropy
+import socket
 
 # Detect Cloud Shell project automatically
 GCP_PROJECT_ID = os.environ.get("CLOUD_PROJECT") or os.environ["GCP_PROJECT_ID"]
 
 vertexai.init(project=GCP_PROJECT_ID, location="us-central1")
-chat_model = GenerativeModel(model_name="gemini-2.5-pro")
-chat = chat_model.start_chat()
+
+# Tags every agent_behavior.log entry of this run, log_monitor keeps a baseline per session
+SESSION_ID = f"{socket.gethostname()}-{os.getpid()}-{int(time.time())}"
+# Events are queued and written by a background thread; TELEMETRY_LOG moves the log.
+# With TELEMETRY_SOCKET set they are streamed to log_monitor.py instead while it is running
+telemetry = Telemetry(os.environ.get("TELEMETRY_LOG") or "agent_behavior.log", session=SESSION_ID)
 
 # Load the prompt template
 with open("prompt.md", "r") as f:
     base_prompt = f.read()
 
+# SECHARD_CONTEXT_MODE=system|cached registers prompt.md once and sends only per-turn deltas
+chat = ContextChat(VertexBackend("gemini-2.5-pro"), base_prompt)
+
 # Guardrails
 prohibited_commands = ['sudo', 'runas', 'del', 'rm', 'chmod', 'icacls']
+# COMMAND_POLICY=<rules file> replaces the list, see command_policy.py at the repo root
+command_policy = load_policy(prohibited_commands)
 
 def cli(command):
-    result = subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    output = result.stdout.decode()
-    print(output)
-    return output
-
-def extract_tool_dict(text):
-    # Strip markdown code fences if present
-    if text.startswith("```"):
-        text = text.strip().strip("`").strip()
-        if text.lower().startswith("json"):
-            text = text[4:].strip()
-    try:
-        return ast.literal_eval(text)
-    except Exception as e:
-        print(f"Failed to parse tool block: {e}")
-        return None
-
-def calculate_entropy(text):
-    if not text:
-        return 0.0
-    prob = [float(text.count(c)) / len(text) for c in set(text)]
-    return -sum(p * math.log2(p) for p in prob if p > 0)
+    # Output is streamed live; the command's process group is killed on CLI_TIMEOUT.
+    # Gemini gets a head/tail summary, large output is kept in full under CLI_OUTPUT_DIR
+    result = run_command_sync(command)
+    if result.capture.truncated:
+        print(f"[cli output {result.capture.report()}]")
+    return result.text()
+
+# A streaming log_monitor answers every event with a verdict; before each tool runs, an
+# outlier in this session slows the agent down or, far enough out, stops it
+def check_monitor():
+    verdict = telemetry.verdict()
+    if verdict is None:
+        return
+    if verdict["action"] == "block":
+        raise Exception(f"**MONITOR VERDICT**: log_monitor blocked the next tool. {verdict.get('reason')}")
+    print(f"log_monitor asked the agent to slow down ({verdict.get('reason')}), waiting {verdict.get('delay', 0)}s")
+    time.sleep(verdict.get("delay", 0))
 
 if __name__ == "__main__":
     if os.path.exists("logfile"):
@@ -66,121 +75,70 @@ if __name__ == "__main__":
             f"\n\n## Iteration Counter\n{counter}"
         )
 
+    # One Gemini turn, logged as an inference event: latency, time to the first streamed
+    # chunk, bytes sent and received, response length and entropy
+    def infer(prompt, delta, **fields):
+        with telemetry.span("inference", "inference_time", **fields) as span:
+            response = chat.send_message(prompt, delta)
+            span.stop()
+            text = response.text
+            turn = chat.turns[-1]
+            span.set(response_length=len(text), entropy=shannon_entropy(text), input_tokens=turn["input_tokens"],
+                     first_token_time=turn["first_token_s"], prompt_bytes=turn["sent_bytes"],
+                     output_bytes=len(text.encode()), iteration=counter)
+        return text
+
+    # Tool handlers return the text appended to the tool output history
+    def run_cli(command):
+        decision = command_policy.check(command)
+        if not decision.allowed:
+            raise Exception(f"**SAFETY GUARDRAIL TRIGGERED**: Dangerous CLI command blocked. {decision.invocation} ({decision.rule or 'default ' + command_policy.default})")
+        with telemetry.span("tool_execution", "exec_time", tool_type="cli", iteration=counter) as span:
+            result = cli(command)
+            span.stop()
+            span.set(output_bytes=len(result.encode()))
+        return f"\n\nCLI OUTPUT:\n{result}"
+
+    def run_search(query):
+        print("Gemini requested a search. Re-prompting with more context...")
+        search_text = infer(build_prompt(), f"## Iteration Counter\n{counter}", tool_type="search")
+        return f"\n\nSEARCH OUTPUT:\n{search_text}"
+
+    # Either {"cli": "..."} or {"tool": "cli", "command": "..."}; {"tool": "search"} needs no query
+    tools = ToolRegistry()
+    tools.register("cli", run_cli, argument="command")
+    tools.register("search", run_search, argument="query", required=False)
+
     # Initial LLM message
-    history_prompt = build_prompt()
-    start_time = time.time()
-    response = chat.send_message(history_prompt)
-    inference_time = time.time() - start_time
-    llm_response = response.text
-    response_length = len(llm_response)
-    entropy = calculate_entropy(llm_response)
-    log_entry = {
-        "event": "inference",
-        "inference_time": inference_time,
-        "response_length": response_length,
-        "entropy": entropy,
-        "iteration": counter
-    }
-    with open("agent_behavior.log", "a") as logf:
-        timestamp = datetime.datetime.now().isoformat()
-        logf.write(f"{timestamp} {json.dumps(log_entry)}\n")
+    llm_response = infer(build_prompt(), "## User Input\n" + user_input + f"\n\n## Iteration Counter\n{counter}")
     print("LLM **INITIAL** response output:\n" + llm_response)
     logging.info(llm_response)
 
     while counter < 5:
-        tool_block = extract_tool_dict(llm_response)
-
-        if not tool_block:
-            print("Invalid or unrecognized tool format. Exiting.")
-            break
-
-        # Handle CLI tool (either {"cli": "..."} or {"tool": "cli", "command": "..."})
-        command = None
-        if 'cli' in tool_block:
-            command = tool_block['cli']
-        elif tool_block.get("tool") == "cli" and tool_block.get("command"):
-            command = tool_block["command"]
-
-        if command:
-            if any(cmd in command for cmd in prohibited_commands):
-                raise Exception("**SAFETY GUARDRAIL TRIGGERED**: Dangerous CLI command blocked.")
-            start_time = time.time()
-            result = cli(command)
-            exec_time = time.time() - start_time
-            log_entry = {
-                "event": "tool_execution",
-                "tool_type": "cli",
-                "exec_time": exec_time,
-                "iteration": counter
-            }
-            with open("agent_behavior.log", "a") as logf:
-                timestamp = datetime.datetime.now().isoformat()
-                logf.write(f"{timestamp} {json.dumps(log_entry)}\n")
-            tool_output_history += f"\n\nCLI OUTPUT:\n{result}"
-
-        elif tool_block.get("tool") == "search":
-            print("Gemini requested a search. Re-prompting with more context...")
-            start_time = time.time()
-            search_response = chat.send_message(build_prompt())
-            inference_time = time.time() - start_time
-            search_text = search_response.text
-            response_length = len(search_text)
-            entropy = calculate_entropy(search_text)
-            log_entry = {
-                "event": "inference",
-                "tool_type": "search",
-                "inference_time": inference_time,
-                "response_length": response_length,
-                "entropy": entropy,
-                "iteration": counter
-            }
-            with open("agent_behavior.log", "a") as logf:
-                timestamp = datetime.datetime.now().isoformat()
-                logf.write(f"{timestamp} {json.dumps(log_entry)}\n")
-            tool_output_history += f"\n\nSEARCH OUTPUT:\n{search_text}"
-
+        try:
+            call = tools.parse(llm_response)
+        except ToolCallError as e:
+            # Hand the problem back to Gemini instead of ending the session
+            print(f"Invalid or unrecognized tool format ({e}). Asking Gemini again.")
+            new_output = f"\n\nTOOL CALL ERROR:\n{e}. {RETRY_HINT}"
         else:
-            print("Unrecognized tool. Exiting.")
-            break
+            check_monitor()
+            new_output = tools.dispatch(call)
+        tool_output_history += new_output
 
         counter += 1
-        history_prompt = build_prompt()
-        start_time = time.time()
-        response = chat.send_message(history_prompt)
-        inference_time = time.time() - start_time
-        llm_response = response.text
-        response_length = len(llm_response)
-        entropy = calculate_entropy(llm_response)
-        log_entry = {
-            "event": "inference",
-            "inference_time": inference_time,
-            "response_length": response_length,
-            "entropy": entropy,
-            "iteration": counter
-        }
-        with open("agent_behavior.log", "a") as logf:
-            timestamp = datetime.datetime.now().isoformat()
-            logf.write(f"{timestamp} {json.dumps(log_entry)}\n")
+        llm_response = infer(build_prompt(), "## Tool Result Output History" + new_output + f"\n\n## Iteration Counter\n{counter}")
         print(f"LLM **NEXT** response output (iteration {counter}):\n" + llm_response)
         logging.info(llm_response)
 
-    final_prompt = build_prompt() + "\n\n## FINAL user input\nWe have exhausted all attempts. What recommended next steps should we action?"
-    start_time = time.time()
-    response = chat.send_message(final_prompt)
-    inference_time = time.time() - start_time
-    final_response = response.text
-    response_length = len(final_response)
-    entropy = calculate_entropy(final_response)
-    log_entry = {
-        "event": "inference",
-        "inference_time": inference_time,
-        "response_length": response_length,
-        "entropy": entropy,
-        "iteration": counter
-    }
-    with open("agent_behavior.log", "a") as logf:
-        timestamp = datetime.datetime.now().isoformat()
-        logf.write(f"{timestamp} {json.dumps(log_entry)}\n")
+    final_input = "\n\n## FINAL user input\nWe have exhausted all attempts. What recommended next steps should we action?"
+    final_prompt = build_prompt() + final_input
+    final_response = infer(final_prompt, final_input.lstrip())
     print("LLM **FINAL** response output:\n" + final_response)
     logging.info(final_response)
-    logging.info(final_prompt)
\ No newline at end of file
+    logging.info(final_prompt)
+    chat.close()
+    print(chat.report())
+    logging.info(chat.report())
+    telemetry.close()
+    logging.info(telemetry.report())
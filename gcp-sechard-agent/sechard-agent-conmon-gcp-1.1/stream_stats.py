@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+
+import json, math, os
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Streaming statistics for log_monitor.py
+# Each metric keeps its last `size` values in a fixed ring buffer. Mean and variance are
+# updated in O(1) per value (Welford, with the evicted value removed) and recomputed exactly
+# from the ring each time it wraps so rounding cannot drift. Quartiles come from a sorted copy
+# of the window kept with bisect, interpolated the way np.percentile does by default. Only
+# the metrics present in a log line are evaluated, so a metric's last value is never alerted
+# on twice.
+#
+# Detection matches log_monitor's original detect_outlier(): the new value is part of the
+# window, fewer than 3 values or a zero std never alert, otherwise a value above
+# q3 + iqr_threshold * IQR or with |z| above z_threshold does.
+#
+# update_many() checks a whole batch of one metric at once: every value's window (the values
+# before it plus itself) is a row of a sliding window view, and mean, std and quartiles are
+# computed for all rows in one NumPy call each. Values that arrive while the window is still
+# filling go through update() one at a time.
+#
+# Windows can be grouped: update(metric, value, group=(event, tool_type, ...)) evaluates the
+# value against the window of (metric, *group) and also feeds every parent window ((metric,),
+# (metric, event), ...), which only keep their ring. A group seen for the first time starts with
+# its parent's last WARM_START values, so it alerts from its first value instead of waiting for
+# min_values of its own; its own values replace the parent's before anything else leaves the
+# window, so the parent's level stops mattering once the group has WARM_START values. Windows
+# live in an LRU ordered dict; with max_bytes set, the least recently updated ones are dropped
+# once the estimated footprint would exceed it (an evicted group warm-starts from its parent
+# again if it comes back).
+
+# Below this many values a batch is cheaper one value at a time
+VECTOR_MIN = 16
+# Parent values a new group starts with
+WARM_START = 25
+# Bytes per window on top of its two float arrays: the object, its slots and the LRU entry
+WINDOW_OVERHEAD = 512
+
+class RollingWindow:
+    __slots__ = ("size", "values", "sorted", "count", "pos", "mean", "m2", "seeded")
+
+    def __init__(self, size):
+        self.size = size
+        # plain float arrays: a third of the size of a list of floats, and much cheaper than
+        # NumPy for one element at a time (np.frombuffer gives a view for the batch paths)
+        self.values = array("d", bytes(8 * size))
+        self.sorted = array("d")
+        self.count = 0
+        self.pos = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        # parent values from a warm start still in the window, at values[count - seeded:count]
+        self.seeded = 0
+
+    def push(self, x):
+        x = float(x)
+        if self.seeded:
+            # a warm-started window replaces its parent's values before any of its own
+            self._replace(self.count - self.seeded, x)
+            self.seeded -= 1
+        elif self.count < self.size:
+            self.count += 1
+            delta = x - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (x - self.mean)
+            insort(self.sorted, x)
+            self.values[self.pos] = x
+            self.pos += 1
+        else:
+            self._replace(self.pos, x)
+            self.pos += 1
+        if self.pos == self.size:
+            self.pos = 0
+            self._moments()
+
+    def _replace(self, i, x):
+        old = self.values[i]
+        del self.sorted[bisect_left(self.sorted, old)]
+        mean = self.mean + (x - old) / self.count
+        self.m2 += (x - old) * (x - mean + old - self.mean)
+        self.mean = mean
+        insort(self.sorted, x)
+        self.values[i] = x
+
+    def _moments(self):
+        values = np.frombuffer(self.values)[:self.count]
+        self.mean = float(values.mean())
+        self.m2 = float(((values - self.mean) ** 2).sum())
+
+    # Ring only, for parent windows that are never evaluated; copy_from() rebuilds the rest
+    def record(self, x):
+        if self.seeded:
+            self.values[self.count - self.seeded] = x
+            self.seeded -= 1
+            return
+        self.values[self.pos] = x
+        self.pos = (self.pos + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def record_many(self, values):
+        if self.seeded or self.count + len(values) < self.size:
+            for x in values:
+                self.record(x)
+        else:
+            self.values = array("d", np.concatenate((self.ordered(), values))[-self.size:].tobytes())
+            self.count = self.size
+            self.pos = 0
+
+    # Window contents oldest first
+    def ordered(self):
+        values = np.frombuffer(self.values)
+        if self.seeded:
+            own = self.count - self.seeded
+            return np.concatenate((values[own:self.count], values[:own]))
+        if self.count < self.size:
+            return values[:self.count].copy()
+        return np.concatenate((values[self.pos:], values[:self.pos]))
+
+    # Replace a full window with the last `size` values of a batch
+    def load(self, values):
+        self.values = array("d", np.asarray(values[-self.size:], dtype=float).tobytes())
+        self.sorted = array("d", sorted(self.values))
+        self.count = self.size
+        self.pos = 0
+        self.seeded = 0
+        self._moments()
+
+    # Window with `values` (oldest first) as contents, the first `seeded` of them still warm-start
+    # values from its parent, as saved in a baseline snapshot
+    def restore(self, values, seeded=0):
+        values = np.asarray(values[-self.size:], dtype=float)
+        n = len(values)
+        # own values at the front, parent values after them, see push()
+        self.values[:n] = array("d", np.concatenate((values[seeded:], values[:seeded])).tobytes())
+        self.count, self.pos, self.seeded = n, n % self.size, seeded
+        self.sorted = array("d", sorted(values.tolist()))
+        if n:
+            self._moments()
+
+    # Warm start from another window's last `count` values, which this window's own values
+    # displace first
+    def copy_from(self, other, count):
+        recent = other.ordered()[-count:]
+        n = len(recent)
+        self.values[:n] = array("d", recent.tobytes())
+        self.count = self.seeded = n
+        self.pos = n % self.size
+        self.sorted = array("d", sorted(recent.tolist()))
+        if n:
+            self._moments()
+
+    @staticmethod
+    def footprint(size):
+        return 16 * size + WINDOW_OVERHEAD
+
+    def std(self):
+        if self.count == 0 or self.sorted[0] == self.sorted[-1]:
+            return 0.0
+        return math.sqrt(max(self.m2, 0.0) / self.count)
+
+    def percentile(self, p):
+        return _interpolate(self.sorted, self.count, p)
+
+# Linear interpolation between closest ranks, same arithmetic as np.percentile. Works on a
+# sorted list or on the columns of row-sorted arrays
+def _interpolate(s, count, p):
+    index = (count - 1) * (p / 100)
+    lo = int(index)
+    if lo + 1 >= count:
+        return s[..., -1] if isinstance(s, np.ndarray) else s[-1]
+    t = index - lo
+    a, b = (s[..., lo], s[..., lo + 1]) if isinstance(s, np.ndarray) else (s[lo], s[lo + 1])
+    diff = b - a
+    return b - diff * (1 - t) if t >= 0.5 else a + diff * t
+
+class StreamDetector:
+    def __init__(self, window=100, z_threshold=2.5, iqr_threshold=1.5, min_values=3, max_bytes=None,
+                 warm_start=WARM_START):
+        self.window = window
+        self.warm_start = min(warm_start, window)
+        self.z_threshold = z_threshold
+        self.iqr_threshold = iqr_threshold
+        self.min_values = min_values
+        # (metric, *group) -> RollingWindow, least recently updated first
+        self.windows = OrderedDict()
+        self.max_windows = max(max_bytes // RollingWindow.footprint(window), 16) if max_bytes else None
+        self.evicted = 0
+
+    def _window(self, key, parent):
+        w = self.windows.get(key)
+        if w is not None:
+            self.windows.move_to_end(key)
+            return w
+        w = self._add(key)
+        if parent is not None:
+            w.copy_from(parent, self.warm_start)
+        return w
+
+    def _add(self, key):
+        w = self.windows[key] = RollingWindow(self.window)
+        if self.max_windows and len(self.windows) > self.max_windows:
+            self.windows.popitem(last=False)
+            self.evicted += 1
+        return w
+
+    # Windows for (metric,), (metric, group[0]), ... (metric, *group), parents first
+    def _chain(self, metric, group):
+        key = (metric,)
+        chain = [self._window(key, None)]
+        for value in group:
+            key += (value,)
+            chain.append(self._window(key, chain[-1]))
+        return chain
+
+    # The group's window alone, for values whose parents were fed by record_parents()
+    def _leaf(self, metric, group):
+        key = (metric,) + group
+        w = self.windows.get(key)
+        if w is None:
+            return self._chain(metric, group)[-1]
+        self.windows.move_to_end(key)
+        return w
+
+    # Feeds the parent windows of a batch of values from different groups in arrival order,
+    # creating each group's window (warm-started from its parent as of that value) on its first
+    # value; the groups' own windows are then updated with parents=False
+    def record_parents(self, metric, groups, values):
+        for group, value in zip(groups, values):
+            chain = self._chain(metric, group)
+            for parent in chain[:-1]:
+                parent.record(value)
+
+    def _check(self, w, value):
+        if w.count < self.min_values:
+            return False, 0.0
+        std = w.std()
+        if std == 0:
+            return False, 0.0
+        z_score = (value - w.mean) / std
+        q1, q3 = w.percentile(25), w.percentile(75)
+        return (value > q3 + self.iqr_threshold * (q3 - q1)) or abs(z_score) > self.z_threshold, z_score
+
+    # Adds value to the group's window (and its parents) and returns (is_outlier, z_score)
+    def update(self, metric, value, group=(), parents=True):
+        if parents:
+            chain = self._chain(metric, group)
+            for parent in chain[:-1]:
+                parent.record(value)
+            w = chain[-1]
+        else:
+            w = self._leaf(metric, group)
+        w.push(value)
+        return self._check(w, value)
+
+    # Same as calling update() for each value in order; returns (is_outlier, z_score) arrays, and
+    # with quartiles=True also the q1 and q3 each outlier was checked against
+    def update_many(self, metric, values, group=(), parents=True, quartiles=False):
+        values = np.asarray(values, dtype=float)
+        flags = np.zeros(len(values), dtype=bool)
+        z_scores = np.zeros(len(values))
+        q1s, q3s = np.zeros(len(values)), np.zeros(len(values))
+        chain = self._chain(metric, group) if parents else [self._leaf(metric, group)]
+        w = chain[-1]
+        i = 0
+        while i < len(values) and (w.count < w.size or w.seeded or len(values) - i < VECTOR_MIN):
+            for parent in chain[:-1]:
+                parent.record(values[i])
+            w.push(values[i])
+            flags[i], z_scores[i] = self._check(w, values[i])
+            if quartiles and flags[i]:
+                q1s[i], q3s[i] = w.percentile(25), w.percentile(75)
+            i += 1
+        if i == len(values):
+            return (flags, z_scores, q1s, q3s) if quartiles else (flags, z_scores)
+
+        new = values[i:]
+        rows = sliding_window_view(np.concatenate((w.ordered()[1:], new)), w.size)
+        mean = rows.mean(axis=1)
+        std = rows.std(axis=1)
+        # A full sort of short rows is cheaper than np.percentile's partitioning
+        ordered = np.sort(rows, axis=1)
+        q1, q3 = _interpolate(ordered, w.size, 25), _interpolate(ordered, w.size, 75)
+        spread = std != 0
+        z = np.divide(new - mean, std, out=np.zeros(len(new)), where=spread)
+        flags[i:] = spread & ((new > q3 + self.iqr_threshold * (q3 - q1)) | (np.abs(z) > self.z_threshold))
+        z_scores[i:] = z
+        q1s[i:], q3s[i:] = q1, q3
+        for parent in chain[:-1]:
+            parent.record_many(new)
+        w.load(rows[-1])
+        return (flags, z_scores, q1s, q3s) if quartiles else (flags, z_scores)
+
+    def stats(self, metric, group=()):
+        w = self.windows[(metric,) + tuple(group)]
+        return {"mean": w.mean, "std": w.std(), "q1": w.percentile(25), "q3": w.percentile(75)}
+
+    def memory(self):
+        return len(self.windows) * RollingWindow.footprint(self.window)
+
+    # [(key, values oldest first, warm-start values among them)], least recently updated first
+    def snapshot(self):
+        return [(key, w.ordered(), w.seeded) for key, w in self.windows.items()]
+
+    def restore(self, windows):
+        for key, values, seeded in windows:
+            self.windows.pop(key, None)
+            self._add(key).restore(values, seeded)
+
+# Baseline snapshots: every window's values in one flat float array plus per-window counts, the
+# keys and settings as JSON. Written by backfill.py and by log_monitor.py on exit, loaded by
+# log_monitor.py at startup
+def save_baseline(path, windows, window, group_by, **meta):
+    keys = [list(key) for key, _, _ in windows]
+    counts = np.array([len(values) for _, values, _ in windows], dtype=np.int32)
+    seeded = np.array([n for _, _, n in windows], dtype=np.int32)
+    values = np.concatenate([values for _, values, _ in windows]) if windows else np.zeros(0)
+    meta = dict(meta, window=window, group_by=list(group_by), windows=len(keys))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez_compressed(f, keys=np.array(json.dumps(keys)), meta=np.array(json.dumps(meta)),
+                            counts=counts, seeded=seeded, values=values)
+    os.replace(tmp, path)
+
+# Returns (meta, [(key, values, seeded)])
+def load_baseline(path):
+    with np.load(path) as data:
+        keys = json.loads(str(data["keys"]))
+        meta = json.loads(str(data["meta"]))
+        counts, seeded, values = data["counts"], data["seeded"], data["values"]
+    ends = np.cumsum(counts)
+    return meta, [(tuple(key), values[end - n:end], int(s)) for key, n, s, end in zip(keys, counts, seeded, ends)]
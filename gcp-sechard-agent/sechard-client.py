@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+import argparse, sys, time
+from sechard_daemon import run_objective, DaemonError, DAEMON_SOCKET
+
+# Thin client for `sechard-agent-1.2.py --daemon`
+# Same stdin usage as the agent itself (echo "objective" | python3 sechard-client.py), but the
+# objective runs in the warm daemon and its output is streamed back. Exits 1 when the session
+# fails (e.g. a guardrail or Model Armor block) and 2 when no daemon is listening.
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", default=DAEMON_SOCKET, help="daemon socket path (SECHARD_DAEMON_SOCKET)")
+    parser.add_argument("--timing", action="store_true", help="print session setup and total time")
+    args = parser.parse_args()
+
+    print("Enter your security automation objective:")
+    user_input = sys.stdin.readline().strip()
+
+    start = time.perf_counter()
+    try:
+        final = run_objective(user_input, args.socket)
+    except DaemonError as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+    if final["event"] == "error":
+        print(f"Session failed: {final['error']}", file=sys.stderr)
+        sys.exit(1)
+    if args.timing:
+        print(f"Session ready in {final.get('setup_ms')}ms, finished in {final['elapsed_s']}s "
+              f"({time.perf_counter() - start:.3f}s at the client)")
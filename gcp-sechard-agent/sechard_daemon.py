@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+import json, os, socket, socketserver, sys, threading, time
+
+# Shared agent modules live at the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from unix_socket import SocketInUse, bind_unix_server
+
+# Warm-start daemon for the sechard agents
+# `sechard-agent-1.2.py --daemon` imports the SDKs, authenticates and builds the Gemini and
+# Model Armor clients once, then serves objectives over a Unix domain socket. Each connection
+# is one isolated session (its own chat, history and counter) run on its own thread, at most
+# SECHARD_DAEMON_WORKERS at a time; further objectives wait in line.
+#
+# Protocol: the client sends one JSON line {"objective": "..."}; the daemon answers with JSON
+# lines {"event": "queued"}, {"event": "output", "text": "..."} (raw console text, streamed as
+# it is produced), then {"event": "done", ...} or {"event": "error", "error": "..."}.
+# The socket is created owner-only (0600) since whoever can connect can run CLI commands.
+
+DAEMON_SOCKET = os.path.expanduser(os.environ.get("SECHARD_DAEMON_SOCKET", "~/.cache/sechard-agent/daemon.sock"))
+DAEMON_WORKERS = int(os.environ.get("SECHARD_DAEMON_WORKERS", "4"))
+
+class DaemonError(Exception):
+    pass
+
+def send_event(wfile, event, **fields):
+    fields["event"] = event
+    wfile.write((json.dumps(fields) + "\n").encode())
+    wfile.flush()
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.sessions += 1
+            threading.current_thread().name = f"session-{server.sessions}"
+        try:
+            request = json.loads(self.rfile.readline())
+            objective = request["objective"].strip()
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            send_event(self.wfile, "error", error=f"bad request: {e}")
+            return
+
+        if not server.slots.acquire(blocking=False):
+            send_event(self.wfile, "queued")
+            server.slots.acquire()
+        start = time.perf_counter()
+        try:
+            write = lambda text: send_event(self.wfile, "output", text=text)
+            stats = server.run_session(objective, write) or {}
+            send_event(self.wfile, "done", elapsed_s=round(time.perf_counter() - start, 3), **stats)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away; the session stops at its next write
+            print(f"{threading.current_thread().name}: client disconnected")
+        except Exception as e:
+            print(f"{threading.current_thread().name}: {e.__class__.__name__}: {e}")
+            try:
+                send_event(self.wfile, "error", error=str(e))
+            except OSError:
+                pass
+        finally:
+            server.slots.release()
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+# run_session(objective, write) runs one objective, passing console text to write(); it may
+# return a dict of extra fields for the "done" event
+def serve(run_session, path=DAEMON_SOCKET, workers=DAEMON_WORKERS):
+    # Owner-only socket, a stale one from a daemon that did not shut down cleanly is replaced
+    try:
+        server = bind_unix_server(_Server, _Handler, path, "a daemon")
+    except SocketInUse as e:
+        raise DaemonError(str(e)) from None
+    server.run_session = run_session
+    server.slots = threading.BoundedSemaphore(workers)
+    server.lock = threading.Lock()
+    server.sessions = 0
+    print(f"Sechard daemon listening on {path} ({workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down.")
+    finally:
+        server.server_close()
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+# Yields the daemon's events for one objective
+def request(objective, path=DAEMON_SOCKET):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError as e:
+        sock.close()
+        raise DaemonError(f"no sechard daemon on {path} ({e.strerror}); start one with "
+                          f"`python3 sechard-agent-1.2.py --daemon`") from None
+    with sock, sock.makefile("rb") as rfile:
+        sock.sendall((json.dumps({"objective": objective}) + "\n").encode())
+        for line in rfile:
+            yield json.loads(line)
+
+# Runs one objective through the daemon, echoing its output; returns the final event
+def run_objective(objective, path=DAEMON_SOCKET, out=sys.stdout):
+    final = {"event": "error", "error": "daemon closed the connection"}
+    for event in request(objective, path):
+        if event["event"] == "output":
+            out.write(event["text"])
+            out.flush()
+        elif event["event"] == "queued":
+            print("All daemon workers are busy, waiting for a free one...", file=sys.stderr)
+        else:
+            final = event
+    return final
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+import hashlib, os
+import fastapi_poe as fp
+
+#Token budgeted conversation history for the poe agent
+#instead of resending prompt.md + user input + the whole tool output history as one user
+#message every turn, the session is kept as a real system/user/bot conversation. oversized
+#tool outputs are cut down to head/tail with byte counts, repeated outputs are collapsed to a
+#reference, and older turns are squeezed further whenever the total goes over the budget.
+#NO EXPRESSED WARRANTY. Licensed under MIT
+
+POE_TOKEN_BUDGET = int(os.environ.get("POE_TOKEN_BUDGET", "24000"))
+POE_TOOL_OUTPUT_TOKENS = int(os.environ.get("POE_TOOL_OUTPUT_TOKENS", "2000"))
+KEEP_RECENT_TURNS = 2
+
+#cheap estimate, ~4 characters per token for english text and shell output
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+def head_tail(text, max_chars):
+    if len(text) <= max_chars:
+        return text
+    head = text[:max_chars * 2 // 3]
+    tail = text[-(max_chars // 3):]
+    omitted = text[len(head):len(text) - len(tail)]
+    return (head + f"\n... [{len(omitted.encode())} bytes / {omitted.count(chr(10))} lines omitted "
+            f"of {len(text.encode())} bytes total] ...\n" + tail)
+
+class ConversationHistory:
+    def __init__(self, system_prompt, user_input, token_budget=POE_TOKEN_BUDGET,
+                 max_tool_tokens=POE_TOOL_OUTPUT_TOKENS):
+        self.system_prompt = system_prompt
+        self.user_input = user_input
+        self.token_budget = token_budget
+        self.max_tool_tokens = max_tool_tokens
+        self.turns = []
+        self.digests = {}
+        self.sent = []   #(iteration, tokens, bytes) per request
+
+    def add_bot(self, text):
+        self.turns.append({"role": "bot", "content": text, "kind": "llm", "raw_bytes": len(text.encode())})
+
+    def add_tool_output(self, output, iteration):
+        raw_bytes = len(output.encode())
+        digest = hashlib.sha1(output.encode()).hexdigest()
+        if digest in self.digests and raw_bytes > 64:
+            content = f"[output identical to iteration {self.digests[digest]}, {raw_bytes} bytes]"
+        else:
+            self.digests.setdefault(digest, iteration)
+            content = head_tail(output, self.max_tool_tokens * 4)
+        self.turns.append({"role": "user", "kind": "tool", "iteration": iteration, "output": content,
+                           "content": self._tool_message(content, iteration), "raw_bytes": raw_bytes})
+
+    def _tool_message(self, output, iteration):
+        return "## Tool Result Output\n" + output + "\n## Iteration Counter\n" + str(iteration)
+
+    def raw_tool_bytes(self):
+        return sum(t["raw_bytes"] for t in self.turns if t["kind"] == "tool")
+
+    def _total_tokens(self, extra):
+        return (estimate_tokens(self.system_prompt) + estimate_tokens(self.user_input)
+                + sum(estimate_tokens(t["content"]) for t in self.turns) + estimate_tokens(extra))
+
+    #shrink the oldest turns first, the most recent ones are left as they are
+    def _compact(self, extra):
+        older = self.turns[:-KEEP_RECENT_TURNS] if len(self.turns) > KEEP_RECENT_TURNS else []
+        for limit in (self.max_tool_tokens, self.max_tool_tokens // 4, 0):
+            for turn in older:
+                if self._total_tokens(extra) <= self.token_budget:
+                    return
+                if turn["kind"] == "tool":
+                    if limit:
+                        output = head_tail(turn["output"], limit)
+                    else:
+                        output = f"[iteration {turn['iteration']} output elided, {turn['raw_bytes']} bytes]"
+                    turn["output"] = output
+                    turn["content"] = self._tool_message(output, turn["iteration"])
+                elif limit == 0:
+                    turn["content"] = head_tail(turn["content"], 200)
+
+    #full conversation for the next request, `extra` is appended to the last user turn
+    def messages(self, iteration, extra=""):
+        self._compact(extra)
+        messages = [fp.ProtocolMessage(role="system", content=self.system_prompt),
+                    fp.ProtocolMessage(role="user", content="## User Input\n" + self.user_input)]
+        for turn in self.turns:
+            messages.append(fp.ProtocolMessage(role=turn["role"], content=turn["content"]))
+        if extra:
+            if messages[-1].role == "user":
+                messages[-1] = fp.ProtocolMessage(role="user", content=messages[-1].content + "\n" + extra)
+            else:
+                messages.append(fp.ProtocolMessage(role="user", content=extra))
+        sent_bytes = sum(len(m.content.encode()) for m in messages)
+        tokens = sum(estimate_tokens(m.content) for m in messages)
+        self.sent.append((iteration, tokens, sent_bytes))
+        return messages
+
+    def report(self):
+        return ", ".join(f"iteration {i}: ~{t} tokens ({b} bytes)" for i, t, b in self.sent)
+
+    def transcript(self):
+        return "\n".join(t["content"] for t in self.turns)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+import asyncio, gzip, hashlib, json, os, time
+
+#Record/replay layer for LLM calls
+#LLM_REPLAY_MODE=record  stores every streamed reply (chunks + inter-chunk timing) keyed by a
+#                        hash of backend, model, temperature and the request messages
+#LLM_REPLAY_MODE=replay  serves identical requests from the store, a miss is an error
+#LLM_REPLAY_MODE=off     (default) straight to the live backend
+#LLM_REPLAY_TIMING=real replays the recorded chunk timing, zero returns everything at once.
+#used by poe_session.py for Poe and wrap_chat() for the Vertex chat in the sechard agents
+#NO EXPRESSED WARRANTY. Licensed under MIT
+
+LLM_REPLAY_MODE = os.environ.get("LLM_REPLAY_MODE", "off")
+LLM_REPLAY_TIMING = os.environ.get("LLM_REPLAY_TIMING", "zero")
+LLM_REPLAY_PATH = os.environ.get("LLM_REPLAY_PATH", ".llm_replay")
+
+class ReplayMiss(Exception):
+    pass
+
+class ReplayStore:
+    def __init__(self, path=LLM_REPLAY_PATH, mode=LLM_REPLAY_MODE, timing=LLM_REPLAY_TIMING):
+        if mode not in ("off", "record", "replay"):
+            raise ValueError(f"LLM_REPLAY_MODE must be off, record or replay, not {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.timing = timing
+        self.stats = {"recorded": 0, "replayed": 0}
+        if mode != "off":
+            os.makedirs(path, exist_ok=True)
+
+    def key(self, backend, model, temperature, messages, chain=""):
+        request = json.dumps([backend, model, temperature, chain, messages], separators=(",", ":"))
+        return hashlib.sha256(request.encode()).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key + ".json.gz")
+
+    def load(self, key):
+        try:
+            with gzip.open(self._file(key), "rt") as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            raise ReplayMiss(f"no recording for request {key[:12]} in {self.path}") from None
+        self.stats["replayed"] += 1
+        return record
+
+    #chunks are [seconds since the previous chunk, text]
+    def save(self, key, backend, model, temperature, chunks):
+        record = {"backend": backend, "model": model, "temperature": temperature,
+                  "chunks": [[round(delay, 4), text] for delay, text in chunks]}
+        tmp = self._file(key) + ".tmp"
+        with gzip.open(tmp, "wt") as f:
+            json.dump(record, f, separators=(",", ":"))
+        os.replace(tmp, self._file(key))
+        self.stats["recorded"] += 1
+
+    async def replay(self, record):
+        for delay, text in record["chunks"]:
+            if self.timing == "real" and delay:
+                await asyncio.sleep(delay)
+            yield text
+
+    def replay_sync(self, record):
+        if self.timing == "real":
+            time.sleep(sum(delay for delay, _ in record["chunks"]))
+        return "".join(text for _, text in record["chunks"])
+
+    def report(self):
+        return (f"LLM replay ({self.mode}, {self.timing} timing): {self.stats['recorded']} recorded, "
+                f"{self.stats['replayed']} replayed")
+
+class ChunkRecorder:
+    def __init__(self):
+        self.chunks = []
+        self.last = time.perf_counter()
+
+    def add(self, text):
+        now = time.perf_counter()
+        self.chunks.append((now - self.last, text))
+        self.last = now
+
+class ReplayResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+#drop-in wrapper for a Vertex ChatSession. the chat is stateful, so each request key also
+#chains the keys of every earlier request in the same chat, starting from the system prompt
+class ReplayChat:
+    def __init__(self, chat, model_name, store, context=""):
+        self.chat = chat
+        self.model_name = model_name
+        self.store = store
+        self.chain = store.key("vertex", model_name, None, context) if context else ""
+
+    def send_message(self, content, stream=False, **kwargs):
+        config = str(kwargs["generation_config"]) if "generation_config" in kwargs else None
+        key = self.store.key("vertex", self.model_name, config, str(content), self.chain)
+        self.chain = key
+        if self.store.mode == "replay":
+            record = self.store.load(key)
+            if stream:
+                return self._replay_stream(record)
+            return ReplayResponse(self.store.replay_sync(record))
+        chunks = self._record(key, config, self.chat.send_message(content, stream=True, **kwargs))
+        if stream:
+            return chunks
+        return ReplayResponse("".join(chunk.text for chunk in chunks))
+
+    #passes the live chunks through, saving them once the reply is complete
+    def _record(self, key, config, chunks):
+        recorder = ChunkRecorder()
+        for chunk in chunks:
+            recorder.add(chunk.text)
+            yield chunk
+        self.store.save(key, "vertex", self.model_name, config, recorder.chunks)
+
+    def _replay_stream(self, record):
+        for delay, text in record["chunks"]:
+            if self.store.timing == "real" and delay:
+                time.sleep(delay)
+            yield ReplayResponse(text)
+
+    def __getattr__(self, name):
+        return getattr(self.chat, name)
+
+_shared_store = None
+
+def shared_store():
+    global _shared_store
+    if _shared_store is None:
+        _shared_store = ReplayStore()
+    return _shared_store
+
+def wrap_chat(chat, model_name, context=""):
+    store = shared_store()
+    return chat if store.mode == "off" else ReplayChat(chat, model_name, store, context)
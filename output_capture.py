@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+import itertools, os, re, time
+
+#Bounded capture of cli tool output, used by async_exec.py
+#output is fed in as raw chunks: the first CLI_OUTPUT_HEAD bytes and the last CLI_OUTPUT_TAIL
+#bytes are kept in memory, everything else only counted. once the output no longer fits, the
+#full output is spilled to a file in the session's SpillDir under CLI_OUTPUT_DIR and the prompt
+#gets the head, the tail, byte/line counts and a handle for the file (cli_output/0001.log), so
+#the model can grep it with a follow-up cli call; run_command() swaps the session's handles for
+#its file paths. each session (a daemon or batch session, or the whole process for the single
+#session agents) has its own directory and numbering, so the handles are the same every run
+#whatever else runs alongside, recorded LLM exchanges (llm_replay.py) still match, and one
+#session cannot read another's output through them. the real path is only in report().
+#memory stays at head + tail + one read chunk whatever the command prints.
+#NO EXPRESSED WARRANTY. Licensed under MIT
+
+CLI_OUTPUT_HEAD = int(os.environ.get("CLI_OUTPUT_HEAD", "4096"))
+CLI_OUTPUT_TAIL = int(os.environ.get("CLI_OUTPUT_TAIL", "2048"))
+CLI_OUTPUT_DIR = os.environ.get("CLI_OUTPUT_DIR", ".cli_output")
+
+_HANDLE = re.compile(r"(?<![\w./-])cli_output/(\d{4,})\.log\b")
+_session_ids = itertools.count(1)
+
+#one session's spill files and handle numbering, the directory is created on the first spill
+class SpillDir:
+    def __init__(self, root=CLI_OUTPUT_DIR):
+        self.root = root
+        self.path = None
+        self.ids = itertools.count(1)
+
+    #(handle, absolute path) for the next spill file
+    def next_file(self):
+        if self.path is None:
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_session_ids)}"
+            self.path = os.path.abspath(os.path.join(self.root, name))
+            os.makedirs(self.path, mode=0o700, exist_ok=True)
+        name = f"{next(self.ids):04d}.log"
+        return f"cli_output/{name}", os.path.join(self.path, name)
+
+    #cli_output/0001.log -> this session's spill file, left alone when there is none
+    def resolve(self, command):
+        if self.path is None or "cli_output/" not in command:
+            return command
+        def path(match):
+            spilled = os.path.join(self.path, f"{match.group(1)}.log")
+            return spilled if os.path.exists(spilled) else match.group()
+        return _HANDLE.sub(path, command)
+
+#for the single session agents, which never pass their own
+process_spill_dir = SpillDir()
+
+class OutputCapture:
+    def __init__(self, command, head=CLI_OUTPUT_HEAD, tail=CLI_OUTPUT_TAIL, spill=True, spill_dir=None):
+        self.command = command
+        self.head_limit = head
+        self.tail_limit = tail
+        self.spill = spill
+        self.spill_dir = spill_dir or process_spill_dir
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.bytes = 0
+        self.lines = 0
+        self.dropped = 0    #bytes that fell out between head and tail
+        self.path = None
+        self.handle = None
+        self._file = None
+
+    @property
+    def truncated(self):
+        return self.dropped > 0
+
+    def write(self, data):
+        self.bytes += len(data)
+        self.lines += data.count(b"\n")
+        if self._file is not None:
+            self._file.write(data)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if not data:
+            return
+        self.tail += data
+        excess = len(self.tail) - self.tail_limit
+        if excess > 0:
+            if self._file is None and self.spill:
+                self._open_spill()
+            del self.tail[:excess]
+            self.dropped += excess
+
+    #the first overflow: everything seen so far is still in head + tail
+    def _open_spill(self):
+        self.handle, self.path = self.spill_dir.next_file()
+        self._file = open(self.path, "wb")
+        self._file.write(self.head)
+        self._file.write(self.tail)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def text(self):
+        if not self.truncated:
+            return (self.head + self.tail).decode("utf-8", errors="replace")
+        #cut on line boundaries so neither side starts or ends mid line (or mid character)
+        head = bytes(self.head)
+        cut = head.rfind(b"\n")
+        if cut >= len(head) // 2:
+            head = head[:cut + 1]
+        tail = bytes(self.tail)
+        cut = tail.find(b"\n")
+        if 0 <= cut < len(tail) // 2:
+            tail = tail[cut + 1:]
+        omitted = self.bytes - len(head) - len(tail)
+        omitted_lines = self.lines - head.count(b"\n") - tail.count(b"\n")
+        where = f", full output in {self.handle}" if self.handle else ""
+        return (head.decode("utf-8", errors="replace") +
+                f"\n... [{omitted} bytes / {omitted_lines} lines omitted of {self.bytes} bytes, "
+                f"{self.lines} lines total{where}] ...\n" + tail.decode("utf-8", errors="replace"))
+
+    def report(self):
+        spilled = f", spilled to {self.path}" if self.path else ""
+        return f"{self.bytes} bytes, {self.lines} lines{', truncated' if self.truncated else ''}{spilled}"
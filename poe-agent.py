@@ -1,7 +1,13 @@
 #!/usr/bin/env python3
-import fastapi_poe as fp
-import asyncio, os, subprocess, ast, time, logging, sys, random
-from serpapi import GoogleSearch
+import asyncio, os, time, logging, sys, json, argparse
+from async_exec import run_command
+from output_capture import SpillDir
+from history import ConversationHistory
+from tool_cache import ToolCache, cacheable
+from search_tool import SearchTool
+from command_policy import load_policy
+from tool_calls import ToolRegistry, ToolCallError, RETRY_HINT
+from poe_session import shared_session, close_shared_sessions, POE_MAX_CONNECTIONS
 
 #Author: Dennis Chow 2025-Jan-21 dchow[AT]xtecsystems.com
 #NO EXPRESSED WARRANTY. Licensed under MIT 
@@ -29,65 +35,231 @@ async def get_responses(api_key, messages, bot_name="Claude-3.5-Sonnet"):
 
   return response
 '''
+#live calls go through the shared pooled session (see poe_session.py)
 async def get_responses(api_key, messages, bot_name="Claude-3.5-Sonnet"):
-    response = ""
-    print(f"Using bot: {bot_name}")
-    #try expotential back off
-    max_retries = 3
-    base_delay = 3
-
-    for attempt in range(max_retries):
-        try:
-            async for partial in fp.get_bot_response(messages=messages,
-                                                   bot_name=bot_name,
-                                                   api_key=poe_api_key,
-                                                   temperature=0.15):
-                if isinstance(partial, fp.PartialResponse) and partial.text:
-                    response += partial.text
-            return response
-        except Exception as e:
-            if attempt == max_retries - 1:  #final attempt
-                raise e
-            wait_time = base_delay * (2 ** attempt)
-            print(f"Attempt {attempt + 1} failed, retrying in {wait_time} seconds...")
-            await asyncio.sleep(wait_time)
-    return response
-
+    return await shared_session(api_key, bot_name).get_responses(messages)
   
 #prepend markdown prompt
 prompt_file = open('prompt.md', 'r').read()
 
+#results of read-only commands and searches, shared by every session in the process
+tool_cache = ToolCache()
+
 #tools for LLM to use
-def serpapi(query):
-  params = {
-  query: "Coffee",
-  "location": "Weston, FL, United States",
-  "hl": "en",
-  "gl": "us",
-  "google_domain": "google.com",
-  "api_key": serp_api_key
-    }
-  search = GoogleSearch(params)
-  results = search.get_dict()
-  print(result)
-  return str(results)
+#real query over a pooled connection, compact top N projection, cached and deduplicated
+search_tool = SearchTool(serp_api_key, cache=tool_cache)
 
-def cli(command):
-  #need pipe subprocess to standard out to get the output to return
-  result = subprocess.run(command, shell=True, stdout=subprocess.PIPE)
+async def serpapi(query):
+  result = await search_tool.search(query)
   print(result)
-  return str(result)
+  return result
+
+async def cli(command, spill_dir=None):
+  #read-only enumeration commands are served from the tool cache when fresh
+  cached = tool_cache.get("cli", command)
+  if cached is not None:
+    print("[tool cache hit] " + command)
+    return cached
+  generation = tool_cache.generation("cli")
+  #output streams to the console live, the command group is killed on timeout or cancellation
+  result = await run_command(command, spill_dir=spill_dir)
+  print(f"[exit code {result.returncode}, {result.elapsed:.2f}s, {result.capture.report()}{', timed out' if result.timed_out else ''}]")
+  output = f"CompletedProcess(args={command!r}, returncode={result.returncode}, stdout={result.text()!r})"
+  if not cacheable("cli", command):
+    #anything off the read-only allowlist may have changed what the cached commands return
+    tool_cache.invalidate("cli")
+  elif result.returncode == 0 and not result.timed_out and result.capture.path is None:
+    #spilled output names a cli_output/ handle of this session only, it is not cached
+    tool_cache.put("cli", command, output, since=generation)
+  return output
+
+prohibited_commands = ['sudo', 'runas', 'del', 'rm', 'chmod', 'icacls']
+#COMMAND_POLICY=<rules file> replaces the list, see command_policy.py
+command_policy = load_policy(prohibited_commands)
+
+#tool replies are parsed and dispatched through one table, {"cli": ...} or {"tool": "cli", "command": ...}
+#one table per session, so its cli calls spill large output to the session's own SpillDir
+def session_tools(spill_dir):
+  tools = ToolRegistry()
+  tools.register("cli", lambda command: cli(command, spill_dir), argument="command")
+  tools.register("serpapi", serpapi, argument="query")
+  return tools
+
+def check_guardrail(call):
+  #every program the command would run is checked, not substrings of the command line
+  if call.name == "cli":
+     decision = command_policy.check(call.argument)
+     if not decision.allowed:
+        raise Exception(f"**SAFETY GUARDRAIL TRIGGERED**: AI agent tried to run a blocked command: {decision.invocation} ({decision.rule or 'default ' + command_policy.default})")
+
+#log is the logging module in single mode or a per session logger in batch mode
+async def run_session(poe, user_input, log=logging):
+  #state variables
+  counter = 1
+  tools = session_tools(SpillDir())
+
+  #run the tool, returns the tool output to append to the history
+  async def run_tool(call):
+      return await tools.dispatch(call)
+
+  #read-only tool calls spotted mid stream start right away as a task, the main loop
+  #picks up the result once the full response has been parsed. anything else waits for
+  #the full response, since the final parse may fail or turn out to be a different call
+  early_tool = {}
+  def start_tool_early(tool_call):
+      try:
+          call = tools.match(tool_call).validate(tool_call)
+          check_guardrail(call)
+      except Exception:
+          return #leave it to the main loop to raise once the response is complete
+      if not cacheable(call.name, str(call.argument)):
+          return
+      print("Tool call detected mid stream, starting: " + str(tool_call))
+      early_tool["call"] = call
+      early_tool["task"] = asyncio.ensure_future(run_tool(call))
+
+  def cancel_early_tool():
+      task = early_tool.pop("task", None)
+      early_tool.pop("call", None)
+      if task is not None:
+          task.cancel() #kills the command's process group, see async_exec.py
+
+  async def tool_result(call):
+      early = early_tool.get("call")
+      if early is not None and (early.name, early.argument) == (call.name, call.argument):
+          early_tool.pop("call")
+          return await early_tool.pop("task")
+      cancel_early_tool()
+      check_guardrail(call)
+      return await run_tool(call)
+
+  #a reply that is not a usable tool call goes back to the model instead of ending the session
+  async def tool_output(llm_response):
+      try:
+          call = tools.parse(llm_response)
+      except ToolCallError as e:
+          cancel_early_tool()
+          print(f"Unusable tool call ({e}), asking the model again")
+          return f"TOOL CALL ERROR: {e}. {RETRY_HINT}"
+      return await tool_result(call)
+
+  #per request timings: time spent waiting on the LLM, on the tool and the prompt size sent
+  timings = []
+  async def timed_llm(iteration, messages, tool_wait=0.0, **kwargs):
+      start = time.perf_counter()
+      response = await poe.get_responses(messages, **kwargs)
+      timings.append({"iteration": iteration, "llm_s": round(time.perf_counter() - start, 4),
+                      "tool_wait_s": round(tool_wait, 4), "prompt_bytes": history.sent[-1][2]})
+      return response
+
+  #system prompt + user input, then one bot/user turn pair per iteration under a token budget
+  history = ConversationHistory(prompt_file, user_input)
+  #prompt expected output {'tool' : 'command/query'}
+  llm_response = await timed_llm(0, history.messages(0), on_tool_call=start_tool_early)
+  print("LLM **INITIAL** response output \n" +llm_response)
+  log.info(llm_response)
+  history.add_bot(llm_response)
+  #multi shot iteration and "agentic execution"
+  while counter < 5:
+      tool_start = time.perf_counter()
+      history.add_tool_output(await tool_output(llm_response), counter)
+      tool_wait = time.perf_counter() - tool_start
+      #re-initiate the pull with the compacted conversation
+      messages = history.messages(counter)
+      print(f"Prompt for iteration {counter}: ~{history.sent[-1][1]} tokens ({history.sent[-1][2]} bytes)")
+      #only hand out early tool starts when another iteration will consume them
+      llm_response = await timed_llm(counter, messages, tool_wait, on_tool_call=start_tool_early if counter + 1 < 5 else None)
+      print("LLM **NEXT** response output \n" +llm_response)
+      print("Running iteration.." + str(counter))
+      log.info(llm_response)
+      history.add_bot(llm_response)
+      counter +=1 # need to increment to keep state updated
+
+  #last thought known at the end of our shots
+  final_input = '## FINAL user input' + '\n' + "We have exhausted all attempts. What recommended next steps should we action?"
+  llm_response = await timed_llm(counter, history.messages(counter, extra=final_input))
+  print("LLM **FINAL** response output \n" + llm_response)
+  print("Tokens sent per request: " + history.report())
+  log.info(llm_response)
+  log.info(history.transcript())
+  log.info("Tokens sent per request: " + history.report())
+  return {"final": llm_response, "iterations": counter - 1, "tool_output_bytes": history.raw_tool_bytes(),
+          "tokens_sent": [tokens for _, tokens, _ in history.sent], "timings": timings}
+
+#whole run stays on one event loop so the pooled client and its warm connections
+#are reused by every initial, per-iteration and final call
+async def main(user_input):
+  poe = shared_session(poe_api_key)
+  try:
+    await run_session(poe, user_input)
+  finally:
+    print(poe.report())
+    print(tool_cache.report())
+    print(search_tool.report())
+    logging.info(poe.report())
+    logging.info(tool_cache.report())
+    logging.info(search_tool.report())
+    await search_tool.close()
+    await close_shared_sessions()
+
+#every stdin line is its own session with its own history, counter and logfile.<n>
+#sessions share one pooled poe client and at most `concurrency` run at once
+async def run_batch(objectives, concurrency, out):
+  poe = shared_session(poe_api_key, max_connections=max(concurrency, POE_MAX_CONNECTIONS))
+  limit = asyncio.Semaphore(concurrency)
+
+  async def one(index, objective):
+    log = logging.getLogger(f"poe-agent.session.{index}")
+    log.propagate = False
+    handler = logging.FileHandler(f"logfile.{index}", mode="w")
+    handler.setFormatter(logging.Formatter("%(asctime)-15s %(levelname)-8s %(message)s"))
+    log.addHandler(handler)
+    log.setLevel(logging.DEBUG)
+    record = {"index": index, "input": objective, "final": None, "iterations": 0, "error": None}
+    async with limit:
+      start = time.perf_counter()
+      try:
+        record.update(await run_session(poe, objective, log=log))
+      except Exception as e:
+        log.exception("session failed")
+        record["error"] = f"{type(e).__name__}: {e}"
+      record["elapsed"] = round(time.perf_counter() - start, 3)
+    log.removeHandler(handler)
+    handler.close()
+    return record
+
+  tasks = [asyncio.ensure_future(one(i, o)) for i, o in enumerate(objectives)]
+  start = time.perf_counter()
+  try:
+    #write results in input order as soon as each one (and all before it) finishes
+    for task in tasks:
+      out.write(json.dumps(await task) + "\n")
+      out.flush()
+  finally:
+    elapsed = time.perf_counter() - start
+    summary = f"Batch: {len(tasks)} sessions in {elapsed:.1f}s ({len(tasks) / max(elapsed, 1e-9):.2f} sessions/s, concurrency {concurrency})"
+    print(summary)
+    print(poe.report())
+    print(tool_cache.report())
+    print(search_tool.report())
+    logging.info(summary)
+    logging.info(poe.report())
+    logging.info(tool_cache.report())
+    logging.info(search_tool.report())
+    await search_tool.close()
+    await close_shared_sessions()
 
 #main driver
 if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--batch", action="store_true", help="run every stdin line as its own session, results as JSONL on stdout")
+  parser.add_argument("--concurrency", type=int, default=int(os.environ.get("POE_CONCURRENCY", "4")), help="max sessions running at once in batch mode")
+  args = parser.parse_args()
+
   if os.path.exists("logfile"):
      os.remove("logfile")
   else:
-     print("no existing log file found, continuing...")
-  #state variables
-  counter = 1
-  tool_output_history = ""
-  prohibited_commands = ['sudo', 'runas', 'del', 'rm', 'chmod', 'icacls']
+     print("no existing log file found, continuing...", file=sys.stderr if args.batch else sys.stdout)
   line = ""
 
   logging.basicConfig(level=logging.DEBUG, filename="logfile", filemode="a+",
@@ -97,50 +269,16 @@ if __name__ == "__main__":
   #user sample input usage 
   #user_input = 'Please determine the OS of the local host we are running and then enumerate what existing hardening settings are enabled.'
 
+  if args.batch:
+     objectives = [line.strip() for line in sys.stdin if line.strip()]
+     #keep stdout clean for the JSONL results, session chatter goes to stderr
+     out, sys.stdout = sys.stdout, sys.stderr
+     asyncio.run(run_batch(objectives, max(args.concurrency, 1), out))
+     exit()
+
   #read from standard in for easier automation integration
   for line in sys.stdin:
      user_input = str(line)
 
-#construct initial prompt
-prompt_text = prompt_file + '\n ## User Input \n' + user_input
-message = fp.ProtocolMessage(role="user", content=(prompt_text))
-#prompt expected output {'tool' : 'command/query'}
-llm_response = asyncio.run(get_responses(poe_api_key, [message]))
-print("LLM **INITIAL** response output \n" +llm_response)
-logging.info(llm_response)
-#multi shot iteration and "agentic execution"
-while counter < 5:
-    #convert response into dictionary
-    parsed_dict = ast.literal_eval(llm_response)
-      #extract commands and run tools
-    if 'cli' in parsed_dict:
-            #quick and dirty  nested for loop, sorry
-            if any(cmd in parsed_dict['cli'] for cmd in prohibited_commands):
-               raise Exception("**SAFETY GUARDRAIL TRIGGERED**: AI agent tried to run with elevated privileges")
-            else:
-                result = cli(str(parsed_dict['cli']))
-                tool_output_history +=result
-    elif 'serpapi' in parsed_dict:
-        result = serpapi(str(parsed_dict['serpapi']))
-        tool_output_history +=result
-    #replace the old prompt with the appended stuff
-    appended_prompt_text = prompt_text + '\n' + '## Tool Result Output History' + '\n' + tool_output_history + '\n' + '## Iteration Counter' + '\n' + str(counter)
-    time.sleep(random.randint(3,6)) #re-added to delay between iterations
-    #re-initiate the pull using appended message
-    message = fp.ProtocolMessage(role="user", content=(appended_prompt_text))
-    llm_response = asyncio.run(get_responses(poe_api_key, [message]))
-    print("LLM **NEXT** response output \n" +llm_response)
-    print("Running iteration.." + str(counter))
-    logging.info(llm_response)
-    counter +=1 # need to increment to keep state updated
-
-#last thought known at the end of our shots
-appended_prompt_text += '\n' + '## FINAL user input' + '\n' + "We have exhausted all attempts. What recommended next steps should we action?"
-message = fp.ProtocolMessage(role="user", content=(appended_prompt_text))
-llm_response = asyncio.run(get_responses(poe_api_key, [message]))
-print("LLM **FINAL** response output \n" + llm_response)
-logging.info(llm_response)
-logging.info(appended_prompt_text)
-exit()
-
-                               
\ No newline at end of file
+  asyncio.run(main(user_input))
+  exit()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+import asyncio, os, time
+import httpx
+import fastapi_poe as fp
+from fastapi_poe.client import PROTOCOL_VERSION
+from tool_stream import ToolCallDetector
+from rate_limit import shared_limiter
+from llm_replay import ChunkRecorder, shared_store
+
+#Shared Poe session: one event loop, one pooled keep-alive httpx client for every LLM call
+#fastapi_poe opens (and tears down) its own client per call unless we pass session=
+#NO EXPRESSED WARRANTY. Licensed under MIT
+
+POE_BASE_URL = os.environ.get("POE_BASE_URL", "https://api.poe.com/bot/")
+POE_MAX_CONNECTIONS = int(os.environ.get("POE_MAX_CONNECTIONS", "10"))
+POE_KEEPALIVE_EXPIRY = float(os.environ.get("POE_KEEPALIVE_EXPIRY", "120"))
+
+#fastapi_poe leaves the SSE context as soon as it sees the "done" event, before the
+#chunked body terminator is read, and httpcore drops any connection closed mid-body.
+#draining the few trailing bytes on close lets the connection go back to the pool
+class _DrainOnClose(httpx.AsyncByteStream):
+    def __init__(self, stream, drain_timeout):
+        self._stream = stream
+        self._iter = None
+        self._drain_timeout = drain_timeout
+
+    async def __aiter__(self):
+        self._iter = self._stream.__aiter__()
+        async for chunk in self._iter:
+            yield chunk
+
+    async def _drain(self):
+        async for _ in self._iter:
+            pass
+
+    async def aclose(self):
+        if self._iter is not None:
+            try:
+                await asyncio.wait_for(self._drain(), self._drain_timeout)
+            except Exception:
+                pass #connection is not reusable, closing below drops it
+            self._iter = None
+        await self._stream.aclose()
+
+class _KeepAliveTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, drain_timeout=0.5, **kwargs):
+        super().__init__(**kwargs)
+        self._drain_timeout = drain_timeout
+
+    async def handle_async_request(self, request):
+        response = await super().handle_async_request(request)
+        response.stream = _DrainOnClose(response.stream, self._drain_timeout)
+        return response
+
+class PoeSession:
+    def __init__(self, api_key, bot_name="Claude-3.5-Sonnet", temperature=0.15,
+                 base_url=POE_BASE_URL, max_connections=POE_MAX_CONNECTIONS, limiter=None, replay=None):
+        self.api_key = api_key
+        self.bot_name = bot_name
+        self.temperature = temperature
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.client = None
+        #one limiter for every session in the process unless the caller brings its own
+        self.limiter = limiter or shared_limiter()
+        self.replay = replay or shared_store()
+        self.stats = {
+            "calls": 0,
+            "call_time": 0.0,
+            "connections": 0,
+            "connect_time": 0.0,
+            "tls_handshakes": 0,
+            "tls_time": 0.0,
+        }
+
+    async def __aenter__(self):
+        self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def open(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                timeout=httpx.Timeout(600, connect=15),
+                transport=_KeepAliveTransport(
+                    limits=httpx.Limits(max_connections=self.max_connections,
+                                        max_keepalive_connections=self.max_connections,
+                                        keepalive_expiry=POE_KEEPALIVE_EXPIRY)),
+                event_hooks={"request": [self._attach_trace],
+                             "response": [self.limiter.observe_response]},
+            )
+        return self.client
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    #httpcore reports tcp connect and tls handshake events through the trace extension
+    #so we can count how many calls actually paid for a new connection
+    async def _attach_trace(self, request):
+        started = {}
+        async def trace(event_name, info):
+            if event_name.endswith(".started"):
+                started[event_name[:-len(".started")]] = time.perf_counter()
+            elif event_name == "connection.connect_tcp.complete":
+                self.stats["connections"] += 1
+                self.stats["connect_time"] += time.perf_counter() - started.pop("connection.connect_tcp", time.perf_counter())
+            elif event_name == "connection.start_tls.complete":
+                self.stats["tls_handshakes"] += 1
+                self.stats["tls_time"] += time.perf_counter() - started.pop("connection.start_tls", time.perf_counter())
+        request.extensions["trace"] = trace
+
+    async def stream(self, messages, bot_name=None):
+        bot_name = bot_name or self.bot_name
+        if self.replay.mode == "off":
+            async for partial in self._live_stream(messages, bot_name):
+                yield partial
+            return
+        key = self.replay.key("poe", bot_name, self.temperature,
+                              [[m.role, m.content] for m in messages])
+        if self.replay.mode == "replay":
+            async for text in self.replay.replay(self.replay.load(key)):
+                yield fp.PartialResponse(text=text)
+            return
+        recorder = ChunkRecorder()
+        async for partial in self._live_stream(messages, bot_name):
+            if isinstance(partial, fp.PartialResponse) and partial.text:
+                recorder.add(partial.text)
+            yield partial
+        self.replay.save(key, "poe", bot_name, self.temperature, recorder.chunks)
+
+    #num_tries=1: fastapi_poe's own retry (a fixed 0.5s sleep) would bypass the limiter's
+    #bucket and Retry-After, get_responses() is the only retry layer
+    async def _live_stream(self, messages, bot_name):
+        request = fp.QueryRequest(query=messages, user_id="", conversation_id="", message_id="",
+                                  version=PROTOCOL_VERSION, type="query", temperature=self.temperature)
+        async for partial in fp.stream_request(request, bot_name, self.api_key,
+                                               num_tries=1,
+                                               session=self.open(),
+                                               base_url=self.base_url):
+            yield partial
+
+    #on_tool_call(call) fires once, mid stream, as soon as the tool command is complete
+    async def get_responses(self, messages, bot_name=None, on_tool_call=None):
+        response = ""
+        print(f"Using bot: {bot_name or self.bot_name}")
+        tool_call_sent = False
+
+        for attempt in range(self.limiter.max_retries + 1):
+            #waits only while the bucket is empty or the backend has pushed back
+            if self.replay.mode != "replay":
+                await self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                chunks = []
+                detector = ToolCallDetector() if on_tool_call and not tool_call_sent else None
+                async for partial in self.stream(messages, bot_name):
+                    if isinstance(partial, fp.PartialResponse) and partial.text:
+                        chunks.append(partial.text)
+                        if detector is not None:
+                            tool_call = detector.feed(partial.text)
+                            if tool_call is not None:
+                                detector = None
+                                tool_call_sent = True
+                                on_tool_call(tool_call)
+                response = "".join(chunks)
+                return response
+            except Exception as e:
+                retryable, retry_after = self.limiter.classify(e)
+                if not retryable or attempt == self.limiter.max_retries:  #final attempt
+                    raise e
+                wait_time = self.limiter.retry_delay(attempt, retry_after)
+                print(f"Attempt {attempt + 1} failed ({type(e).__name__}: {e}), retrying in {wait_time:.1f} seconds...")
+                await asyncio.sleep(wait_time)
+            finally:
+                self.stats["calls"] += 1
+                self.stats["call_time"] += time.perf_counter() - start
+        return response
+
+    def report(self):
+        s = self.stats
+        calls = s["calls"]
+        if not calls:
+            return "Poe session: no LLM calls made"
+        reused = max(calls - s["connections"], 0)
+        handshake = (s["connect_time"] + s["tls_time"]) / max(s["connections"], 1)
+        saved = reused * handshake
+        return (f"Poe session: {calls} LLM calls over {s['connections']} connection(s), "
+                f"{reused} reused; avg call {s['call_time'] / calls:.3f}s; "
+                f"avg connect+TLS {handshake * 1000:.1f}ms; "
+                f"~{saved:.3f}s saved ({saved / calls * 1000:.1f}ms per call); "
+                + self.limiter.report()
+                + ("" if self.replay.mode == "off" else "; " + self.replay.report()))
+
+#one session per (api key, bot) for the life of the process so back to back
+#agent sessions keep reusing the same warm connections
+_shared_sessions = {}
+
+def shared_session(api_key, bot_name="Claude-3.5-Sonnet", **kwargs):
+    key = (api_key, bot_name)
+    if key not in _shared_sessions:
+        _shared_sessions[key] = PoeSession(api_key, bot_name=bot_name, **kwargs)
+    return _shared_sessions[key]
+
+async def close_shared_sessions():
+    for session in _shared_sessions.values():
+        await session.close()
+    _shared_sessions.clear()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+import asyncio, contextvars, email.utils, json, os, random, time
+import httpx
+import fastapi_poe as fp
+
+#Adaptive rate control for Poe calls, shared by every session in the process
+#a token bucket paces requests, and the backend's own push back (429/503, Retry-After,
+#x-ratelimit-* headers, rate limit error events) pauses the bucket for everyone.
+#only retryable errors are retried, with full jitter backoff.
+#NO EXPRESSED WARRANTY. Licensed under MIT
+
+POE_RATE = float(os.environ.get("POE_RATE", "2"))          #requests per second
+POE_BURST = float(os.environ.get("POE_BURST", "5"))
+POE_MAX_RETRIES = int(os.environ.get("POE_MAX_RETRIES", "4"))
+POE_BACKOFF_BASE = float(os.environ.get("POE_BACKOFF_BASE", "1"))
+POE_BACKOFF_MAX = float(os.environ.get("POE_BACKOFF_MAX", "60"))
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+#(status, retry_after) of the last response seen by the current task
+_last_response = contextvars.ContextVar("poe_last_response", default=(None, None))
+
+def _parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+        return max(when.timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def _parse_reset(value):
+    try:
+        reset = float(value)
+    except (TypeError, ValueError):
+        return None
+    #either seconds from now or an epoch timestamp
+    return max(reset - time.time(), 0.0) if reset > 1e9 else reset
+
+class AdaptiveRateLimiter:
+    def __init__(self, rate=POE_RATE, burst=POE_BURST, max_retries=POE_MAX_RETRIES,
+                 backoff_base=POE_BACKOFF_BASE, backoff_max=POE_BACKOFF_MAX):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = None
+        self.stats = {"acquired": 0, "waits": 0, "wait_time": 0.0, "pushbacks": 0, "retries": 0}
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                else:
+                    wait = (1 - self.tokens) / self.rate
+                waited += wait
+                await asyncio.sleep(wait)
+        self.stats["acquired"] += 1
+        _last_response.set((None, None))
+        if waited:
+            self.stats["waits"] += 1
+            self.stats["wait_time"] += waited
+
+    #the backend told us to slow down: empty the bucket and hold everyone for `delay`
+    def push_back(self, delay):
+        self.stats["pushbacks"] += 1
+        self.tokens = 0.0
+        self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+
+    #httpx response hook, sees every response on the pooled client
+    async def observe_response(self, response):
+        retry_after = _parse_retry_after(response.headers.get("retry-after"))
+        _last_response.set((response.status_code, retry_after))
+        if response.status_code in (429, 503):
+            self.push_back(retry_after if retry_after is not None else self.backoff_delay(0))
+        elif response.headers.get("x-ratelimit-remaining") == "0":
+            reset = _parse_reset(response.headers.get("x-ratelimit-reset"))
+            if reset:
+                self.push_back(reset)
+
+    def backoff_delay(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    #returns (retryable, retry_after) for an exception raised by a Poe call
+    def classify(self, exc):
+        status, retry_after = _last_response.get()
+        if isinstance(exc, fp.BotErrorNoRetry):
+            return False, None
+        cause = exc.__cause__ or exc
+        if isinstance(cause, httpx.HTTPStatusError):
+            status = cause.response.status_code
+            retry_after = _parse_retry_after(cause.response.headers.get("retry-after"))
+        if isinstance(exc, fp.BotError) and exc.__cause__ is None:
+            #error event from the bot, the payload says whether a retry is allowed
+            try:
+                data = json.loads(str(exc))
+            except ValueError:
+                data = {}
+            if isinstance(data, dict):
+                if "rate" in str(data.get("error_type", "")):
+                    self.push_back(retry_after or self.backoff_delay(1))
+                    return True, retry_after
+                return bool(data.get("allow_retry", True)), retry_after
+            return True, retry_after
+        if isinstance(cause, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)):
+            return True, retry_after
+        if status is not None and status >= 400:
+            return status in RETRYABLE_STATUS, retry_after
+        return isinstance(exc, fp.BotError), retry_after
+
+    def retry_delay(self, attempt, retry_after=None):
+        self.stats["retries"] += 1
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.backoff_base)
+        return self.backoff_delay(attempt)
+
+    def report(self):
+        s = self.stats
+        return (f"Rate limiter: {s['acquired']} requests, {s['waits']} waited "
+                f"({s['wait_time']:.2f}s total), {s['pushbacks']} backend push backs, "
+                f"{s['retries']} retries")
+
+_shared_limiter = None
+
+def shared_limiter():
+    global _shared_limiter
+    if _shared_limiter is None:
+        _shared_limiter = AdaptiveRateLimiter()
+    return _shared_limiter
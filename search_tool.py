@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+import asyncio, os, time
+import httpx
+from tool_cache import normalize
+
+#Async SerpAPI search tool
+#sends the real query over a pooled keep-alive connection and hands the LLM a compact
+#projection (title, link, snippet of the top N organic results) under a byte budget instead
+#of the raw result dict. identical queries already in flight share one request.
+#SERP_API_URL can point at a local stand-in server for benchmarks (benchmarks/bench_search.py)
+#NO EXPRESSED WARRANTY. Licensed under MIT
+
+SERP_API_URL = os.environ.get("SERP_API_URL", "https://serpapi.com/search.json")
+SEARCH_TOP_N = int(os.environ.get("SEARCH_TOP_N", "5"))
+SEARCH_MAX_BYTES = int(os.environ.get("SEARCH_MAX_BYTES", "2000"))
+
+def _clip(text, limit):
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+def compact_results(results, top_n=SEARCH_TOP_N, max_bytes=SEARCH_MAX_BYTES):
+    lines = []
+    answer = results.get("answer_box") or {}
+    if answer.get("snippet") or answer.get("answer"):
+        lines.append("Answer: " + _clip(answer.get("answer") or answer.get("snippet"), 300))
+    for i, item in enumerate(results.get("organic_results", [])[:top_n], 1):
+        lines.append(f"{i}. {_clip(item.get('title'), 120)}\n   {item.get('link', '')}\n"
+                     f"   {_clip(item.get('snippet'), 300)}")
+    if not lines:
+        error = results.get("error")
+        return f"No results{': ' + error if error else ''}"
+    text = ""
+    for line in lines:
+        candidate = text + line + "\n"
+        if len(candidate.encode()) > max_bytes:
+            break
+        text = candidate
+    return text.rstrip() or lines[0].encode()[:max_bytes].decode(errors="ignore")
+
+class SearchTool:
+    def __init__(self, api_key, base_url=SERP_API_URL, top_n=SEARCH_TOP_N,
+                 max_bytes=SEARCH_MAX_BYTES, cache=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.top_n = top_n
+        self.max_bytes = max_bytes
+        self.cache = cache
+        self.client = None
+        self.inflight = {}
+        self.stats = {"searches": 0, "requests": 0, "deduplicated": 0, "cache_hits": 0,
+                      "request_time": 0.0, "bytes_added": 0}
+
+    def _client(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=httpx.Timeout(30, connect=10),
+                                            limits=httpx.Limits(max_keepalive_connections=5,
+                                                                keepalive_expiry=120))
+        return self.client
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def _fetch(self, query):
+        params = {
+            "engine": "google",
+            "q": query,
+            "location": "Weston, FL, United States",
+            "hl": "en",
+            "gl": "us",
+            "google_domain": "google.com",
+            "num": self.top_n,
+            "api_key": self.api_key,
+        }
+        start = time.perf_counter()
+        response = await self._client().get(self.base_url, params=params)
+        response.raise_for_status()
+        self.stats["requests"] += 1
+        self.stats["request_time"] += time.perf_counter() - start
+        return compact_results(response.json(), self.top_n, self.max_bytes)
+
+    async def search(self, query):
+        self.stats["searches"] += 1
+        if self.cache is not None:
+            cached = self.cache.get("serpapi", query)
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                return cached
+        key = normalize("serpapi", query)
+        task = self.inflight.get(key)
+        if task is not None:
+            self.stats["deduplicated"] += 1
+            return await asyncio.shield(task)
+        task = asyncio.ensure_future(self._fetch(query))
+        self.inflight[key] = task
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            if self.inflight.get(key) is task:
+                del self.inflight[key]
+        if self.cache is not None:
+            self.cache.put("serpapi", query, result)
+        self.stats["bytes_added"] += len(result.encode())
+        return result
+
+    def report(self):
+        s = self.stats
+        avg = s["request_time"] / s["requests"] if s["requests"] else 0.0
+        return (f"Search: {s['searches']} searches, {s['requests']} API requests "
+                f"(avg {avg * 1000:.0f}ms), {s['deduplicated']} deduplicated, "
+                f"{s['cache_hits']} cache hits, {s['bytes_added']} prompt bytes added")
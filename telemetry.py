@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+import atexit, datetime, itertools, json, math, os, queue, threading, time
+from collections import Counter
+from telemetry_transport import TELEMETRY_SOCKET, MonitorLink
+
+#Behavior telemetry for the agents (agent_behavior.log, read by the conmon log_monitor.py)
+#emit() only stamps the event and puts it on a queue, so the agent's critical path pays a
+#few microseconds per event. a background thread formats the timestamp and JSON and writes
+#through one long-lived buffered file, flushing whenever the queue runs dry, so the monitor
+#still sees each event right away. lines keep the "<iso timestamp> <json>" format.
+#span() times a phase with perf_counter and emits it as one event with its duration; phase()
+#inside a span adds the time of a sub-phase (e.g. Model Armor sanitize) to the same event.
+#TELEMETRY_LOG sets the log path, empty turns telemetry off for agents that do not default
+#to a path. when the writer falls behind by TELEMETRY_QUEUE events, new ones are dropped and
+#counted instead of blocking the agent.
+#with TELEMETRY_SOCKET set, events are streamed to log_monitor.py over a Unix socket and the
+#log file is only the fallback while no monitor is listening (see telemetry_transport.py);
+#verdict() returns the monitor's slow down / block verdict, waiting up to
+#TELEMETRY_VERDICT_WAIT seconds for it to have checked the last event
+#NO EXPRESSED WARRANTY. Licensed under MIT
+
+TELEMETRY_LOG = os.environ.get("TELEMETRY_LOG", "")
+TELEMETRY_QUEUE = int(os.environ.get("TELEMETRY_QUEUE", "100000"))
+TELEMETRY_VERDICT_WAIT = float(os.environ.get("TELEMETRY_VERDICT_WAIT", "0.05"))
+
+#Shannon entropy in bits per character, one counting pass over the text
+def shannon_entropy(text):
+    if not text:
+        return 0.0
+    n = len(text)
+    return -sum(count / n * math.log2(count / n) for count in Counter(text).values())
+
+class Span:
+    __slots__ = ("telemetry", "event", "field", "fields", "start", "elapsed")
+
+    def __init__(self, telemetry, event, field, fields):
+        self.telemetry = telemetry
+        self.event = event
+        self.field = field
+        self.fields = fields
+        self.elapsed = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    #ends the timed part early, for work after the phase that belongs in the same event
+    def stop(self):
+        if self.elapsed is None:
+            self.elapsed = time.perf_counter() - self.start
+        return self.elapsed
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    #seconds since the span started, e.g. mark("first_token_time")
+    def mark(self, field):
+        self.fields[field] = time.perf_counter() - self.start
+
+    def phase(self, field):
+        return _Phase(self.fields, field)
+
+    #a span that ends with an exception is not recorded, like a tool call that never ran
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.fields[self.field] = self.stop()
+            self.telemetry.emit(self.event, **self.fields)
+        return False
+
+class _Phase:
+    __slots__ = ("fields", "field", "start")
+
+    def __init__(self, fields, field):
+        self.fields = fields
+        self.field = field
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.fields[self.field] = self.fields.get(self.field, 0.0) + time.perf_counter() - self.start
+        return False
+
+class Telemetry:
+    #context fields (e.g. session) are added to every event, after the event's own fields
+    def __init__(self, path=TELEMETRY_LOG, max_queue=TELEMETRY_QUEUE, socket_path=TELEMETRY_SOCKET, **context):
+        self.path = path or None
+        self.max_queue = max_queue
+        self.context = context
+        self.stats = {"events": 0, "written": 0, "streamed": 0, "dropped": 0, "flushes": 0}
+        self.queue = queue.SimpleQueue()
+        self.counter = itertools.count(1)
+        self.seq = 0
+        self.file = None
+        self.link = None
+        if socket_path:
+            #connected up front, so verdict() waits for the monitor from the first event on
+            self.link = MonitorLink(socket_path, pid=os.getpid(), **context)
+            self.link.connect()
+        self.thread = None
+        if self.path or self.link:
+            self.thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+            self.thread.start()
+            atexit.register(self.close)
+
+    @property
+    def enabled(self):
+        return self.thread is not None
+
+    def emit(self, event, **fields):
+        if self.thread is None:
+            return
+        self.stats["events"] += 1
+        if self.queue.qsize() >= self.max_queue:
+            self.stats["dropped"] += 1
+            return
+        self.seq = seq = next(self.counter)
+        self.queue.put((seq, time.time(), event, fields))
+
+    #with telemetry.span("tool_execution", "exec_time", tool_type="cli") as span: ...
+    def span(self, event, field, **fields):
+        return Span(self, event, field, fields)
+
+    #the monitor's worst verdict since the last call ({"action": "slow", "delay": ...} or
+    #{"action": "block", ...}), None when everything was ok or no monitor is connected
+    def verdict(self, wait=TELEMETRY_VERDICT_WAIT):
+        if self.link is None:
+            return None
+        return self.link.verdict(self.seq, wait)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            batch, markers, closing = [], [], False
+            while True:
+                if item is None:
+                    closing = True
+                    break
+                if isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    seq, stamp, event, fields = item
+                    record = {"event": event, **fields, **self.context}
+                    batch.append((seq, f"{datetime.datetime.fromtimestamp(stamp).isoformat()} {json.dumps(record)}"))
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            for marker in markers:
+                marker.set()
+            if closing:
+                return
+
+    #to the monitor when one is listening, otherwise to the log file
+    def _write(self, batch):
+        if self.link is not None and self.link.connect() and self.link.send(batch):
+            self.stats["streamed"] += len(batch)
+            return
+        if self.link is not None:
+            self.link.skip(batch[-1][0])
+        if self.path is None:
+            self.stats["dropped"] += len(batch)
+            return
+        if self.file is None:
+            self.file = open(self.path, "a", buffering=1 << 16)
+        self.file.writelines(line + "\n" for _, line in batch)
+        self.file.flush()
+        self.stats["written"] += len(batch)
+        self.stats["flushes"] += 1
+
+    #blocks until everything emitted so far is on disk or sent to the monitor
+    def flush(self):
+        if self.thread is not None:
+            done = threading.Event()
+            self.queue.put(done)
+            done.wait()
+
+    def close(self):
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        if self.link is not None:
+            self.link.close()
+        if self.file is not None:
+            self.file.close()
+
+    def report(self):
+        s = self.stats
+        streamed = f", {s['streamed']} sent to the monitor" if self.link is not None else ""
+        return (f"Telemetry ({self.path or 'no log file'}): {s['written']} of {s['events']} events written "
+                f"in {s['flushes']} flushes{streamed}, {s['dropped']} dropped")
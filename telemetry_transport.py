@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+import json, os, socket, socketserver, struct, threading, time
+from unix_socket import bind_unix_server
+
+#Unix socket transport between the agents' telemetry and the conmon log_monitor.py
+#with TELEMETRY_SOCKET set on both sides, the monitor listens on it and telemetry.py sends each
+#event straight to it instead of appending to agent_behavior.log; when no monitor is listening
+#(or it goes away) events go to the log file and the connection is retried every
+#TELEMETRY_RECONNECT seconds. the socket is created owner-only (0600).
+#
+#frames are a 5 byte header (payload length, uint32 big endian, and a frame type byte) and
+#the payload:
+#  HELLO    agent -> monitor  JSON {"session": ..., "pid": ...}, once per connection
+#  EVENT    agent -> monitor  8 byte sequence number + the log line, utf-8, no newline
+#  VERDICT  monitor -> agent  JSON {"seq": last event checked, "action": "ok"|"slow"|"block",
+#                             "delay": seconds (slow), "metric", "z", "reason"}
+#the monitor answers every read of events with one VERDICT, so the agent knows which events
+#were checked and can wait a few ms for the verdict on its last event before running a tool
+#NO EXPRESSED WARRANTY. Licensed under MIT
+
+TELEMETRY_SOCKET = os.path.expanduser(os.environ.get("TELEMETRY_SOCKET", ""))
+TELEMETRY_RECONNECT = float(os.environ.get("TELEMETRY_RECONNECT", "5"))
+
+HEADER = struct.Struct("!IB")
+SEQ = struct.Struct("!Q")
+HELLO, EVENT, VERDICT = 1, 2, 3
+MAX_FRAME = 1 << 20
+#how bad a verdict is, the worst one pending is kept
+SEVERITY = {"ok": 0, "slow": 1, "block": 2}
+
+class FrameError(ValueError):
+    pass
+
+def frame(kind, payload):
+    return HEADER.pack(len(payload), kind) + payload
+
+def event_frame(seq, line):
+    payload = SEQ.pack(seq) + line.encode()
+    return HEADER.pack(len(payload), EVENT) + payload
+
+#splits a byte stream into (kind, payload) frames, whatever the recv() boundaries
+class FrameReader:
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+        frames, pos = [], 0
+        while len(self.buffer) - pos >= HEADER.size:
+            length, kind = HEADER.unpack_from(self.buffer, pos)
+            if length > MAX_FRAME:
+                raise FrameError(f"frame of {length} bytes (max {MAX_FRAME})")
+            end = pos + HEADER.size + length
+            if end > len(self.buffer):
+                break
+            frames.append((kind, bytes(self.buffer[pos + HEADER.size:end])))
+            pos = end
+        del self.buffer[:pos]
+        return frames
+
+#agent side: one connection to the monitor plus a thread reading its verdicts
+class MonitorLink:
+    def __init__(self, path=TELEMETRY_SOCKET, reconnect=TELEMETRY_RECONNECT, **hello):
+        self.path = path
+        self.reconnect = reconnect
+        self.hello = hello
+        self.sock = None
+        self.next_attempt = 0.0
+        self.acked = 0
+        self.pending = None
+        self.changed = threading.Condition()
+        self.stats = {"connects": 0, "sent": 0, "failures": 0, "verdicts": 0}
+
+    @property
+    def connected(self):
+        return self.sock is not None
+
+    #connects unless the last attempt was under `reconnect` seconds ago
+    def connect(self):
+        if self.sock is not None or not self.path or time.monotonic() < self.next_attempt:
+            return self.sock is not None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+            sock.sendall(frame(HELLO, json.dumps(self.hello).encode()))
+        except OSError:
+            sock.close()
+            self.next_attempt = time.monotonic() + self.reconnect
+            return False
+        self.sock = sock
+        self.stats["connects"] += 1
+        threading.Thread(target=self._read, args=(sock,), name="telemetry-verdicts", daemon=True).start()
+        return True
+
+    #(seq, line) pairs; False when the monitor is gone and the caller should fall back.
+    #the verdict thread may drop the connection at any time, so self.sock is read once
+    def send(self, events):
+        sock = self.sock
+        if sock is None:
+            return False
+        try:
+            sock.sendall(b"".join(event_frame(seq, line) for seq, line in events))
+        except OSError:
+            self.stats["failures"] += 1
+            self._drop(sock)
+            return False
+        self.stats["sent"] += len(events)
+        return True
+
+    def _drop(self, sock):
+        with self.changed:
+            if self.sock is sock:
+                self.sock = None
+                self.next_attempt = time.monotonic() + self.reconnect
+            self.changed.notify_all()
+        sock.close()
+
+    def _read(self, sock):
+        reader = FrameReader()
+        try:
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                for kind, payload in reader.feed(data):
+                    if kind == VERDICT:
+                        self._verdict(json.loads(payload))
+        except (OSError, ValueError):
+            pass
+        self._drop(sock)
+
+    def _verdict(self, verdict):
+        with self.changed:
+            self.stats["verdicts"] += 1
+            self.acked = max(self.acked, verdict.get("seq", 0))
+            action = verdict.get("action", "ok")
+            if action != "ok" and (self.pending is None or SEVERITY.get(action, 0) >= SEVERITY[self.pending["action"]]):
+                self.pending = verdict
+            self.changed.notify_all()
+
+    #events up to seq went to the log file instead, there is no verdict to wait for
+    def skip(self, seq):
+        with self.changed:
+            self.acked = max(self.acked, seq)
+            self.changed.notify_all()
+
+    #waits up to timeout for the monitor to have checked event seq, then returns and clears
+    #the worst verdict received since the last call (None when everything was ok)
+    def verdict(self, seq, timeout):
+        with self.changed:
+            if timeout > 0 and self.sock is not None:
+                self.changed.wait_for(lambda: self.acked >= seq or self.sock is None, timeout)
+            verdict, self.pending = self.pending, None
+        return verdict
+
+    def close(self):
+        sock = self.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+            self._drop(sock)
+
+class _Handler(socketserver.BaseRequestHandler):
+    def setup(self):
+        with self.server.lock:
+            self.server.connections.add(self.request)
+
+    def finish(self):
+        with self.server.lock:
+            self.server.connections.discard(self.request)
+
+    def handle(self):
+        server = self.server
+        reader = FrameReader()
+        hello = {}
+        while True:
+            try:
+                data = self.request.recv(65536)
+            except OSError:
+                break
+            if not data:
+                break
+            try:
+                frames = reader.feed(data)
+            except FrameError as e:
+                print(f"Telemetry connection {hello.get('session')}: {e}, closing")
+                break
+            lines, seq = [], 0
+            for kind, payload in frames:
+                if kind == EVENT:
+                    seq = SEQ.unpack_from(payload)[0]
+                    lines.append(payload[SEQ.size:].decode("utf-8", errors="replace"))
+                elif kind == HELLO:
+                    hello = json.loads(payload)
+            if not lines:
+                continue
+            verdict = server.on_events(lines) or {"action": "ok"}
+            verdict["seq"] = seq
+            try:
+                self.request.sendall(frame(VERDICT, json.dumps(verdict).encode()))
+            except OSError:
+                break
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+#monitor side: on_events(lines) is called for every read of events on a connection, from
+#that connection's thread, and returns the verdict dict (or None for ok). returns the server,
+#already serving on a background thread; stop() it when done
+def serve(on_events, path=TELEMETRY_SOCKET):
+    server = bind_unix_server(_Server, _Handler, path, "a monitor")
+    server.on_events = on_events
+    server.lock = threading.Lock()
+    server.connections = set()
+    threading.Thread(target=server.serve_forever, name="telemetry-server", daemon=True).start()
+    return server
+
+#stops accepting and closes the agents' connections, they fall back to their log files
+def stop(server):
+    server.shutdown()
+    server.server_close()
+    with server.lock:
+        for connection in server.connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+    try:
+        os.unlink(server.server_address)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+import os, re, shlex, sqlite3, threading, time
+from collections import OrderedDict
+
+#Result cache for the agent tools
+#hardening runs keep re-running the same read-only enumeration commands and web searches.
+#results are kept in an in-process LRU backed by a small sqlite store so repeat runs skip
+#the subprocess / SerpAPI round trip (and the paid quota). only commands on the read-only
+#allowlist below are ever cached, each tool has its own TTL. a command that is not on the
+#allowlist may change what the read-only ones return (ufw enable after ufw status), so the
+#caller invalidate()s the cli results once one has run.
+#the store lives in a per-user cache dir and is created owner-only (0600); results of commands
+#that read secrets (/etc/shadow, ssh keys, credential files, ...) are only kept in memory.
+#NO EXPRESSED WARRANTY. Licensed under MIT
+
+TOOL_CACHE_PATH = os.environ.get("TOOL_CACHE_PATH", os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "poe-agent", "tool_cache.sqlite"))
+TOOL_CACHE_SIZE = int(os.environ.get("TOOL_CACHE_SIZE", "256"))
+TOOL_CACHE_TTLS = {
+    "cli": float(os.environ.get("CLI_CACHE_TTL", "3600")),
+    "serpapi": float(os.environ.get("SERPAPI_CACHE_TTL", "86400")),
+}
+
+#read-only enumeration commands, matched against every stage of a pipeline
+CACHEABLE_COMMANDS = [
+    r"uname( -[a-zA-Z]+)*",
+    r"hostname(ctl)?( status)?",
+    r"lsb_release( -[a-z]+)*",
+    r"sw_vers( -\w+)?",
+    r"(cat|head|tail|grep|egrep|ls)( -[-\w=]+)*( ('[^']*'|\"[^\"]*\"|[\w./*^$=-]+))*",
+    r"sysctl( -a| -n| -e| [\w.]+)*",
+    r"(iptables|ip6tables)( -[nvx]+| -t \w+| --line-numbers)* -L( \w+)?( -[nvx]+| --line-numbers)*",
+    r"(iptables|ip6tables)-save",
+    r"nft list (ruleset|tables|table( \w+)+)",
+    r"ufw status( verbose| numbered)?",
+    r"firewall-cmd --(state|list-all|list-all-zones|get-[\w-]+)",
+    r"pfctl -s ?\w+",
+    r"/usr/libexec/ApplicationFirewall/socketfilterfw --get\w+",
+    r"(csrutil|spctl --|fdesetup) ?status",
+    r"defaults read( [\w./-]+)+",
+    r"getenforce|sestatus|id|whoami|groups|umask",
+    r"systemctl (list-units|list-unit-files|is-enabled|is-active|show)( [-\w.@=]+)*",
+    r"(sort|uniq|wc)( -[^\Wo]+)*",  #no -o, sort -o <file> writes
+    r"systeminfo|ver|netsh advfirewall show \w+( \w+)?",
+    r"(powershell|pwsh)( -\w+)* (\"Get-[^\"]*\"|'Get-[^']*'|Get-[\w-]+( [-\w.*:\"']+)*)",
+]
+_CACHEABLE = re.compile("|".join(f"(?:{p})" for p in CACHEABLE_COMMANDS))
+#anything that could write, chain or substitute disqualifies the whole command, and so does
+#a cli_output/ handle, which names a different spill file every run (see output_capture.py)
+_UNSAFE = re.compile(r"[;&`<>]|\$\(|\|\||cli_output/")
+#redirects that write nothing (2>/dev/null, >/dev/null, 2>&1) are dropped before the check
+_HARMLESS_REDIRECT = re.compile(r"\s*(?:&>>?|\d?>>?)\s*/dev/null(?![\w./-])|\s*\d?>&\d(?!\w)")
+#paths whose contents never go to disk
+_SENSITIVE = re.compile(r"shadow|gshadow|sudoers|master\.passwd|/\.ssh/|ssh_host_\w*key|id_(rsa|dsa|ecdsa|ed25519)"
+                        r"|\.(pem|key|p12|pfx|keystore|kdbx)\b|credentials|\.netrc|\.pgpass|\.env\b|\.kube/config"
+                        r"|\.docker/config|\.git-credentials|secret|token|private", re.I)
+
+def normalize(tool, value):
+    value = str(value).strip()
+    if tool == "cli":
+        try:
+            return " ".join(shlex.quote(token) if token != "|" else token
+                            for token in shlex.split(value))
+        except ValueError:
+            return " ".join(value.split())
+    return " ".join(value.lower().split())
+
+def cacheable(tool, value):
+    if tool != "cli":
+        return True
+    value = _HARMLESS_REDIRECT.sub("", value)
+    if _UNSAFE.search(value):
+        return False
+    return all(_CACHEABLE.fullmatch(stage.strip()) for stage in value.split("|"))
+
+def persistent(tool, value):
+    return tool != "cli" or not _SENSITIVE.search(value)
+
+class ToolCache:
+    def __init__(self, path=TOOL_CACHE_PATH, size=TOOL_CACHE_SIZE, ttls=TOOL_CACHE_TTLS):
+        self.size = size
+        self.ttls = ttls
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "uncacheable": 0, "stores": 0,
+                      "invalidations": 0}
+        #bumped by invalidate(), a result computed before it is not stored
+        self.generations = {}
+        self.db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", mode=0o700, exist_ok=True)
+            os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+            os.chmod(path, 0o600)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS tool_cache (tool TEXT, key TEXT, value TEXT, "
+                            "created REAL, PRIMARY KEY (tool, key))")
+            self.db.commit()
+
+    def _fresh(self, tool, created):
+        return time.time() - created < self.ttls.get(tool, 0)
+
+    def get(self, tool, value):
+        if not cacheable(tool, str(value)):
+            self.stats["uncacheable"] += 1
+            return None
+        key = (tool, normalize(tool, value))
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None and self._fresh(tool, entry[1]):
+                self.memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return entry[0]
+            if self.db is not None:
+                row = self.db.execute("SELECT value, created FROM tool_cache WHERE tool = ? AND key = ?", key).fetchone()
+                if row is not None and self._fresh(tool, row[1]):
+                    self._remember(key, row[0], row[1])
+                    self.stats["disk_hits"] += 1
+                    return row[0]
+            self.stats["misses"] += 1
+            return None
+
+    def generation(self, tool):
+        return self.generations.get(tool, 0)
+
+    #since: generation() from before the result was computed
+    def put(self, tool, value, result, since=None):
+        if not cacheable(tool, str(value)) or not self.ttls.get(tool):
+            return
+        key = (tool, normalize(tool, value))
+        created = time.time()
+        with self.lock:
+            if since is not None and since != self.generation(tool):
+                return
+            self._remember(key, result, created)
+            if self.db is not None and persistent(tool, str(value)):
+                self.db.execute("INSERT OR REPLACE INTO tool_cache VALUES (?, ?, ?, ?)", key + (result, created))
+                self.db.commit()
+            self.stats["stores"] += 1
+
+    #drops every result of the tool, in memory and on disk
+    def invalidate(self, tool):
+        with self.lock:
+            self.generations[tool] = self.generation(tool) + 1
+            for key in [key for key in self.memory if key[0] == tool]:
+                del self.memory[key]
+            if self.db is not None:
+                self.db.execute("DELETE FROM tool_cache WHERE tool = ?", (tool,))
+                self.db.commit()
+            self.stats["invalidations"] += 1
+
+    def _remember(self, key, result, created):
+        self.memory[key] = (result, created)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.size:
+            self.memory.popitem(last=False)
+
+    def report(self):
+        s = self.stats
+        lookups = s["memory_hits"] + s["disk_hits"] + s["misses"]
+        rate = (s["memory_hits"] + s["disk_hits"]) / lookups * 100 if lookups else 0.0
+        return (f"Tool cache: {s['memory_hits']} memory hits, {s['disk_hits']} disk hits, "
+                f"{s['misses']} misses ({rate:.0f}% hit rate), {s['uncacheable']} uncacheable, "
+                f"{s['stores']} stored, {s['invalidations']} invalidations")
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+import ast, json
+from collections import namedtuple
+
+#Tool call parsing and dispatch shared by the poe and sechard agents
+#replies are parsed in one pass: a straight json.loads when the reply is a bare object, else
+#the first balanced {...} in the text (prose around it, ```json fences, python style quotes,
+#trailing commas) is tried as JSON and then as a python literal. the dict is matched to a tool
+#through a registry table, either by its shorthand key ({"cli": "whoami"}) or by its "tool"
+#field ({"tool": "cli", "command": "whoami"}), validated against that tool's schema and
+#dispatched to the registered handler. anything unusable raises ToolCallError so the agent can
+#hand the problem back to the model instead of ending the session.
+#NO EXPRESSED WARRANTY. Licensed under MIT
+
+ToolCall = namedtuple("ToolCall", "name argument data")
+
+#appended to a ToolCallError when it is handed back to the model
+RETRY_HINT = 'Reply with exactly one tool call dictionary, for example {"cli": "whoami", "thought": "check the current user"}'
+
+class ToolCallError(ValueError):
+    pass
+
+def _literal(text):
+    try:
+        value = json.loads(text)
+    except ValueError:
+        try:
+            value = ast.literal_eval(text)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            return None
+    return value if isinstance(value, dict) else None
+
+#balanced {...} spans in order of appearance, quotes and escapes respected
+def _objects(text):
+    start = text.find("{")
+    while start >= 0:
+        depth, quote, i = 0, None, start
+        while i < len(text):
+            c = text[i]
+            if quote:
+                if c == "\\":
+                    i += 1
+                elif c == quote:
+                    quote = None
+            elif c in "\"'":
+                quote = c
+            elif c == "{":
+                depth += 1
+            elif c == "}":
+                depth -= 1
+                if not depth:
+                    yield text[start:i + 1]
+                    break
+            i += 1
+        start = text.find("{", start + 1)
+
+def parse_object(text):
+    stripped = text.strip()
+    if stripped[:1] == "{" and stripped[-1:] == "}":
+        try:
+            value = json.loads(stripped)
+            if isinstance(value, dict):
+                return value
+        except ValueError:
+            pass
+    for candidate in _objects(stripped):
+        value = _literal(candidate)
+        if value is not None:
+            return value
+    raise ToolCallError("no dictionary found in the reply")
+
+class ToolSchema:
+    #argument: the field holding the tool input in the {"tool": name, ...} form
+    #required: whether that input must be a non-empty string
+    def __init__(self, name, handler, argument="input", required=True, fields=("thought",)):
+        self.name = name
+        self.handler = handler
+        self.argument = argument
+        self.required = required
+        self.text_fields = (name, argument) + tuple(fields)
+
+    def validate(self, data):
+        for field in self.text_fields:
+            value = data.get(field)
+            if value is not None and not isinstance(value, str):
+                raise ToolCallError(f"{self.name}: '{field}' must be a string, got {type(value).__name__}")
+        argument = data.get(self.name) if self.name in data else data.get(self.argument)
+        if self.required and not (argument or "").strip():
+            raise ToolCallError(f"{self.name}: missing '{self.argument}'")
+        return ToolCall(self.name, argument, data)
+
+class ToolRegistry:
+    def __init__(self):
+        self.schemas = {}
+        self.stats = {"parsed": 0, "errors": 0}
+
+    def register(self, name, handler, argument="input", required=True, fields=("thought",)):
+        self.schemas[name] = ToolSchema(name, handler, argument, required, fields)
+
+    def match(self, data):
+        if "tool" in data:
+            schema = self.schemas.get(data["tool"]) if isinstance(data["tool"], str) else None
+            if schema is None:
+                raise ToolCallError(f"unknown tool {data['tool']!r}, expected one of {', '.join(self.schemas)}")
+            return schema
+        for key in data:
+            schema = self.schemas.get(key)
+            if schema is not None:
+                return schema
+        raise ToolCallError(f"no tool in {list(data)}, expected one of {', '.join(self.schemas)}")
+
+    def parse(self, text):
+        try:
+            data = parse_object(text)
+            call = self.match(data).validate(data)
+        except ToolCallError:
+            self.stats["errors"] += 1
+            raise
+        self.stats["parsed"] += 1
+        return call
+
+    #returns whatever the handler returns (a coroutine for async handlers)
+    def dispatch(self, call):
+        return self.schemas[call.name].handler(call.argument)
+
+    def report(self):
+        s = self.stats
+        return f"Tool calls: {s['parsed']} parsed, {s['errors']} unusable replies"
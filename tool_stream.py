@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+import ast, json
+
+#Incremental tool call detector for streamed LLM output
+#the model replies {"cli": "command", "thought": "..."} and usually keeps writing a long
+#thought after the command value is already complete. feeding each streamed chunk in here
+#lets the caller start the tool as soon as the command string closes instead of waiting
+#for the end of the stream.
+#NO EXPRESSED WARRANTY. Licensed under MIT
+
+TOOL_KEYS = ("cli", "serpapi")
+
+#scanner states
+SEEK_OBJECT, KEY_START, IN_KEY, AFTER_KEY, VALUE_START, IN_VALUE, SKIP_VALUE, DONE = range(8)
+
+def _decode(quote, raw):
+    if quote == '"':
+        try:
+            return json.loads('"' + raw + '"')
+        except ValueError:
+            pass
+    try:
+        return ast.literal_eval(quote + raw + quote)
+    except (ValueError, SyntaxError):
+        return raw
+
+class ToolCallDetector:
+    def __init__(self, tool_keys=TOOL_KEYS):
+        self.tool_keys = tool_keys
+        self.tool_call = None
+        self._state = SEEK_OBJECT
+        self._quote = None
+        self._escape = False
+        self._token = []
+        self._key = None
+        self._depth = 0
+
+    #returns the tool call dict the first time a tool key and its string value are complete
+    #and None otherwise. once detected (or the top level object closes) chunks are ignored
+    def feed(self, text):
+        if self._state == DONE:
+            return None
+        for ch in text:
+            state = self._state
+            if state == SEEK_OBJECT:
+                if ch == "{":
+                    self._state = KEY_START
+            elif state == KEY_START:
+                if ch in "\"'":
+                    self._quote, self._token = ch, []
+                    self._state = IN_KEY
+                elif ch == "}":
+                    self._state = DONE
+                    return None
+            elif state == IN_KEY or state == IN_VALUE:
+                if self._escape:
+                    self._escape = False
+                    self._token.append(ch)
+                elif ch == "\\":
+                    self._escape = True
+                    self._token.append(ch)
+                elif ch == self._quote:
+                    value = _decode(self._quote, "".join(self._token))
+                    if state == IN_KEY:
+                        self._key = value
+                        self._state = AFTER_KEY
+                    else:
+                        self._state = KEY_START
+                        if self._key in self.tool_keys and isinstance(value, str):
+                            self.tool_call = {self._key: value}
+                            self._state = DONE
+                            return self.tool_call
+                else:
+                    self._token.append(ch)
+            elif state == AFTER_KEY:
+                if ch == ":":
+                    self._state = VALUE_START
+            elif state == VALUE_START:
+                if ch in "\"'":
+                    self._quote, self._token = ch, []
+                    self._state = IN_VALUE
+                elif not ch.isspace():
+                    #numbers, lists, nested objects: skip to the next top level separator
+                    self._state = SKIP_VALUE
+                    self._quote = None
+                    self._depth = 1 if ch in "[{" else 0
+            elif state == SKIP_VALUE:
+                if self._quote:
+                    if self._escape:
+                        self._escape = False
+                    elif ch == "\\":
+                        self._escape = True
+                    elif ch == self._quote:
+                        self._quote = None
+                elif ch in "\"'":
+                    self._quote = ch
+                elif ch in "[{":
+                    self._depth += 1
+                elif ch in "]}":
+                    if self._depth == 0:
+                        self._state = DONE
+                        return None
+                    self._depth -= 1
+                elif ch == "," and self._depth == 0:
+                    self._state = KEY_START
+        return None
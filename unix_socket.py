@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+import os, socket
+
+#Owner-only Unix socket servers, shared by telemetry_transport.py (the conmon log_monitor.py)
+#and gcp-sechard-agent/sechard_daemon.py
+#the socket is created 0600 in a 0700 directory, since whoever can connect can feed the
+#monitor or run agent sessions. a socket file nobody answers on was left by a server that did
+#not shut down cleanly and is replaced; a live one raises SocketInUse.
+#NO EXPRESSED WARRANTY. Licensed under MIT
+
+class SocketInUse(OSError):
+    pass
+
+#server_class(path, handler), e.g. a ThreadingMixIn UnixStreamServer
+def bind_unix_server(server_class, handler, path, name="a server"):
+    os.makedirs(os.path.dirname(path) or ".", mode=0o700, exist_ok=True)
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.unlink(path)
+        else:
+            raise SocketInUse(f"{name} is already listening on {path}")
+        finally:
+            probe.close()
+    umask = os.umask(0o177)
+    try:
+        return server_class(path, handler)
+    finally:
+        os.umask(umask)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+import datetime, os, time
+from llm_replay import wrap_chat
+
+#Context modes for the Vertex chat in the sechard agents
+#SECHARD_CONTEXT_MODE=full    (default) every turn sends prompt.md + user input + the whole tool
+#                             output history, and the stateful chat keeps all of it again
+#SECHARD_CONTEXT_MODE=system  prompt.md is registered once as the system instruction and each
+#                             turn only sends the delta (new tool output + iteration counter)
+#SECHARD_CONTEXT_MODE=cached  like system, but prompt.md is stored as Vertex cached content
+#                             (falls back to system when the prompt is under the cache minimum)
+#input tokens, latency and time to the first streamed chunk are recorded per turn. the model
+#sits behind ChatBackend so the local FakeBackend can stand in for Vertex in benchmarks
+#NO EXPRESSED WARRANTY. Licensed under MIT
+
+SECHARD_CONTEXT_MODE = os.environ.get("SECHARD_CONTEXT_MODE", "full")
+SECHARD_CACHE_TTL = int(os.environ.get("SECHARD_CACHE_TTL", "3600"))
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+#interface: start() opens a chat, send() returns a response with .text, .usage_metadata and
+#.first_token_s (None when unknown), close() releases anything start() created
+class ChatBackend:
+    def start(self, system_prompt=None, cache=False):
+        raise NotImplementedError
+
+    def send(self, text):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    #a backend for another concurrent chat that reuses whatever start() set up
+    def fork(self):
+        raise NotImplementedError
+
+class VertexBackend(ChatBackend):
+    #vertexai.init() must already have been called
+    def __init__(self, model_name, cache_ttl=SECHARD_CACHE_TTL):
+        self.model_name = model_name
+        self.cache_ttl = cache_ttl
+        self.cached_content = None
+        self.model = None
+        self.chat = None
+
+    def start(self, system_prompt=None, cache=False):
+        if self.model is None:
+            self.model = self._model(system_prompt, cache)
+        # LLM_REPLAY_MODE=record|replay wraps the chat with the record/replay store
+        self.chat = wrap_chat(self.model.start_chat(), self.model_name, context=system_prompt or "")
+
+    def _model(self, system_prompt, cache):
+        from vertexai.generative_models import GenerativeModel
+        model = None
+        if system_prompt and cache:
+            try:
+                from vertexai.preview import caching
+                self.cached_content = caching.CachedContent.create(
+                    model_name=self.model_name, system_instruction=system_prompt,
+                    ttl=datetime.timedelta(seconds=self.cache_ttl))
+                model = GenerativeModel.from_cached_content(cached_content=self.cached_content)
+            except Exception as e:
+                print(f"Context cache unavailable ({e.__class__.__name__}: {e}), using a system instruction.")
+        if model is None:
+            model = GenerativeModel(model_name=self.model_name, system_instruction=system_prompt or None)
+        return model
+
+    #same model and cached content, new chat; only the original deletes the cache on close()
+    def fork(self):
+        backend = VertexBackend(self.model_name, self.cache_ttl)
+        backend.model = self.model
+        return backend
+
+    #streamed so the time to the first chunk is known; the chat history is the same either way
+    def send(self, text):
+        start = time.perf_counter()
+        first, chunks, usage = None, [], None
+        for chunk in self.chat.send_message(text, stream=True):
+            if first is None:
+                first = time.perf_counter() - start
+            chunks.append(chunk.text)
+            usage = getattr(chunk, "usage_metadata", None) or usage
+        return ChatResponse("".join(chunks), usage, first)
+
+    def close(self):
+        if self.cached_content is not None:
+            try:
+                self.cached_content.delete()
+            except Exception:
+                pass
+            self.cached_content = None
+
+class FakeUsage:
+    def __init__(self, prompt_token_count, cached_content_token_count=0):
+        self.prompt_token_count = prompt_token_count
+        self.cached_content_token_count = cached_content_token_count
+
+class ChatResponse:
+    def __init__(self, text, usage_metadata, first_token_s=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+        self.first_token_s = first_token_s
+
+#local stand-in for a stateful Gemini chat. the model sees the system prompt plus every earlier
+#turn on each request; latency is a fixed overhead plus time per uncached input token and per
+#output token. replies come from reply(text, turn)
+class FakeBackend(ChatBackend):
+    def __init__(self, reply=None, base_latency=0.0, input_token_s=0.0, output_token_s=0.0,
+                 cached_discount=0.75):
+        self.reply = reply or (lambda text, turn: '{"cli": "id", "thought": "check user context"}')
+        self.base_latency = base_latency
+        self.input_token_s = input_token_s
+        self.output_token_s = output_token_s
+        self.cached_discount = cached_discount
+
+    def fork(self):
+        return FakeBackend(self.reply, self.base_latency, self.input_token_s, self.output_token_s,
+                           self.cached_discount)
+
+    def start(self, system_prompt=None, cache=False):
+        self.system_tokens = estimate_tokens(system_prompt) if system_prompt else 0
+        self.cached = cache and bool(system_prompt)
+        self.context_tokens = 0
+        self.turn = 0
+
+    def send(self, text):
+        prompt_tokens = self.system_tokens + self.context_tokens + estimate_tokens(text)
+        cached_tokens = self.system_tokens if self.cached else 0
+        reply = self.reply(text, self.turn)
+        output_tokens = estimate_tokens(reply)
+        billed = prompt_tokens - cached_tokens * self.cached_discount
+        first = self.base_latency + billed * self.input_token_s
+        time.sleep(first + output_tokens * self.output_token_s)
+        self.context_tokens += estimate_tokens(text) + output_tokens
+        self.turn += 1
+        return ChatResponse(reply, FakeUsage(prompt_tokens, cached_tokens), first)
+
+class ContextChat:
+    def __init__(self, backend, system_prompt, mode=SECHARD_CONTEXT_MODE):
+        if mode not in ("full", "system", "cached"):
+            raise ValueError(f"SECHARD_CONTEXT_MODE must be full, system or cached, not {mode!r}")
+        self.backend = backend
+        self.system_prompt = system_prompt
+        self.mode = mode
+        self.turns = []
+        self.context_tokens = 0
+        if mode == "full":
+            backend.start()
+        else:
+            backend.start(system_prompt, cache=mode == "cached")
+            self.context_tokens = estimate_tokens(system_prompt)
+
+    #prompt is the full prompt the agent always built, delta only what is new since the last turn
+    def send_message(self, prompt, delta):
+        text = prompt if self.mode == "full" else delta
+        start = time.perf_counter()
+        response = self.backend.send(text)
+        elapsed = time.perf_counter() - start
+        usage = getattr(response, "usage_metadata", None)
+        #replayed responses carry no usage, estimate what the chat context holds
+        estimate = self.context_tokens + estimate_tokens(text)
+        self.context_tokens = estimate + estimate_tokens(response.text)
+        self.turns.append({
+            "turn": len(self.turns) + 1,
+            "input_tokens": getattr(usage, "prompt_token_count", None) or estimate,
+            "cached_tokens": getattr(usage, "cached_content_token_count", None) or 0,
+            "sent_bytes": len(text.encode()),
+            "latency_s": round(elapsed, 4),
+            "first_token_s": getattr(response, "first_token_s", None),
+        })
+        return response
+
+    #a fresh conversation on the same warm model, for concurrent sessions in one process
+    def fork(self):
+        return ContextChat(self.backend.fork(), self.system_prompt, self.mode)
+
+    def close(self):
+        self.backend.close()
+
+    def report(self):
+        lines = [f"Context mode {self.mode}:"]
+        for t in self.turns:
+            lines.append(f"  turn {t['turn']}: {t['input_tokens']} input tokens ({t['cached_tokens']} cached), "
+                         f"{t['sent_bytes']} bytes sent, {t['latency_s']:.2f}s"
+                         + (f" ({t['first_token_s']:.2f}s to first token)" if t["first_token_s"] is not None else ""))
+        total = sum(t["input_tokens"] for t in self.turns)
+        lines.append(f"  total {total} input tokens over {len(self.turns)} turns")
+        return "\n".join(lines)